@@ -1,74 +1,212 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from bson import ObjectId
+from bson.errors import InvalidId
+from revocation import revocation_list
+import hashlib
 import os
+import secrets
+import time
+import uuid
 
 # Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "jeetracker-secret-key-super-secure")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 days
+# Access tokens are short-lived; clients renew them with the refresh token (POST /auth/refresh)
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+ACCESS_TOKEN = "access"
+REFRESH_TOKEN = "refresh"
+XP_PER_LEVEL = 500
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Verified tokens remembered (see TokenCache), and for how long at most
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "300"))
+
+# Bearer token for monitoring to read /api/metrics; without one, any signed-in user may
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
 
 # Token scheme
 security = HTTPBearer()
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a plain password against its hash."""
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password: str) -> str:
-    """Hash a password."""
-    return pwd_context.hash(password)
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, token_type: str = ACCESS_TOKEN):
+    """Create a JWT access token.
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    """Create a JWT access token."""
+    Every token gets its own jti (what revocation is keyed by) and a sub-second
+    iat, so a "revoke all sessions" at time t spares the tokens issued after it.
+    """
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": time.time(), "jti": uuid.uuid4().hex, "typ": token_type})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str) -> Optional[str]:
-    """Verify a JWT token and return the user ID."""
+def create_refresh_token(user_id: str) -> str:
+    """Create a refresh token, good for one POST /auth/refresh."""
+    return create_access_token(
+        data={"sub": user_id},
+        expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        token_type=REFRESH_TOKEN
+    )
+
+def issue_tokens(user_id: str) -> dict:
+    """A fresh access/refresh token pair, in the shape returned by the auth routes."""
+    return {
+        "access_token": create_access_token(data={"sub": user_id}),
+        "refresh_token": create_refresh_token(user_id),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    }
+
+class AuthContext:
+    """The verified identity behind a request."""
+    __slots__ = ("user_id", "subject", "expires_at", "claims")
+
+    def __init__(self, user_id: ObjectId, subject: str, expires_at: Optional[datetime], claims: dict):
+        self.user_id = user_id
+        self.subject = subject
+        self.expires_at = expires_at
+        self.claims = claims
+
+def decode_token(token: str) -> Optional[AuthContext]:
+    """Verify a JWT's signature and expiry and parse its subject; None if any of it fails."""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        subject = claims.get("sub")
+        if subject is None:
             return None
-        return user_id
-    except JWTError:
+        user_id = ObjectId(subject)
+    except (JWTError, InvalidId, TypeError):
         return None
-
-async def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
-    """Get the current user ID from the JWT token."""
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
     
-    user_id = verify_token(credentials.credentials)
-    if user_id is None:
-        raise credentials_exception
+    expires_at = datetime.utcfromtimestamp(claims["exp"]) if "exp" in claims else None
+    return AuthContext(user_id, subject, expires_at, claims)
+
+class TokenCache:
+    """A bounded LRU of verified tokens, keyed by the token's SHA-256.
+
+    A hit skips signature verification. Entries are dropped once the token expires
+    or after AUTH_CACHE_TTL_SECONDS, whichever is sooner. Failed verifications are
+    not cached.
+    """
+
+    def __init__(self, max_size: int = AUTH_CACHE_SIZE, ttl_seconds: int = AUTH_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.reset()
+
+    def reset(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.verifications = 0
+        self.total_verify_ms = 0.0
+
+    def verify(self, token: str) -> Optional[AuthContext]:
+        key = hashlib.sha256(token.encode()).digest()
+        now = time.time()
+        
+        entry = self.entries.get(key)
+        if entry is not None:
+            context, valid_until = entry
+            if now < valid_until:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return context
+            del self.entries[key]
+        
+        self.misses += 1
+        started = time.perf_counter()
+        context = decode_token(token)
+        self.verifications += 1
+        self.total_verify_ms += (time.perf_counter() - started) * 1000
+        
+        if context is not None and self.max_size > 0:
+            valid_until = now + self.ttl_seconds
+            if "exp" in context.claims:
+                valid_until = min(valid_until, context.claims["exp"])
+            self.entries[key] = (context, valid_until)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        
+        return context
+
+    def snapshot(self) -> dict:
+        """Cache counters in the shape served by /api/metrics."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "maxSize": self.max_size,
+            "ttlSeconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "verifications": self.verifications,
+            "avgVerifyMs": round(self.total_verify_ms / self.verifications, 4) if self.verifications else 0.0
+        }
+
+# Global cache of verified tokens
+token_cache = TokenCache()
+
+def verify_token(token: str) -> Optional[str]:
+    """Verify a JWT token and return the user ID."""
+    context = token_cache.verify(token)
+    return context.subject if context else None
+
+async def get_auth_context(credentials: HTTPAuthorizationCredentials = Depends(security)) -> AuthContext:
+    """The request's verified identity; resolved once per request however many dependencies use it.
+
+    Refresh tokens are refused here, and revoked tokens are found in memory (see
+    revocation.py). Tokens issued before jti existed are accepted, and can only be
+    revoked by revoking all of the user's sessions.
+    """
+    context = token_cache.verify(credentials.credentials)
+    if (
+        context is None
+        or context.claims.get("typ", ACCESS_TOKEN) != ACCESS_TOKEN
+        or await revocation_list.is_revoked(context.subject, context.claims)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     
-    return user_id
+    return context
+
+async def get_current_user_id(context: AuthContext = Depends(get_auth_context)) -> ObjectId:
+    """The current user's id, parsed once per request from the verified token."""
+    return context.user_id
+
+async def require_metrics_access(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Admit the METRICS_TOKEN bearer to /api/metrics, or any signed-in user if it is not set."""
+    if not METRICS_TOKEN:
+        await get_auth_context(credentials)
+    elif not secrets.compare_digest(credentials.credentials.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
 def calculate_level(xp: int) -> int:
     """Calculate user level based on XP."""
-    return (xp // 500) + 1
+    return (xp // XP_PER_LEVEL) + 1
 
 def calculate_xp_for_next_level(current_xp: int) -> int:
     """Calculate XP needed for next level."""
     current_level = calculate_level(current_xp)
-    next_level_xp = current_level * 500
+    next_level_xp = current_level * XP_PER_LEVEL
     return next_level_xp - current_xp
\ No newline at end of file
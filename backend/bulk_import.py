@@ -0,0 +1,319 @@
+"""Bulk flashcard import.
+
+An upload is a JSON array, NDJSON, or CSV (with a header row naming the
+FlashcardCreate fields), sent as the request body or as the `file` part of a
+multipart form. Rows are parsed and validated as the body arrives and written with
+unordered `insert_many` calls of BULK_INSERT_CHUNK cards, one in flight while the
+next chunk is parsed, so neither the upload nor the cards are held in memory.
+
+Invalid rows are skipped and reported by their 1-based position in the upload
+(CSV header excluded). The rollup counters and the XP for all inserted cards are
+applied once at the end, with one `$inc` each.
+"""
+import asyncio
+import codecs
+import csv
+import io
+import json
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional, Tuple, Union
+import orjson
+from bson import ObjectId
+from fastapi import HTTPException, Request, status
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+from starlette.datastructures import UploadFile
+from database import get_collection
+from models.flashcard import Flashcard, FlashcardCreate
+from rollups import apply_delta, flashcard_counters
+from xp import award_xp, FLASHCARD_CREATED
+
+MAX_BULK_ROWS = 50_000
+# Checked against Content-Length before anything is read
+MAX_BULK_BYTES = 32 * 1024 * 1024
+BULK_INSERT_CHUNK = 1000
+# Rows past this many failures are still counted, just not itemized
+MAX_REPORTED_ERRORS = 1000
+XP_PER_CARD = 5
+
+# Upload format by media type and by file extension
+MEDIA_FORMATS = {
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "text/csv": "csv",
+}
+EXTENSION_FORMATS = {"json": "json", "ndjson": "ndjson", "jsonl": "ndjson", "csv": "csv"}
+
+UPLOAD_READ_SIZE = 64 * 1024
+
+# A parsed row, or the reason it could not be parsed
+Row = Union[dict, str]
+
+def upload_format(media_type: Optional[str], filename: Optional[str] = None) -> str:
+    media_type = (media_type or "").split(";")[0].strip().lower()
+    if media_type in MEDIA_FORMATS:
+        return MEDIA_FORMATS[media_type]
+    extension = (filename or "").rpartition(".")[2].lower()
+    if extension in EXTENSION_FORMATS:
+        return EXTENSION_FORMATS[extension]
+    raise HTTPException(
+        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        detail="Upload must be a JSON array, NDJSON, or CSV"
+    )
+
+async def _file_chunks(upload: UploadFile) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await upload.read(UPLOAD_READ_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+async def upload_chunks(request: Request) -> Tuple[str, AsyncIterator[bytes]]:
+    """The upload's format and an iterator over its raw bytes."""
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > MAX_BULK_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Upload exceeds {MAX_BULK_BYTES} bytes"
+        )
+
+    content_type = request.headers.get("content-type", "")
+    if content_type.split(";")[0].strip().lower() != "multipart/form-data":
+        return upload_format(content_type), request.stream()
+
+    # Multipart file parts are spooled to disk by the form parser, then read back in pieces
+    form = await request.form()
+    upload = form.get("file")
+    if not isinstance(upload, UploadFile):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Multipart uploads must carry the cards in a 'file' part"
+        )
+    return upload_format(upload.content_type, upload.filename), _file_chunks(upload)
+
+async def _text_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    async for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+async def json_array_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    """The elements of a JSON array, decoded one at a time as the text arrives."""
+    decoder = json.JSONDecoder()
+    buffer, position, started, closed = "", 0, False, False
+
+    async def texts():
+        async for text in _text_chunks(chunks):
+            yield text, False
+        yield "", True
+
+    async for text, final in texts():
+        buffer = buffer[position:] + text
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in (" \t\r\n" if closed else " \t\r\n,"):
+                position += 1
+            if position == len(buffer):
+                break
+            if closed:
+                yield "Unexpected text after the closing ]; it was not read"
+                return
+            if not started:
+                if buffer[position] != "[":
+                    yield "Upload is not a JSON array"
+                    return
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                closed = True
+                position += 1
+                continue
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if final:
+                    yield "Invalid JSON; the rest of the upload was not read"
+                    return
+                # Most likely an element split across chunks; retried once more text arrives
+                break
+            # Only a delimiter ends a value; without one a number, say, may go on in the next chunk
+            if end == len(buffer) or buffer[end] not in " \t\r\n,]":
+                if not final:
+                    break
+                if end < len(buffer):
+                    yield "Invalid JSON; the rest of the upload was not read"
+                    return
+            position = end
+            yield value
+
+    if not closed:
+        yield "Invalid JSON; the rest of the upload was not read"
+
+def _ndjson_row(line: bytes) -> Optional[Row]:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return orjson.loads(line)
+    except orjson.JSONDecodeError as error:
+        return f"Invalid JSON: {error}"
+
+async def ndjson_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    """One row per non-blank line."""
+    pending, first = b"", True
+    async for chunk in chunks:
+        if first:
+            chunk, first = chunk.removeprefix(codecs.BOM_UTF8), False
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            row = _ndjson_row(line)
+            if row is not None:
+                yield row
+
+    row = _ndjson_row(pending)
+    if row is not None:
+        yield row
+
+def _csv_record(record: str) -> List[str]:
+    return next(csv.reader(io.StringIO(record)), [])
+
+async def csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    """Rows keyed by the header row's (lowercased) names; empty cells are left out so defaults apply.
+
+    A record ends at the first newline outside quotes, so quoted cells may span lines.
+    """
+    header = None
+    carry, record, quotes = "", "", 0
+
+    def parse(complete: str) -> Optional[Row]:
+        nonlocal header
+        values = _csv_record(complete)
+        if not any(value.strip() for value in values):
+            return None
+        if header is None:
+            header = [name.strip().lower() for name in values]
+            return None
+        return {name: value for name, value in zip(header, values) if value != ""}
+
+    async for text in _text_chunks(chunks):
+        lines = (carry + text).split("\n")
+        carry = lines.pop()
+        for line in lines:
+            record += line + "\n"
+            quotes += line.count('"')
+            if quotes % 2:
+                continue
+            row = parse(record)
+            record, quotes = "", 0
+            if row is not None:
+                yield row
+
+    record += carry
+    if record:
+        row = parse(record)
+        if row is not None:
+            yield row
+
+ROW_PARSERS = {"json": json_array_rows, "ndjson": ndjson_rows, "csv": csv_rows}
+
+def _messages(error: ValidationError) -> List[str]:
+    return [
+        f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}" if detail["loc"] else detail["msg"]
+        for detail in error.errors()
+    ]
+
+async def _insert_chunk(collection, documents: List[dict], rows: List[int]) -> Tuple[List[dict], List[dict]]:
+    """Insert one chunk; returns the inserted documents and the per-row write errors."""
+    try:
+        await collection.insert_many(documents, ordered=False)
+        return documents, []
+    except BulkWriteError as error:
+        failed = {write_error["index"]: write_error["errmsg"] for write_error in error.details["writeErrors"]}
+        inserted = [document for index, document in enumerate(documents) if index not in failed]
+        return inserted, [{"row": rows[index], "errors": [message]} for index, message in sorted(failed.items())]
+
+async def import_flashcards(user_id: ObjectId, rows: AsyncIterator[Row]) -> dict:
+    """Validate and insert parsed rows as the user's flashcards; returns the import summary.
+
+    The cards inserted before a failure (e.g. the client disconnecting) are still
+    counted in the rollup and awarded XP before the error propagates.
+    """
+    collection = get_collection("flashcards")
+    result = {"received": 0, "inserted": 0, "failed": 0, "truncated": False, "xpAwarded": 0, "errors": []}
+    delta = Counter()
+    now = datetime.utcnow()
+    # The Flashcard defaults, resolved once; each row fills in its own fields and _id
+    template = Flashcard.model_construct(userId=user_id, nextReview=now + timedelta(days=1), createdAt=now).model_dump(by_alias=True)
+
+    def reject(row: int, messages: List[str]):
+        result["failed"] += 1
+        if len(result["errors"]) < MAX_REPORTED_ERRORS:
+            result["errors"].append({"row": row, "errors": messages})
+
+    in_flight = None
+
+    async def finish():
+        nonlocal in_flight
+        if in_flight is None:
+            return
+        insert, in_flight = in_flight, None
+        inserted, write_errors = await insert
+        result["inserted"] += len(inserted)
+        for document in inserted:
+            delta.update(flashcard_counters(document))
+        for write_error in write_errors:
+            reject(write_error["row"], write_error["errors"])
+
+    async def submit(documents: List[dict], numbers: List[int]):
+        """Wait for the previous chunk, then start inserting this one."""
+        nonlocal in_flight
+        await finish()
+        in_flight = asyncio.ensure_future(_insert_chunk(collection, documents, numbers))
+
+    documents, numbers = [], []
+    try:
+        async for row in rows:
+            if result["received"] == MAX_BULK_ROWS:
+                result["truncated"] = True
+                reject(MAX_BULK_ROWS + 1, [f"Upload exceeds {MAX_BULK_ROWS} rows; the rest was not read"])
+                break
+            result["received"] += 1
+            number = result["received"]
+
+            if isinstance(row, str):
+                reject(number, [row])
+                continue
+            try:
+                card = FlashcardCreate.model_validate(row)
+            except ValidationError as error:
+                reject(number, _messages(error))
+                continue
+
+            documents.append({**template, **card.model_dump(), "_id": ObjectId()})
+            numbers.append(number)
+
+            if len(documents) >= BULK_INSERT_CHUNK:
+                await submit(documents, numbers)
+                documents, numbers = [], []
+
+        if documents:
+            await submit(documents, numbers)
+    finally:
+        await finish()
+
+        if result["inserted"]:
+            await apply_delta(user_id, {path: value for path, value in delta.items() if value})
+            result["xpAwarded"] = XP_PER_CARD * result["inserted"]
+            await award_xp(user_id, result["xpAwarded"], FLASHCARD_CREATED)
+
+    result["errors"].sort(key=lambda error: error["row"])
+    return result
@@ -1,10 +1,27 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import Optional
+from bson.codec_options import CodecOptions, TypeEncoder, TypeRegistry
+from pymongo import monitoring, ReturnDocument
+from datetime import date, datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+import asyncio
 import os
+import threading
+import time
+from models.user import USER_INDEXES
+from models.flashcard import FLASHCARD_INDEXES
+from models.test import TEST_INDEXES
+from models.goal import GOAL_INDEXES, CALENDAR_EVENT_INDEXES
+from models.timetable import TIMETABLE_INDEXES
+from models.syllabus import SYLLABUS_OVERRIDE_INDEXES
+from models.xp import XP_EVENT_INDEXES
+from models.token import REVOKED_TOKEN_INDEXES
 
 class Database:
     client: Optional[AsyncIOMotorClient] = None
     database = None
+    pool_options: dict = {}
+    # Whether the server supports transactions; probed on first use (see supports_transactions)
+    transactions: Optional[bool] = None
 
 # Global database instance
 db_instance = Database()
@@ -17,15 +34,250 @@ def get_collection(collection_name: str):
     """Get a specific collection."""
     return db_instance.database[collection_name]
 
-async def connect_to_mongo():
+async def find_one_and_set(
+    collection,
+    document_id,
+    update_fields: dict,
+    owner_id=None,
+    projection: Optional[dict] = None
+) -> Optional[Tuple[dict, dict]]:
+    """Check ownership, apply a $set and return (before, after) in a single round trip.
+
+    Returns None when no document matches, so callers keep their 404 handling. The
+    update only sets top-level fields, so the post-image is the pre-image with the
+    new values applied; callers get both without a second read.
+    """
+    filters = {"_id": document_id}
+    if owner_id is not None:
+        filters["userId"] = owner_id
+    
+    if update_fields:
+        before = await collection.find_one_and_update(
+            filters,
+            {"$set": update_fields},
+            projection=projection,
+            return_document=ReturnDocument.BEFORE
+        )
+    else:
+        before = await collection.find_one(filters, projection)
+    
+    if before is None:
+        return None
+    
+    return before, {**before, **update_fields}
+
+T = TypeVar("T")
+
+async def supports_transactions() -> bool:
+    """Whether the server is a replica set member or mongos; standalone servers have no transactions."""
+    if db_instance.transactions is None:
+        hello = await db_instance.client.admin.command("hello")
+        db_instance.transactions = "setName" in hello or hello.get("msg") == "isdbgrid"
+    return db_instance.transactions
+
+async def run_in_transaction(operation: Callable[[Any], Awaitable[T]]) -> T:
+    """Run `operation(session)` in a transaction, retried on transient errors.
+
+    On a standalone server it runs once with session=None instead, so a multi-document
+    write there is only as atomic as its single command.
+    """
+    if not await supports_transactions():
+        return await operation(None)
+    async with await db_instance.client.start_session() as session:
+        return await session.with_transaction(operation)
+
+class DateEncoder(TypeEncoder):
+    """Store plain dates (goal deadlines, event dates) as midnight datetimes."""
+    python_type = date
+
+    def transform_python(self, value):
+        return datetime(value.year, value.month, value.day)
+
+CODEC_OPTIONS = CodecOptions(type_registry=TypeRegistry([DateEncoder()]))
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool telemetry aggregated across every server the client talks to.
+
+    Motor checks connections out on its executor threads, so the start of a checkout
+    is matched to its completion by thread id.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checkout_started = {}
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._checkout_started.clear()
+            self.open_connections = 0
+            self.in_use = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.pool_clears = 0
+            self.total_wait_ms = 0.0
+            self.max_wait_ms = 0.0
+
+    def _finish_wait(self):
+        started = self._checkout_started.pop(threading.get_ident(), None)
+        if started is None:
+            return
+        wait_ms = (time.perf_counter() - started) * 1000
+        self.total_wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections = max(self.open_connections - 1, 0)
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._checkout_started[threading.get_ident()] = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+            self._finish_wait()
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self._finish_wait()
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use = max(self.in_use - 1, 0)
+
+    def snapshot(self) -> dict:
+        """Current pool counters in the shape served by /api/health and /api/metrics."""
+        with self._lock:
+            return {
+                "maxPoolSize": db_instance.pool_options.get("maxPoolSize"),
+                "minPoolSize": db_instance.pool_options.get("minPoolSize"),
+                "openConnections": self.open_connections,
+                "inUse": self.in_use,
+                "available": max(self.open_connections - self.in_use, 0),
+                "waitingForCheckout": len(self._checkout_started),
+                "checkouts": self.checkouts,
+                "checkoutFailures": self.checkout_failures,
+                "poolClears": self.pool_clears,
+                "avgCheckoutWaitMs": round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0,
+                "maxCheckoutWaitMs": round(self.max_wait_ms, 3)
+            }
+
+# Global pool listener, registered on every client created by connect_to_mongo
+pool_metrics = PoolMetrics()
+
+def get_pool_options() -> dict:
+    """Read connection pool settings from the environment."""
+    return {
+        "maxPoolSize": int(os.environ.get('MONGO_MAX_POOL_SIZE', 100)),
+        "minPoolSize": int(os.environ.get('MONGO_MIN_POOL_SIZE', 10)),
+        "waitQueueTimeoutMS": int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 10000)),
+        "maxIdleTimeMS": int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 300000)),
+    }
+
+async def ping_database() -> float:
+    """Round-trip a ping to the server and return the latency in milliseconds."""
+    started = time.perf_counter()
+    await db_instance.database.command("ping")
+    return round((time.perf_counter() - started) * 1000, 3)
+
+async def warm_up_pool():
+    """Open minPoolSize connections up front with concurrent pings."""
+    min_pool_size = db_instance.pool_options.get("minPoolSize", 0)
+    await asyncio.gather(*(ping_database() for _ in range(max(min_pool_size, 1))))
+
+async def connect_to_mongo(event_listeners: Optional[list] = None):
     """Create database connection."""
     mongo_url = os.environ['MONGO_URL']
     db_name = os.environ.get('DB_NAME', 'jeetracker')
     
-    db_instance.client = AsyncIOMotorClient(mongo_url)
-    db_instance.database = db_instance.client[db_name]
+    db_instance.pool_options = get_pool_options()
+    db_instance.transactions = None
+    pool_metrics.reset()
+    db_instance.client = AsyncIOMotorClient(
+        mongo_url,
+        event_listeners=[pool_metrics, *(event_listeners or [])],
+        **db_instance.pool_options
+    )
+    db_instance.database = db_instance.client.get_database(db_name, codec_options=CODEC_OPTIONS)
+    
+    await warm_up_pool()
+    
+    print(f"Connected to MongoDB: {db_name} (pool {pool_metrics.snapshot()['openConnections']} open, "
+          f"min {db_instance.pool_options['minPoolSize']}, max {db_instance.pool_options['maxPoolSize']})")
+
+# Collection name -> indexes declared alongside each model
+INDEX_REGISTRY = {
+    "users": USER_INDEXES,
+    "flashcards": FLASHCARD_INDEXES,
+    "tests": TEST_INDEXES,
+    "goals": GOAL_INDEXES,
+    "calendar_events": CALENDAR_EVENT_INDEXES,
+    "timetable": TIMETABLE_INDEXES,
+    "syllabus_overrides": SYLLABUS_OVERRIDE_INDEXES,
+    "xp_events": XP_EVENT_INDEXES,
+    "revoked_tokens": REVOKED_TOKEN_INDEXES,
+}
+
+async def ensure_indexes() -> Dict[str, List[str]]:
+    """Create any registry index missing from the database and return what was built.
+
+    Existing indexes are matched by name, so running this repeatedly is a no-op.
+    An existing index whose key differs from the registry, or that the registry no
+    longer lists, is reported, not dropped.
+    """
+    built = {}
+    for collection_name, indexes in INDEX_REGISTRY.items():
+        collection = get_collection(collection_name)
+        existing = await collection.index_information()
+        
+        missing = []
+        for index in indexes:
+            name = index.document["name"]
+            wanted_key = list(index.document["key"].items())
+            if name not in existing:
+                missing.append(index)
+            elif list(existing[name]["key"]) != wanted_key:
+                print(f"Index {collection_name}.{name} exists with a different key; leaving it unchanged")
+        
+        wanted_names = {index.document["name"] for index in indexes}
+        for name in existing:
+            if name != "_id_" and name not in wanted_names:
+                print(f"Index {collection_name}.{name} is not in the registry; drop it if nothing else uses it")
+        
+        if missing:
+            built[collection_name] = await collection.create_indexes(missing)
+    
+    if built:
+        for collection_name, names in built.items():
+            print(f"Built indexes on {collection_name}: {', '.join(names)}")
+    else:
+        print("All indexes already present")
     
-    print(f"Connected to MongoDB: {db_name}")
+    return built
 
 async def close_mongo_connection():
     """Close database connection."""
@@ -33,7 +285,8 @@ async def close_mongo_connection():
         db_instance.client.close()
         print("Disconnected from MongoDB")
 
-# Initial syllabus data to populate for new users
+# The syllabus template new users start from; bump SYLLABUS_VERSION whenever it changes
+SYLLABUS_VERSION = 1
 INITIAL_SYLLABUS = {
     "mains": {
         "physics": [
@@ -0,0 +1,195 @@
+"""Development helpers shared by the query-plan suite and the benchmarks.
+
+Nothing in here is imported by the API itself.
+"""
+import bson
+from bson import ObjectId
+from datetime import datetime, timedelta
+from pymongo import monitoring
+from starlette.requests import Request
+import random
+from database import get_collection, SYLLABUS_VERSION
+from syllabus_templates import get_template, OVERRIDE_COLLECTION, DEFAULT_STATUS
+
+SUBJECTS = ["physics", "chemistry", "mathematics"]
+DIFFICULTIES = ["easy", "medium", "hard"]
+DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+TIME_SLOTS = ["6:00-8:00", "9:00-11:00", "14:00-16:00", "18:00-20:00"]
+STATUSES = ["mastered", "in-progress", "weak", "revise-soon", "not-started"]
+
+# Commands whose plans are worth explaining; inserts never scan.
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+
+class CommandRecorder(monitoring.CommandListener):
+    """Records commands sent through the client it is registered on.
+
+    By default only explainable commands are kept; pass command_names=None to keep all.
+    `reply_bytes` totals the BSON size of the replies to the recorded commands.
+    """
+
+    def __init__(self, command_names=EXPLAINABLE_COMMANDS):
+        self.commands = []
+        self.reply_bytes = 0
+        self.enabled = True
+        self.command_names = command_names
+
+    def clear(self):
+        self.commands = []
+        self.reply_bytes = 0
+
+    def _wanted(self, event) -> bool:
+        return self.enabled and (self.command_names is None or event.command_name in self.command_names)
+
+    def started(self, event):
+        if self._wanted(event):
+            self.commands.append((event.database_name, event.command_name, dict(event.command)))
+
+    def succeeded(self, event):
+        if self._wanted(event):
+            self.reply_bytes += len(bson.encode(event.reply))
+
+    def failed(self, event):
+        pass
+
+def strip_command(command: dict) -> dict:
+    """Drop session, transaction and routing fields so a captured command can be re-sent inside explain."""
+    return {
+        key: value for key, value in command.items()
+        if not key.startswith("$") and key not in ("lsid", "txnNumber", "autocommit", "startTransaction", "readConcern")
+    }
+
+def upload_request(content_type: str, body: bytes, chunk_size: int = 4096) -> Request:
+    """A POST request whose body arrives in `chunk_size` pieces, for handlers that read the raw upload."""
+    chunks = [body[start:start + chunk_size] for start in range(0, len(body), chunk_size)] or [b""]
+
+    async def receive():
+        chunk = chunks.pop(0)
+        return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+
+    scope = {"type": "http", "method": "POST", "path": "/", "headers": [(b"content-type", content_type.encode())]}
+    return Request(scope, receive)
+
+def sample_flashcards(user_id: ObjectId, count: int, rng: random.Random = None, now: datetime = None) -> list:
+    """Build `count` synthetic flashcard documents (with ids) without inserting them."""
+    rng = rng or random.Random(str(user_id))
+    now = now or datetime.utcnow()
+    return [{
+        "_id": ObjectId(),
+        "userId": user_id,
+        "subject": rng.choice(SUBJECTS),
+        "topic": f"Topic {i % 25}",
+        "question": f"Question {i} " + "q" * rng.randint(20, 200),
+        "answer": f"Answer {i} " + "a" * rng.randint(20, 400),
+        "difficulty": rng.choice(DIFFICULTIES),
+        "lastReviewed": now - timedelta(days=rng.randint(0, 30)),
+        "nextReview": now + timedelta(days=rng.randint(-10, 30)),
+        "reviewCount": rng.randint(0, 12),
+        "correctCount": rng.randint(0, 6),
+        "createdAt": now - timedelta(minutes=i)
+    } for i in range(count)]
+
+def sample_tests(user_id: ObjectId, count: int, rng: random.Random = None, now: datetime = None) -> list:
+    """Build `count` synthetic test result documents (with ids) without inserting them."""
+    rng = rng or random.Random(str(user_id))
+    now = now or datetime.utcnow()
+    docs = []
+    for i in range(count):
+        total = rng.choice([300, 360])
+        score = rng.randint(total // 4, total)
+        docs.append({
+            "_id": ObjectId(),
+            "userId": user_id,
+            "type": rng.choice(["mains", "advanced"]),
+            "date": now - timedelta(days=i),
+            "score": score,
+            "totalMarks": total,
+            "accuracy": round(score / total * 100, 2),
+            "timeSpent": rng.randint(60, 180),
+            "subjects": {
+                subject: {"score": score // 3, "total": total // 3, "accuracy": round(rng.uniform(30, 100), 2)}
+                for subject in SUBJECTS
+            },
+            "weakTopics": rng.sample(["Optics", "Calculus", "Organic Chemistry", "Mechanics", "Algebra"], 2),
+            "createdAt": now - timedelta(days=i)
+        })
+    return docs
+
+async def seed_user_data(
+    user_id: ObjectId,
+    flashcards: int = 200,
+    tests: int = 50,
+    goals: int = 30,
+    events: int = 20,
+    rng: random.Random = None
+):
+    """Insert a synthetic but realistic data set for one user."""
+    rng = rng or random.Random(str(user_id))
+    now = datetime.utcnow()
+
+    await get_collection("users").insert_one({
+        "_id": user_id,
+        "email": f"{user_id}@seed.local",
+        "password": "x",
+        "name": f"Seed {user_id}",
+        "totalXP": rng.randint(0, 5000),
+        "currentStreak": 0,
+        "longestStreak": 0,
+        "totalStudyHours": 0,
+        "level": 1,
+        "badges": [],
+        "createdAt": now,
+        "lastActiveDate": now,
+        "syllabusVersion": SYLLABUS_VERSION
+    })
+
+    # Topics the user has moved off the default status get an override, as real use would
+    overrides = []
+    for topic in await get_template(SYLLABUS_VERSION):
+        topic_status = rng.choice(STATUSES)
+        if topic_status != DEFAULT_STATUS:
+            overrides.append({"userId": user_id, "topicId": topic["_id"], "status": topic_status, "updatedAt": now})
+    if overrides:
+        await get_collection(OVERRIDE_COLLECTION).insert_many(overrides)
+
+    if flashcards:
+        await get_collection("flashcards").insert_many(sample_flashcards(user_id, flashcards, rng, now))
+
+    if tests:
+        await get_collection("tests").insert_many(sample_tests(user_id, tests, rng, now))
+
+    if goals:
+        await get_collection("goals").insert_many([{
+            "userId": user_id,
+            "title": f"Goal {i}",
+            "description": "Seeded goal",
+            "deadline": (now + timedelta(days=rng.randint(-10, 60))).date(),
+            "progress": rng.randint(0, 100),
+            "priority": rng.choice(["high", "medium", "low"]),
+            "category": rng.choice(["syllabus", "performance", "routine"]),
+            "completed": rng.random() < 0.3,
+            "createdAt": now,
+            "updatedAt": now
+        } for i in range(goals)])
+
+    if events:
+        await get_collection("calendar_events").insert_many([{
+            "userId": user_id,
+            "title": f"Event {i}",
+            "description": None,
+            "date": (now + timedelta(days=rng.randint(-10, 30))).date(),
+            "time": None,
+            "type": rng.choice(["test", "study", "revision", "practice", "milestone"]),
+            "priority": "medium",
+            "completed": False,
+            "createdAt": now
+        } for i in range(events)])
+
+    await get_collection("timetable").insert_many([{
+        "userId": user_id,
+        "day": day,
+        "time": slot,
+        "subject": rng.choice(SUBJECTS),
+        "topic": "Seeded topic",
+        "completed": rng.random() < 0.5,
+        "createdAt": now
+    } for day in DAYS for slot in TIME_SLOTS])
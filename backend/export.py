@@ -0,0 +1,177 @@
+"""Streaming export of a user's full data set.
+
+Each exported collection is read with one cursor in the order of an existing
+userId-prefixed index, encoded in chunks, and written to the response as it
+arrives, so memory stays flat however much history a user has. The syllabus,
+one template plus the user's overrides, is merged in memory as it is for reads.
+
+Every row carries its collection and `_id`. A client whose download broke off
+passes the last complete row back as `after=<collection>:<_id>`; the export then
+restarts just past that row (or at the start of its collection if the row has
+since been deleted).
+
+NDJSON rows are documents with a leading "collection" key. CSV output has one
+section per collection, each starting with its own header row whose first cell
+is "collection"; list and dict values are written as JSON.
+"""
+import csv
+import io
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+import orjson
+from bson import ObjectId
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from database import get_collection
+from fastjson import encode_bson_value
+from models.flashcard import Flashcard
+from models.goal import Goal, CalendarEvent
+from models.syllabus import SyllabusItem
+from models.test import TestResult
+from models.timetable import TimetableEntry
+from pagination import with_tiebreak, keyset_filter
+from streaming import stream
+from syllabus_templates import user_topics
+
+EXPORT_FORMATS = ("ndjson", "csv")
+
+# Collections in export order, each with an index-backed sort and the model that fixes its CSV columns
+EXPORT_SOURCES: List[Tuple[str, Optional[List[Tuple[str, int]]], type]] = [
+    ("tests", [("date", -1)], TestResult),
+    ("flashcards", [("createdAt", -1)], Flashcard),
+    ("goals", [("deadline", 1)], Goal),
+    ("timetable", [("day", 1), ("time", 1)], TimetableEntry),
+    # Merged from the template and the user's overrides rather than read from a collection
+    ("syllabus", None, SyllabusItem),
+    ("calendar_events", [("date", 1)], CalendarEvent),
+]
+
+# Rows encoded per chunk written to the response
+EXPORT_CHUNK_ROWS = 200
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# The owner is implied by the export, so it is not repeated on every row
+EXPORT_PROJECTION = {"userId": 0}
+
+# (index of the first source, keyset filter, or for the syllabus the topic id, to resume after)
+Start = Tuple[int, Optional[object]]
+
+async def resolve_checkpoint(user_id: ObjectId, after: Optional[str]) -> Start:
+    """Turn an `after=<collection>:<_id>` checkpoint into (source index, keyset filter or None)."""
+    if after is None:
+        return 0, None
+
+    collection_name, _, document_id = after.partition(":")
+    names = [name for name, _, _ in EXPORT_SOURCES]
+    if collection_name not in names or not ObjectId.is_valid(document_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid export checkpoint; expected <collection>:<_id> with collection one of {', '.join(names)}"
+        )
+
+    index = names.index(collection_name)
+    if EXPORT_SOURCES[index][1] is None:
+        return index, ObjectId(document_id)
+
+    sort = with_tiebreak(EXPORT_SOURCES[index][1])
+    checkpoint = await get_collection(collection_name).find_one(
+        {"_id": ObjectId(document_id), "userId": user_id},
+        {key: 1 for key, _ in sort}
+    )
+    if checkpoint is None:
+        return index, None
+    return index, keyset_filter(sort, [checkpoint.get(key) for key, _ in sort])
+
+async def export_documents(user_id: ObjectId, start: Start) -> AsyncIterator[Tuple[str, type, dict]]:
+    """Yield (collection, model, document) for every exported document, from `start` on."""
+    first, resume_after = start
+    for index in range(first, len(EXPORT_SOURCES)):
+        collection_name, sort, model = EXPORT_SOURCES[index]
+        resume = resume_after if index == first else None
+        if sort is None:
+            topics = await user_topics(user_id)
+            if resume is not None:
+                # Topics follow template order; an unknown id restarts the section
+                ids = [topic["_id"] for topic in topics]
+                topics = topics[ids.index(resume) + 1:] if resume in ids else topics
+            for topic in topics:
+                topic.pop("userId")
+                yield collection_name, model, topic
+            continue
+
+        filters = {"userId": user_id}
+        if resume is not None:
+            filters = {"$and": [filters, resume]}
+
+        async for document in stream(get_collection(collection_name), filters, EXPORT_PROJECTION, with_tiebreak(sort)):
+            yield collection_name, model, document
+
+async def ndjson_chunks(rows: AsyncIterator[Tuple[str, type, dict]]) -> AsyncIterator[bytes]:
+    lines = []
+    async for collection_name, _, document in rows:
+        lines.append(orjson.dumps({"collection": collection_name, **document}, default=encode_bson_value))
+        if len(lines) >= EXPORT_CHUNK_ROWS:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+def csv_columns(model: type) -> List[str]:
+    """The document keys exported for `model`: `_id` first, the owner left out."""
+    keys = [info.alias or name for name, info in model.model_fields.items()]
+    return ["_id"] + [key for key in keys if key not in ("_id", "userId")]
+
+def csv_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, dict)):
+        return orjson.dumps(value, default=encode_bson_value).decode()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+async def csv_chunks(rows: AsyncIterator[Tuple[str, type, dict]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    current, columns, pending = None, None, 0
+    async for collection_name, model, document in rows:
+        if collection_name != current:
+            current, columns = collection_name, csv_columns(model)
+            writer.writerow(["collection", *columns])
+        writer.writerow([collection_name, *(csv_cell(document.get(key)) for key in columns)])
+        pending += 1
+        if pending >= EXPORT_CHUNK_ROWS:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Compress a byte stream into one gzip member as it goes."""
+    compressor = zlib.compressobj(wbits=31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def export_response(user_id: ObjectId, export_format: str, compress: bool, start: Start) -> StreamingResponse:
+    """The streaming download for an export in `export_format` ("ndjson" or "csv")."""
+    encode = ndjson_chunks if export_format == "ndjson" else csv_chunks
+    body = encode(export_documents(user_id, start))
+    filename = f"jee-tracker-export.{export_format}"
+    media_type = MEDIA_TYPES[export_format]
+    if compress:
+        body = gzip_chunks(body)
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -0,0 +1,105 @@
+"""Client-selected sparse fieldsets.
+
+`?fields=id,subject,question` on a list or detail endpoint is validated against the
+endpoint's model and becomes a Mongo projection, so unselected fields are never read
+into the response or sent over the wire. The result is serialized through a model
+generated for exactly that selection; generated models are cached per selection.
+
+The response helpers here serve full (unselected) responses too, validating whole
+result sets with a cached TypeAdapter rather than one model call per document.
+"""
+from functools import lru_cache
+from typing import List, Optional, Tuple, Type
+from fastapi import HTTPException, status
+from fastapi.responses import Response
+from pydantic import BaseModel, TypeAdapter, create_model
+
+FIELDS_DESCRIPTION = "Comma-separated fields to return (e.g. id,subject,question); all fields when omitted"
+
+def parse_fields(model: Type[BaseModel], fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Validate a `fields` parameter against `model`.
+
+    Returns None when no selection was made. `id` is always included, and the
+    selection is returned in model order so equal selections share a cached model.
+    """
+    if fields is None:
+        return None
+
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = sorted(requested - set(model.model_fields))
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown) or '(none selected)'}. "
+                   f"Allowed: {', '.join(model.model_fields)}"
+        )
+
+    return tuple(name for name in model.model_fields if name == "id" or name in requested)
+
+def field_projection(model: Type[BaseModel], selected: Optional[Tuple[str, ...]], *extra: str) -> Optional[dict]:
+    """Mongo projection for a selection, plus `extra` document fields (e.g. sort keys).
+
+    Returns None (fetch everything) when nothing was selected.
+    """
+    if selected is None:
+        return None
+
+    projection = {}
+    for name in selected:
+        projection[model.model_fields[name].alias or name] = 1
+    for name in extra:
+        projection[name] = 1
+    return projection
+
+@lru_cache(maxsize=256)
+def sparse_model(model: Type[BaseModel], selected: Tuple[str, ...]) -> Type[BaseModel]:
+    """A model with only the selected fields of `model`, keeping their types, aliases and defaults."""
+    fields = {name: (model.model_fields[name].annotation, model.model_fields[name]) for name in selected}
+    return create_model(f"{model.__name__}Fields", __config__=model.model_config, **fields)
+
+@lru_cache(maxsize=256)
+def sparse_envelope(
+    envelope: Type[BaseModel],
+    list_field: str,
+    model: Type[BaseModel],
+    selected: Tuple[str, ...]
+) -> Type[BaseModel]:
+    """`envelope` (e.g. FlashcardPage) with its `list_field` holding sparse items."""
+    fields = {name: (info.annotation, info) for name, info in envelope.model_fields.items()}
+    fields[list_field] = (List[sparse_model(model, selected)], ...)
+    return create_model(f"{envelope.__name__}Fields", __config__=envelope.model_config, **fields)
+
+@lru_cache(maxsize=256)
+def list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    """TypeAdapter(List[model]), built once per model."""
+    return TypeAdapter(List[model])
+
+def record_response(record, selected: Optional[Tuple[str, ...]] = None) -> Response:
+    """Serialize one record (see repositories), sparse when fields were `selected`."""
+    return Response(record.to_api(selected).model_dump_json(by_alias=True), media_type="application/json")
+
+def list_response(model: Type[BaseModel], records: list) -> Response:
+    """Validate and serialize a bare list of records with one adapter call each way."""
+    adapter = list_adapter(model)
+    items = adapter.validate_python(records, from_attributes=True)
+    return Response(adapter.dump_json(items, by_alias=True), media_type="application/json")
+
+def page_response(
+    envelope: Type[BaseModel],
+    list_field: str,
+    model: Type[BaseModel],
+    selected: Optional[Tuple[str, ...]],
+    records: list,
+    **values
+) -> Response:
+    """Serialize a page of records; `values` fills the envelope's other fields.
+
+    The items are validated in one TypeAdapter call straight from the records'
+    attributes, and the page is dumped to JSON in one call. The response is
+    complete, so FastAPI does not validate it again against `response_model`.
+    """
+    if selected is not None:
+        envelope, model = sparse_envelope(envelope, list_field, model, selected), sparse_model(model, selected)
+    items = list_adapter(model).validate_python(records, from_attributes=True)
+    page = envelope.model_construct(**{list_field: items}, **values)
+    return Response(page.model_dump_json(by_alias=True), media_type="application/json")
@@ -0,0 +1,148 @@
+"""Request-scoped loading of documents by _id.
+
+Handlers and the helpers they call often read the same document more than once
+in a request: the user for a streak check and again for the response, the rollup
+from several stats routes of one batch. `load(collection, _id)` coalesces those
+reads. Loads issued in the same event-loop turn go to the server as one
+`{"_id": {"$in": [...]}}` query, and each result is remembered for the rest of
+the request, DataLoader-style.
+
+LoaderScopeMiddleware opens a scope per HTTP request. Sub-requests of
+POST /api/batch run inside the batch request's scope, so they share its loads.
+Outside a scope (scripts, benchmarks, handlers called directly) `load` is a
+plain find_one.
+
+A remembered document is only as fresh as its read. Code that writes a document
+it may have loaded calls `forget(collection, _id)` after the write, so later
+loads in the same scope read it again.
+"""
+import asyncio
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from database import get_collection
+
+class LoaderStats:
+    """Process-wide counters, per collection, in the shape served by /api/metrics."""
+
+    def __init__(self):
+        self.loads = Counter()
+        self.queries = Counter()
+        self.scopes = 0
+
+    def snapshot(self) -> dict:
+        collections = {}
+        for name in sorted(self.loads):
+            loads, queries = self.loads[name], self.queries[name]
+            collections[name] = {"loads": loads, "queries": queries, "roundTripsAvoided": loads - queries}
+        return {
+            "scopes": self.scopes,
+            "roundTripsAvoided": sum(self.loads.values()) - sum(self.queries.values()),
+            "collections": collections
+        }
+
+loader_stats = LoaderStats()
+
+class ByIdLoader:
+    """Loads documents of one collection by _id, batching the loads of each event-loop turn."""
+
+    def __init__(self, collection_name: str):
+        self.collection_name = collection_name
+        self.results: Dict[object, asyncio.Future] = {}
+        self.queued: List[Tuple[object, asyncio.Future]] = []
+        # Strong references to running fetches, which the event loop only holds weakly
+        self.fetching = set()
+
+    def load(self, document_id) -> asyncio.Future:
+        loader_stats.loads[self.collection_name] += 1
+        result = self.results.get(document_id)
+        if result is None:
+            loop = asyncio.get_running_loop()
+            result = self.results[document_id] = loop.create_future()
+            if not self.queued:
+                loop.call_soon(self.dispatch)
+            self.queued.append((document_id, result))
+        return result
+
+    def forget(self, document_id):
+        self.results.pop(document_id, None)
+
+    def dispatch(self):
+        queued, self.queued = self.queued, []
+        task = asyncio.ensure_future(self.fetch(queued))
+        self.fetching.add(task)
+        task.add_done_callback(self.fetching.discard)
+
+    async def fetch(self, queued: List[Tuple[object, asyncio.Future]]):
+        # An id can be queued twice if it was forgotten in between; it is still read once
+        ids = list(dict.fromkeys(document_id for document_id, _ in queued))
+        loader_stats.queries[self.collection_name] += 1
+        collection = get_collection(self.collection_name)
+        try:
+            if len(ids) == 1:
+                found = await collection.find_one({"_id": ids[0]})
+                documents = {ids[0]: found} if found is not None else {}
+            else:
+                documents = {document["_id"]: document async for document in collection.find({"_id": {"$in": ids}})}
+        except Exception as e:
+            for document_id, result in queued:
+                # Failures are not remembered; the next load retries
+                if self.results.get(document_id) is result:
+                    del self.results[document_id]
+                if not result.done():
+                    result.set_exception(e)
+            return
+
+        for document_id, result in queued:
+            if not result.done():
+                result.set_result(documents.get(document_id))
+
+class LoaderScope:
+    """The loaders of one request, created per collection on first use."""
+
+    def __init__(self):
+        self.loaders: Dict[str, ByIdLoader] = {}
+        loader_stats.scopes += 1
+
+    def loader(self, collection_name: str) -> ByIdLoader:
+        loader = self.loaders.get(collection_name)
+        if loader is None:
+            loader = self.loaders[collection_name] = ByIdLoader(collection_name)
+        return loader
+
+current_scope: ContextVar[Optional[LoaderScope]] = ContextVar("loader_scope", default=None)
+
+async def load(collection_name: str, document_id) -> Optional[dict]:
+    """The document with this _id, or None; shared by every load of it in the current request.
+
+    Callers get the remembered document itself, not a copy, and must not modify it.
+    """
+    scope = current_scope.get()
+    if scope is None:
+        loader_stats.loads[collection_name] += 1
+        loader_stats.queries[collection_name] += 1
+        return await get_collection(collection_name).find_one({"_id": document_id})
+    return await asyncio.shield(scope.loader(collection_name).load(document_id))
+
+def forget(collection_name: str, document_id):
+    """Drop a remembered document after writing it, so the next load reads it again."""
+    scope = current_scope.get()
+    if scope is not None and collection_name in scope.loaders:
+        scope.loaders[collection_name].forget(document_id)
+
+class LoaderScopeMiddleware:
+    """Open a LoaderScope for every HTTP request not already inside one."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or current_scope.get() is not None:
+            await self.app(scope, receive, send)
+            return
+
+        token = current_scope.set(LoaderScope())
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_scope.reset(token)
@@ -0,0 +1,79 @@
+"""Maintenance commands for the JEE Tracker backend.
+
+Usage: python manage.py <command>
+"""
+from bson import ObjectId
+from dotenv import load_dotenv
+from pathlib import Path
+import asyncio
+import typer
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+from database import connect_to_mongo, close_mongo_connection, ensure_indexes
+import rollups
+import syllabus_templates
+import xp
+
+app = typer.Typer(help="JEE Tracker maintenance commands")
+
+def run(coroutine_function):
+    """Run a coroutine function against a fresh database connection."""
+    async def runner():
+        await connect_to_mongo()
+        try:
+            return await coroutine_function()
+        finally:
+            await close_mongo_connection()
+    
+    return asyncio.run(runner())
+
+@app.command("ensure-indexes")
+def ensure_indexes_command():
+    """Create any missing indexes from the model registry."""
+    built = run(ensure_indexes)
+    typer.echo(f"Built {sum(len(names) for names in built.values())} index(es)")
+
+@app.command("reconcile-xp")
+def reconcile_xp_command(
+    skip_baseline: bool = typer.Option(False, help="Do not create baseline events for pre-ledger users")
+):
+    """Rebuild every user's totalXP and level from the XP ledger."""
+    async def reconcile():
+        baselines = 0 if skip_baseline else await xp.record_baselines()
+        corrected = await xp.reconcile_xp_totals()
+        return baselines, corrected
+    
+    baselines, corrected = run(reconcile)
+    typer.echo(f"Recorded {baselines} baseline event(s); corrected {corrected} user total(s)")
+
+@app.command("rebuild-rollups")
+def rebuild_rollups_command(
+    user_id: str = typer.Option(None, help="Only rebuild this user's rollup")
+):
+    """Recount dashboard rollups from the source collections to repair drift."""
+    async def rebuild():
+        if user_id:
+            await rollups.rebuild_rollup(ObjectId(user_id))
+            return 1
+        return await rollups.rebuild_all_rollups()
+    
+    rebuilt = run(rebuild)
+    typer.echo(f"Rebuilt {rebuilt} rollup(s)")
+
+@app.command("migrate-syllabus")
+def migrate_syllabus_command(
+    drop_legacy: bool = typer.Option(False, help="Drop the legacy per-user syllabus collection afterwards")
+):
+    """Convert per-user syllabus copies into overrides on the shared template."""
+    stats = run(lambda: syllabus_templates.migrate_legacy_syllabus(drop_legacy=drop_legacy))
+    typer.echo(
+        f"Migrated {stats['users']} user(s) with {stats['overrides']} override(s); "
+        f"{stats['unmatched']} unmatched topic(s)"
+    )
+    if drop_legacy:
+        typer.echo("Dropped the legacy syllabus collection" if stats["dropped"] else "Kept the legacy syllabus collection: some topics are unmatched")
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,21 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+
+# Sub-requests accepted in one batch
+MAX_BATCH_ITEMS = 20
+
+class BatchItem(BaseModel):
+    id: str  # unique within the batch; keys this item's result
+    method: str = 'GET'
+    path: str  # e.g. '/api/tests/?limit=5'
+    body: Optional[Any] = None  # sent as JSON
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem] = Field(..., min_length=1, max_length=MAX_BATCH_ITEMS)
+
+class BatchResult(BaseModel):
+    status: int
+    body: Any = None
+
+class BatchResponse(BaseModel):
+    results: Dict[str, BatchResult]
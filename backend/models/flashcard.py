@@ -1,11 +1,12 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Optional
 from datetime import datetime, timedelta
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from models.user import PyObjectId
 
 class Flashcard(BaseModel):
-    id: PyObjectId = Field(default_factory=PyObjectId, alias='_id')
+    id: PyObjectId = Field(default_factory=ObjectId, alias='_id')
     userId: PyObjectId
     subject: str
     topic: str
@@ -18,10 +19,16 @@ class Flashcard(BaseModel):
     correctCount: int = 0
     createdAt: datetime = Field(default_factory=datetime.utcnow)
 
-    class Config:
-        allow_population_by_field_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
+    model_config = ConfigDict(populate_by_name=True)
+
+class FlashcardPage(BaseModel):
+    items: List[Flashcard]
+    nextCursor: Optional[str] = None
+
+class DueFlashcards(BaseModel):
+    totalDue: int
+    cards: List[Flashcard]
+    nextCursor: Optional[str] = None
 
 class FlashcardCreate(BaseModel):
     subject: str
@@ -40,9 +47,50 @@ class FlashcardUpdate(BaseModel):
 class FlashcardReview(BaseModel):
     isCorrect: bool
 
+# Reviews accepted in one batch; a study session is typically 10-50 cards
+MAX_REVIEW_BATCH = 500
+
+class FlashcardReviewItem(BaseModel):
+    cardId: PyObjectId
+    isCorrect: bool
+
+class FlashcardReviewBatch(BaseModel):
+    reviews: List[FlashcardReviewItem] = Field(..., min_length=1, max_length=MAX_REVIEW_BATCH)  # in the order they happened
+    timeSpent: int = 0  # in minutes
+
+class ReviewOutcome(BaseModel):
+    cardId: PyObjectId
+    isCorrect: bool
+    nextReview: datetime
+    accuracy: float  # the card's accuracy after this review
+
+class BulkRowError(BaseModel):
+    row: int  # 1-based position in the upload
+    errors: List[str]
+
+class FlashcardBulkResult(BaseModel):
+    received: int
+    inserted: int
+    failed: int
+    truncated: bool = False  # rows past the import limit were not read
+    xpAwarded: int = 0
+    errors: List[BulkRowError] = []
+
 class StudySession(BaseModel):
     totalCards: int
     correctAnswers: int
     incorrectAnswers: int
     accuracy: float
-    timeSpent: int  # in minutes
\ No newline at end of file
+    timeSpent: int  # in minutes
+
+class FlashcardReviewBatchResult(BaseModel):
+    session: StudySession
+    results: List[ReviewOutcome]
+    notFound: List[PyObjectId] = []
+    xpAwarded: int
+
+# Indexes reconciled at startup by database.ensure_indexes()
+FLASHCARD_INDEXES = [
+    IndexModel([("userId", ASCENDING), ("nextReview", ASCENDING), ("_id", ASCENDING)], name="userId_nextReview_id"),
+    IndexModel([("userId", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)], name="userId_createdAt_id"),
+]
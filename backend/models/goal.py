@@ -1,11 +1,12 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Optional
 from datetime import datetime, date
 from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
 from models.user import PyObjectId
 
 class Goal(BaseModel):
-    id: PyObjectId = Field(default_factory=PyObjectId, alias='_id')
+    id: PyObjectId = Field(default_factory=ObjectId, alias='_id')
     userId: PyObjectId
     title: str
     description: str
@@ -17,10 +18,11 @@ class Goal(BaseModel):
     createdAt: datetime = Field(default_factory=datetime.utcnow)
     updatedAt: datetime = Field(default_factory=datetime.utcnow)
 
-    class Config:
-        allow_population_by_field_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
+    model_config = ConfigDict(populate_by_name=True)
+
+class GoalPage(BaseModel):
+    items: List[Goal]
+    nextCursor: Optional[str] = None
 
 class GoalCreate(BaseModel):
     title: str
@@ -39,7 +41,7 @@ class GoalUpdate(BaseModel):
     completed: Optional[bool] = None
 
 class CalendarEvent(BaseModel):
-    id: PyObjectId = Field(default_factory=PyObjectId, alias='_id')
+    id: PyObjectId = Field(default_factory=ObjectId, alias='_id')
     userId: PyObjectId
     title: str
     description: Optional[str] = None
@@ -50,10 +52,11 @@ class CalendarEvent(BaseModel):
     completed: bool = False
     createdAt: datetime = Field(default_factory=datetime.utcnow)
 
-    class Config:
-        allow_population_by_field_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
+    model_config = ConfigDict(populate_by_name=True)
+
+class CalendarEventPage(BaseModel):
+    items: List[CalendarEvent]
+    nextCursor: Optional[str] = None
 
 class CalendarEventCreate(BaseModel):
     title: str
@@ -61,4 +64,17 @@ class CalendarEventCreate(BaseModel):
     date: date
     time: Optional[str] = None
     type: str
-    priority: str = 'medium'
\ No newline at end of file
+    priority: str = 'medium'
+
+# Indexes reconciled at startup by database.ensure_indexes()
+GOAL_INDEXES = [
+    IndexModel(
+        [("userId", ASCENDING), ("completed", ASCENDING), ("deadline", ASCENDING), ("_id", ASCENDING)],
+        name="userId_completed_deadline_id"
+    ),
+    IndexModel([("userId", ASCENDING), ("deadline", ASCENDING), ("_id", ASCENDING)], name="userId_deadline_id"),
+]
+
+CALENDAR_EVENT_INDEXES = [
+    IndexModel([("userId", ASCENDING), ("date", ASCENDING), ("_id", ASCENDING)], name="userId_date_id"),
+]
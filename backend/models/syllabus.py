@@ -1,11 +1,13 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
 from models.user import PyObjectId
 
 class SyllabusItem(BaseModel):
-    id: PyObjectId = Field(default_factory=PyObjectId, alias='_id')
+    """A template topic merged with the user's override (see syllabus_templates)."""
+    id: PyObjectId = Field(default_factory=ObjectId, alias='_id')
     userId: PyObjectId
     type: str  # 'mains' or 'advanced'
     subject: str  # 'physics', 'chemistry', 'mathematics'
@@ -16,10 +18,18 @@ class SyllabusItem(BaseModel):
     updatedAt: datetime = Field(default_factory=datetime.utcnow)
     createdAt: datetime = Field(default_factory=datetime.utcnow)
 
-    class Config:
-        allow_population_by_field_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
+    model_config = ConfigDict(populate_by_name=True)
+
+class SyllabusOverride(BaseModel):
+    """A user's changes to one template topic; only topics the user has touched have one."""
+    id: PyObjectId = Field(default_factory=ObjectId, alias='_id')
+    userId: PyObjectId
+    topicId: PyObjectId
+    status: Optional[str] = None
+    highYield: Optional[bool] = None
+    updatedAt: datetime = Field(default_factory=datetime.utcnow)
+
+    model_config = ConfigDict(populate_by_name=True)
 
 class SyllabusItemCreate(BaseModel):
     type: str
@@ -32,6 +42,15 @@ class SyllabusItemUpdate(BaseModel):
     status: Optional[str] = None
     highYield: Optional[bool] = None
 
+# Topics accepted in one bulk update; the whole template is a few hundred topics
+MAX_TOPIC_BATCH = 500
+
+class SyllabusTopicUpdate(SyllabusItemUpdate):
+    topicId: PyObjectId
+
+class SyllabusBulkUpdate(BaseModel):
+    updates: List[SyllabusTopicUpdate] = Field(..., min_length=1, max_length=MAX_TOPIC_BATCH)
+
 class SyllabusProgress(BaseModel):
     subject: str
     totalTopics: int
@@ -46,4 +65,9 @@ class OverallProgress(BaseModel):
     totalTopics: int
     completedTopics: int
     progressPercentage: float
-    subjectProgress: List[SyllabusProgress]
\ No newline at end of file
+    subjectProgress: List[SyllabusProgress]
+
+# Indexes reconciled at startup by database.ensure_indexes()
+SYLLABUS_OVERRIDE_INDEXES = [
+    IndexModel([("userId", ASCENDING), ("topicId", ASCENDING)], name="userId_topicId_unique", unique=True),
+]
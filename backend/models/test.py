@@ -1,7 +1,8 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Dict, Optional
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from models.user import PyObjectId
 
 class SubjectScore(BaseModel):
@@ -10,7 +11,7 @@ class SubjectScore(BaseModel):
     accuracy: float
 
 class TestResult(BaseModel):
-    id: PyObjectId = Field(default_factory=PyObjectId, alias='_id')
+    id: PyObjectId = Field(default_factory=ObjectId, alias='_id')
     userId: PyObjectId
     type: str  # 'mains' or 'advanced'
     date: datetime = Field(default_factory=datetime.utcnow)
@@ -22,10 +23,11 @@ class TestResult(BaseModel):
     weakTopics: List[str] = []
     createdAt: datetime = Field(default_factory=datetime.utcnow)
 
-    class Config:
-        allow_population_by_field_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
+    model_config = ConfigDict(populate_by_name=True)
+
+class TestResultPage(BaseModel):
+    items: List[TestResult]
+    nextCursor: Optional[str] = None
 
 class TestResultCreate(BaseModel):
     type: str
@@ -35,12 +37,25 @@ class TestResultCreate(BaseModel):
     subjects: Dict[str, SubjectScore]
     weakTopics: List[str] = []
 
+class WeakTopicCount(BaseModel):
+    topic: str
+    count: int
+
 class TestAnalytics(BaseModel):
     averageScore: float
     totalTests: int
     bestScore: int
     averageTime: int
     recentTests: List[TestResult]
-    weakTopics: List[Dict[str, int]]
+    weakTopics: List[WeakTopicCount]
     subjectPerformance: Dict[str, Dict[str, float]]
-    trend: Dict[str, float]
\ No newline at end of file
+    trend: Dict[str, float]
+
+# Indexes reconciled at startup by database.ensure_indexes()
+TEST_INDEXES = [
+    IndexModel(
+        [("userId", ASCENDING), ("type", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)],
+        name="userId_type_date_id"
+    ),
+    IndexModel([("userId", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)], name="userId_date_id"),
+]
@@ -1,11 +1,12 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
 from models.user import PyObjectId
 
 class TimetableEntry(BaseModel):
-    id: PyObjectId = Field(default_factory=PyObjectId, alias='_id')
+    id: PyObjectId = Field(default_factory=ObjectId, alias='_id')
     userId: PyObjectId
     day: str  # 'monday', 'tuesday', etc.
     time: str  # '6:00-8:00'
@@ -14,10 +15,11 @@ class TimetableEntry(BaseModel):
     completed: bool = False
     createdAt: datetime = Field(default_factory=datetime.utcnow)
 
-    class Config:
-        allow_population_by_field_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
+    model_config = ConfigDict(populate_by_name=True)
+
+class TimetablePage(BaseModel):
+    items: List[TimetableEntry]
+    nextCursor: Optional[str] = None
 
 class TimetableEntryCreate(BaseModel):
     day: str
@@ -25,6 +27,19 @@ class TimetableEntryCreate(BaseModel):
     subject: str
     topic: str
 
+# Entries accepted in one week plan
+MAX_WEEK_ENTRIES = 200
+
+class TimetableWeek(BaseModel):
+    entries: List[TimetableEntryCreate] = Field(..., max_length=MAX_WEEK_ENTRIES)
+
+class TimetableWeekResult(BaseModel):
+    inserted: int
+    updated: int
+    deleted: int
+    unchanged: int
+    items: List[TimetableEntry]  # the week as stored afterwards, by day and time
+
 class TimetableEntryUpdate(BaseModel):
     day: Optional[str] = None
     time: Optional[str] = None
@@ -36,4 +51,9 @@ class WeeklyProgress(BaseModel):
     totalTasks: int
     completedTasks: int
     progressPercentage: float
-    dayProgress: dict  # day -> progress percentage
\ No newline at end of file
+    dayProgress: dict  # day -> progress percentage
+
+# Indexes reconciled at startup by database.ensure_indexes()
+TIMETABLE_INDEXES = [
+    IndexModel([("userId", ASCENDING), ("day", ASCENDING), ("time", ASCENDING), ("_id", ASCENDING)], name="userId_day_time_id"),
+]
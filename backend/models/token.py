@@ -0,0 +1,26 @@
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional
+from datetime import datetime
+from pymongo import ASCENDING, IndexModel
+from models.user import PyObjectId
+
+class RevokedToken(BaseModel):
+    """A revoked token, by its jti, or all of a user's tokens issued before revokedAt ('user:<id>')."""
+    id: str = Field(..., alias='_id')
+    userId: PyObjectId
+    revokedAt: datetime = Field(default_factory=datetime.utcnow)
+    expiresAt: datetime  # when the revoked token(s) would have expired anyway; the entry is dropped then
+
+    model_config = ConfigDict(populate_by_name=True)
+
+class TokenRefresh(BaseModel):
+    refresh_token: str
+
+class TokenLogout(BaseModel):
+    refresh_token: Optional[str] = None  # revoked along with the access token when given
+
+# Indexes reconciled at startup by database.ensure_indexes()
+REVOKED_TOKEN_INDEXES = [
+    IndexModel([("revokedAt", ASCENDING)], name="revokedAt"),
+    IndexModel([("expiresAt", ASCENDING)], name="expiresAt_ttl", expireAfterSeconds=0),
+]
@@ -1,25 +1,36 @@
-from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field, EmailStr
+from pydantic.json_schema import JsonSchemaValue
+from pydantic_core import core_schema
+from typing import Annotated, List, Optional
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
 
-class PyObjectId(ObjectId):
-    @classmethod
-    def __get_validators__(cls):
-        yield cls.validate
+def _validate_object_id(value) -> ObjectId:
+    if isinstance(value, ObjectId):
+        return value
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    raise ValueError('Invalid objectid')
+
+class _ObjectIdSchema:
+    """Core schema for ObjectId fields: accept an ObjectId or its hex string, emit the string in JSON."""
 
     @classmethod
-    def validate(cls, v):
-        if not ObjectId.is_valid(v):
-            raise ValueError('Invalid objectid')
-        return ObjectId(v)
+    def __get_pydantic_core_schema__(cls, source_type, handler) -> core_schema.CoreSchema:
+        return core_schema.no_info_plain_validator_function(
+            _validate_object_id,
+            serialization=core_schema.plain_serializer_function_ser_schema(str, when_used='json')
+        )
 
     @classmethod
-    def __modify_schema__(cls, field_schema):
-        field_schema.update(type='string')
+    def __get_pydantic_json_schema__(cls, schema, handler) -> JsonSchemaValue:
+        return {'type': 'string'}
+
+PyObjectId = Annotated[ObjectId, _ObjectIdSchema]
 
 class User(BaseModel):
-    id: PyObjectId = Field(default_factory=PyObjectId, alias='_id')
+    id: PyObjectId = Field(default_factory=ObjectId, alias='_id')
     email: EmailStr
     password: str
     name: str
@@ -31,11 +42,9 @@ class User(BaseModel):
     badges: List[str] = []
     createdAt: datetime = Field(default_factory=datetime.utcnow)
     lastActiveDate: datetime = Field(default_factory=datetime.utcnow)
+    syllabusVersion: Optional[int] = None  # syllabus template version the user's progress applies to
 
-    class Config:
-        allow_population_by_field_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
+    model_config = ConfigDict(populate_by_name=True)
 
 class UserCreate(BaseModel):
     email: EmailStr
@@ -69,4 +78,9 @@ class UserStats(BaseModel):
 class UserStatsUpdate(BaseModel):
     totalXP: Optional[int] = None
     currentStreak: Optional[int] = None
-    totalStudyHours: Optional[int] = None
\ No newline at end of file
+    totalStudyHours: Optional[int] = None
+
+# Indexes reconciled at startup by database.ensure_indexes()
+USER_INDEXES = [
+    IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+]
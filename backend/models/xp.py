@@ -0,0 +1,21 @@
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
+from models.user import PyObjectId
+
+class XPEvent(BaseModel):
+    id: PyObjectId = Field(default_factory=ObjectId, alias='_id')
+    userId: PyObjectId
+    amount: int
+    source: str  # e.g. 'flashcard-review', 'test-result', 'topic-mastered'
+    refId: Optional[PyObjectId] = None  # document that earned the XP, if any
+    createdAt: datetime = Field(default_factory=datetime.utcnow)
+
+    model_config = ConfigDict(populate_by_name=True)
+
+# Indexes reconciled at startup by database.ensure_indexes()
+XP_EVENT_INDEXES = [
+    IndexModel([("userId", ASCENDING), ("createdAt", ASCENDING)], name="userId_createdAt"),
+]
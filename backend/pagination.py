@@ -0,0 +1,94 @@
+"""Keyset pagination for the list endpoints.
+
+A page is fetched by sort key rather than by offset: the opaque cursor carries the
+sort-key values of the last document returned, and the next page starts strictly
+after them. `_id` is always the final sort key so that documents sharing a sort
+value are neither skipped nor repeated, and the indexes backing each list end in
+`_id` so the sort never happens in memory.
+"""
+import base64
+from datetime import datetime
+from bson import ObjectId, BSON
+from bson.errors import BSONError
+from fastapi import HTTPException, status
+from typing import List, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Types a cursor value may hold; anything else (notably a dict) could smuggle an operator into the filter.
+CURSOR_VALUE_TYPES = (str, int, float, bool, datetime, ObjectId, type(None))
+
+def with_tiebreak(sort: List[Tuple[str, int]]) -> List[Tuple[str, int]]:
+    """Append `_id` in the direction of the last sort key, unless already present."""
+    if sort[-1][0] == "_id":
+        return list(sort)
+    return [*sort, ("_id", sort[-1][1])]
+
+def encode_cursor(values: list) -> str:
+    """Pack sort-key values into a URL-safe token."""
+    return base64.urlsafe_b64encode(BSON.encode({"k": values})).decode().rstrip("=")
+
+def decode_cursor(token: str, key_count: int) -> list:
+    """Unpack a token produced by encode_cursor, rejecting anything malformed."""
+    try:
+        values = BSON(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))).decode()["k"]
+    except (ValueError, KeyError, BSONError):
+        values = None
+
+    if (
+        not isinstance(values, list)
+        or len(values) != key_count
+        or not all(isinstance(value, CURSOR_VALUE_TYPES) for value in values)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+    return values
+
+def keyset_filter(sort: List[Tuple[str, int]], values: list) -> dict:
+    """Filter for documents that sort strictly after `values`.
+
+    The leading key is bounded inclusively so the index range starts at the cursor;
+    the `$or` then breaks ties lexicographically on the remaining keys.
+    """
+    def after(direction: int) -> str:
+        return "$gt" if direction == 1 else "$lt"
+
+    first_key, first_direction = sort[0]
+    branches = []
+    for position, (key, direction) in enumerate(sort):
+        branch = {sort[i][0]: values[i] for i in range(position)}
+        branch[key] = {after(direction): values[position]}
+        branches.append(branch)
+
+    return {
+        first_key: {("$gte" if first_direction == 1 else "$lte"): values[0]},
+        "$or": branches
+    }
+
+async def paginate(
+    collection,
+    filters: dict,
+    sort: List[Tuple[str, int]],
+    limit: int,
+    cursor: Optional[str] = None,
+    projection: Optional[dict] = None
+) -> Tuple[list, Optional[str]]:
+    """Fetch one page of `collection` and the cursor for the next page (None on the last page)."""
+    sort = with_tiebreak(sort)
+    query = filters
+    if cursor:
+        query = {"$and": [filters, keyset_filter(sort, decode_cursor(cursor, len(sort)))]}
+
+    # One extra document tells us whether another page exists without a count
+    documents = await collection.find(query, projection).sort(sort).limit(limit + 1).to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_cursor([documents[-1].get(key) for key, _ in sort])
+
+    return documents, next_cursor
@@ -0,0 +1,103 @@
+"""Password hashing off the event loop.
+
+bcrypt is slow on purpose: one hash or check at the default cost takes tens of
+milliseconds of CPU, and run inline it stalls every other request on the worker.
+Hashes here run on a dedicated pool of PASSWORD_HASH_WORKERS threads (bcrypt
+releases the GIL while it works). At most PASSWORD_HASH_QUEUE_LIMIT further
+requests may wait for a thread; past that, callers get a 503 straight away
+instead of queueing behind a login storm.
+
+The cost is BCRYPT_ROUNDS. Hashes stored with any other cost are rehashed at the
+configured one the next time their owner logs in.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+DEFAULT_ROUNDS = 12
+# Seconds a client refused for saturation is asked to wait
+RETRY_AFTER_SECONDS = 1
+
+class PasswordHasher:
+    """The hashing pool and its policy, configured from the environment on first use."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.context: Optional[CryptContext] = None
+        self.workers = 0
+        self.queue_limit = 0
+        self.rounds = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def configure(self):
+        self.rounds = int(os.environ.get("BCRYPT_ROUNDS", DEFAULT_ROUNDS))
+        self.workers = int(os.environ.get("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+        self.queue_limit = int(os.environ.get("PASSWORD_HASH_QUEUE_LIMIT", 32))
+        # Equal min/max rounds make needs_update flag any hash not at the configured cost
+        self.context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=self.rounds,
+            bcrypt__min_rounds=self.rounds,
+            bcrypt__max_rounds=self.rounds
+        )
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+
+    async def run(self, function, *args):
+        """Run `function(*args)` on the pool, or raise 503 if the pool and its queue are full."""
+        with self.lock:
+            if self.executor is None:
+                self.configure()
+            if self.in_flight >= self.workers + self.queue_limit:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many sign-ins in progress; try again shortly",
+                    headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+                )
+            self.in_flight += 1
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+                self.completed += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queueLimit": self.queue_limit,
+            "rounds": self.rounds,
+            "inFlight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+                self.executor = None
+
+# Global hasher used by the auth routes
+password_hasher = PasswordHasher()
+
+async def hash_password(password: str) -> str:
+    """Hash a password at the configured cost."""
+    return await password_hasher.run(lambda: password_hasher.context.hash(password))
+
+async def verify_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Check a password against its stored hash.
+
+    Returns (valid, new_hash). new_hash is set when the password is valid but the
+    stored hash is not at the configured cost; the caller should store it.
+    """
+    return await password_hasher.run(lambda: password_hasher.context.verify_and_update(password, hashed_password))
@@ -0,0 +1,14 @@
+"""Per-collection data access.
+
+Repositories read documents into compact slotted records with the defaults for
+missing fields applied in one place; records are converted to API models only
+when a response needs them (`Record.to_api`).
+"""
+from repositories.base import Record, Repository
+from repositories.flashcards import FlashcardRecord, FlashcardRepository, flashcard_repository
+from repositories.goals import (
+    GoalRecord, CalendarEventRecord, GoalRepository, CalendarEventRepository,
+    goal_repository, calendar_event_repository
+)
+from repositories.timetable import TimetableEntryRecord, TimetableRepository, timetable_repository
+from repositories.tests import TestResultRecord, TestRepository, test_repository
@@ -0,0 +1,112 @@
+from bson import ObjectId
+from typing import Dict, List, Optional, Tuple, Type
+from pydantic import BaseModel
+from database import get_collection, find_one_and_set
+from fieldsets import field_projection, sparse_model
+from pagination import paginate
+
+class Record:
+    """A compact, slotted view of one stored document.
+
+    Subclasses list their fields in `__slots__` (`id` holds the document's `_id`) and
+    set MODEL to the API model. DEFAULTS fills fields that older documents lack; a
+    callable default is called with the document. Fields left out of a projection
+    stay unset.
+    """
+    __slots__ = ()
+    MODEL: Type[BaseModel] = None
+    DEFAULTS: Dict[str, object] = {}
+
+    @classmethod
+    def from_document(cls, document: dict) -> "Record":
+        record = cls.__new__(cls)
+        for name in cls.__slots__:
+            key = "_id" if name == "id" else name
+            if key in document:
+                setattr(record, name, document[key])
+            elif name in cls.DEFAULTS:
+                default = cls.DEFAULTS[name]
+                setattr(record, name, default(document) if callable(default) else default)
+        return record
+
+    def get(self, key: str, default=None):
+        """Dict-style read by document key, so a record can stand in for its document."""
+        return getattr(self, "id" if key == "_id" else key, default)
+
+    def to_api(self, selected: Optional[Tuple[str, ...]] = None) -> BaseModel:
+        """Build the API model, or its sparse variant when fields were `selected`."""
+        model = self.MODEL if selected is None else sparse_model(self.MODEL, selected)
+        return model.model_validate(self, from_attributes=True)
+
+class Repository:
+    """Reads one collection as RECORDs; writes return raw (before, after) documents for the rollups."""
+    COLLECTION: str = None
+    RECORD: Type[Record] = None
+
+    @property
+    def collection(self):
+        return get_collection(self.COLLECTION)
+
+    def projection(self, selected: Optional[Tuple[str, ...]] = None, *extra: str) -> Optional[dict]:
+        """Projection for a sparse selection of the record's model, plus `extra` document fields."""
+        return field_projection(self.RECORD.MODEL, selected, *extra)
+
+    def records(self, documents: list) -> List[Record]:
+        return [self.RECORD.from_document(document) for document in documents]
+
+    async def get(
+        self,
+        document_id: ObjectId,
+        owner_id: ObjectId,
+        selected: Optional[Tuple[str, ...]] = None
+    ) -> Optional[Record]:
+        """Fetch one of the owner's documents, or None."""
+        document = await self.collection.find_one({"_id": document_id, "userId": owner_id}, self.projection(selected))
+        return None if document is None else self.RECORD.from_document(document)
+
+    async def find(
+        self,
+        filters: dict,
+        sort: Optional[list] = None,
+        limit: int = 0,
+        projection: Optional[dict] = None
+    ) -> List[Record]:
+        """Fetch matching documents as records, converting each as it arrives."""
+        cursor = self.collection.find(filters, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        return [self.RECORD.from_document(document) async for document in cursor]
+
+    async def page(
+        self,
+        filters: dict,
+        sort: List[Tuple[str, int]],
+        limit: int,
+        cursor: Optional[str] = None,
+        selected: Optional[Tuple[str, ...]] = None
+    ) -> Tuple[List[Record], Optional[str]]:
+        """One keyset page as records, plus the next cursor; sort keys are always projected."""
+        documents, next_cursor = await paginate(
+            self.collection, filters, sort, limit, cursor,
+            projection=self.projection(selected, *(key for key, _ in sort))
+        )
+        return self.records(documents), next_cursor
+
+    async def count(self, filters: dict) -> int:
+        return await self.collection.count_documents(filters)
+
+    async def insert(self, model: BaseModel) -> dict:
+        """Insert a new API model and return the stored document."""
+        document = model.model_dump(by_alias=True)
+        await self.collection.insert_one(document)
+        return document
+
+    async def update(self, document_id: ObjectId, owner_id: ObjectId, fields: dict) -> Optional[Tuple[dict, dict]]:
+        """$set `fields` on one of the owner's documents; returns (before, after) or None."""
+        return await find_one_and_set(self.collection, document_id, fields, owner_id=owner_id)
+
+    async def delete(self, document_id: ObjectId, owner_id: ObjectId) -> Optional[dict]:
+        """Delete one of the owner's documents and return it, or None."""
+        return await self.collection.find_one_and_delete({"_id": document_id, "userId": owner_id})
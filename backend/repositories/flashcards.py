@@ -0,0 +1,21 @@
+from models.flashcard import Flashcard
+from repositories.base import Record, Repository
+
+class FlashcardRecord(Record):
+    __slots__ = (
+        "id", "userId", "subject", "topic", "question", "answer", "difficulty",
+        "lastReviewed", "nextReview", "reviewCount", "correctCount", "createdAt"
+    )
+    MODEL = Flashcard
+    DEFAULTS = {"lastReviewed": None, "reviewCount": 0, "correctCount": 0}
+
+class FlashcardRepository(Repository):
+    COLLECTION = "flashcards"
+    RECORD = FlashcardRecord
+
+    # What a study session shows: the card without its review history
+    SESSION_PROJECTION = {"subject": 1, "topic": 1, "question": 1, "answer": 1, "difficulty": 1}
+    # What recording a review reads: the scheduling inputs and the fields its rollup counters use
+    REVIEW_PROJECTION = {"subject": 1, "difficulty": 1, "reviewCount": 1, "correctCount": 1}
+
+flashcard_repository = FlashcardRepository()
@@ -0,0 +1,37 @@
+from models.goal import Goal, CalendarEvent
+from repositories.base import Record, Repository
+
+class GoalRecord(Record):
+    __slots__ = (
+        "id", "userId", "title", "description", "deadline", "progress", "priority",
+        "category", "completed", "createdAt", "updatedAt"
+    )
+    MODEL = Goal
+    DEFAULTS = {
+        "progress": 0,
+        "priority": "medium",
+        "completed": False,
+        # Goals written before updatedAt existed were last touched when created
+        "updatedAt": lambda document: document.get("createdAt")
+    }
+
+class CalendarEventRecord(Record):
+    __slots__ = (
+        "id", "userId", "title", "description", "date", "time", "type", "priority", "completed", "createdAt"
+    )
+    MODEL = CalendarEvent
+    DEFAULTS = {"description": None, "time": None, "priority": "medium", "completed": False}
+
+class GoalRepository(Repository):
+    COLLECTION = "goals"
+    RECORD = GoalRecord
+
+    # What the upcoming-deadlines list shows
+    DEADLINE_PROJECTION = {"title": 1, "deadline": 1, "progress": 1, "priority": 1, "category": 1}
+
+class CalendarEventRepository(Repository):
+    COLLECTION = "calendar_events"
+    RECORD = CalendarEventRecord
+
+goal_repository = GoalRepository()
+calendar_event_repository = CalendarEventRepository()
@@ -0,0 +1,16 @@
+from models.test import TestResult
+from repositories.base import Record, Repository
+
+class TestResultRecord(Record):
+    __slots__ = (
+        "id", "userId", "type", "date", "score", "totalMarks", "accuracy", "timeSpent",
+        "subjects", "weakTopics", "createdAt"
+    )
+    MODEL = TestResult
+    DEFAULTS = {"weakTopics": lambda document: []}
+
+class TestRepository(Repository):
+    COLLECTION = "tests"
+    RECORD = TestResultRecord
+
+test_repository = TestRepository()
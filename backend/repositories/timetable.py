@@ -0,0 +1,13 @@
+from models.timetable import TimetableEntry
+from repositories.base import Record, Repository
+
+class TimetableEntryRecord(Record):
+    __slots__ = ("id", "userId", "day", "time", "subject", "topic", "completed", "createdAt")
+    MODEL = TimetableEntry
+    DEFAULTS = {"completed": False}
+
+class TimetableRepository(Repository):
+    COLLECTION = "timetable"
+    RECORD = TimetableEntryRecord
+
+timetable_repository = TimetableRepository()
@@ -0,0 +1,207 @@
+"""Per-user cache of read endpoint responses.
+
+Stats and syllabus reads are requested far more often than the data behind them
+changes. A handler decorated with `cached(*tags)` keeps its response, keyed by
+(user, handler, parameters), in a process-wide LRU of RESPONSE_CACHE_SIZE
+entries that expire after RESPONSE_CACHE_TTL_SECONDS. Tags name the collections
+the response is computed from. A handler decorated with `invalidates(*tags)`
+retires every cached response of the calling user that carries one of them, as
+soon as the handler has written.
+
+Invalidation bumps a per-(user, tag) generation, and each entry records the
+generations it was computed under. A read that raced a write therefore stores an
+entry that is already retired, and can never serve the pre-write response after
+the write has returned. A user's generations are kept only while the user has
+responses cached or being computed, so they are bounded along with the entries.
+Concurrent misses for the same key wait for one computation instead of each
+running the handler. If the request computing it is cancelled (its client went
+away), one of the waiters computes it instead.
+
+The cache is per process. Writes made by another worker, or by manage.py, are
+picked up when the entry expires.
+"""
+import asyncio
+import inspect
+import os
+import time
+from collections import Counter, OrderedDict
+from functools import wraps
+from typing import Dict, Hashable, Tuple
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "5000"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "60"))
+
+# Tags, by the collection the response is computed from
+SYLLABUS = "syllabus"
+TESTS = "tests"
+GOALS = "goals"
+FLASHCARDS = "flashcards"
+
+class ResponseCache:
+    """An LRU of responses with TTL expiry and per-user tag generations."""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        # User -> tag -> generation, kept only while the user holds entries or computations
+        self.generations: Dict[Hashable, Dict[str, int]] = {}
+        # User -> cached entries plus in-flight computations
+        self.holds = Counter()
+        self.pending: Dict[Hashable, asyncio.Future] = {}
+        self.reset()
+
+    def reset(self):
+        self.entries.clear()
+        self.generations.clear()
+        self.holds.clear()
+        self.pending.clear()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def current(self, user_id: Hashable, tags: Tuple[str, ...]) -> Tuple[int, ...]:
+        generations = self.generations.get(user_id, {})
+        return tuple(generations.get(tag, 0) for tag in tags)
+
+    def invalidate(self, user_id: Hashable, *tags: str):
+        """Retire every cached response of the user that carries any of the tags."""
+        self.invalidations += 1
+        # With nothing cached or being computed there is nothing to retire
+        if not self.holds[user_id]:
+            return
+        generations = self.generations.setdefault(user_id, {})
+        for tag in tags:
+            generations[tag] = generations.get(tag, 0) + 1
+
+    def release(self, user_id: Hashable):
+        """Drop one hold; a user with none left starts again from generation 0."""
+        self.holds[user_id] -= 1
+        if self.holds[user_id] <= 0:
+            del self.holds[user_id]
+            self.generations.pop(user_id, None)
+
+    def store(self, key: Hashable, user_id: Hashable, value, expires_at: float, generations: Tuple[int, ...]):
+        self.holds[user_id] += 1
+        previous = self.entries.pop(key, None)
+        self.entries[key] = (value, expires_at, generations, user_id)
+        if previous is not None:
+            self.release(previous[3])
+        while len(self.entries) > self.max_entries:
+            _, evicted = self.entries.popitem(last=False)
+            self.evictions += 1
+            self.release(evicted[3])
+
+    async def get_or_compute(self, key: Hashable, user_id: Hashable, tags: Tuple[str, ...], compute):
+        if self.max_entries <= 0:
+            return await compute()
+
+        now = time.monotonic()
+        generations = self.current(user_id, tags)
+        entry = self.entries.get(key)
+        if entry is not None:
+            value, expires_at, stored_generations, _ = entry
+            if expires_at > now and stored_generations == generations:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self.entries[key]
+            if expires_at <= now:
+                self.expirations += 1
+            self.release(user_id)
+            # Releasing may have reset the user's generations
+            generations = self.current(user_id, tags)
+
+        # Only a computation started under the same generations may be shared
+        flight = (key, generations)
+        while flight in self.pending:
+            future = self.pending[flight]
+            try:
+                value = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # If only the computing request was cancelled, one waiter takes over and the rest follow it
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                generations = self.current(user_id, tags)
+                flight = (key, generations)
+                continue
+            self.coalesced += 1
+            return value
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.pending[flight] = future
+        self.holds[user_id] += 1
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; don't let the loop report an unretrieved exception
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            self.store(key, user_id, value, now + self.ttl_seconds, generations)
+        finally:
+            del self.pending[flight]
+            self.release(user_id)
+        return value
+
+    def snapshot(self) -> dict:
+        """Cache counters in the shape served by /api/metrics."""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self.entries),
+            "maxSize": self.max_entries,
+            "ttlSeconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hitRate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "trackedUsers": len(self.generations)
+        }
+
+# Global response cache; benchmarks and the query plan test set max_entries to 0 to measure the handlers
+response_cache = ResponseCache()
+
+def cached(*tags: str):
+    """Cache a read handler's response per user and parameters, retired by writes to `tags`.
+
+    The handler must take `current_user_id` and otherwise only hashable parameters.
+    Callers share the returned object and must not modify it.
+    """
+    def decorate(handler):
+        signature = inspect.signature(handler)
+
+        @wraps(handler)
+        async def wrapper(*args, **kwargs):
+            params = signature.bind(*args, **kwargs).arguments
+            user_id = params["current_user_id"]
+            key = (user_id, handler.__module__, handler.__qualname__, tuple(sorted(params.items())))
+            return await response_cache.get_or_compute(key, user_id, tags, lambda: handler(*args, **kwargs))
+        return wrapper
+    return decorate
+
+def invalidates(*tags: str):
+    """Retire the calling user's cached responses tagged `tags` once the handler has run, even if it failed."""
+    def decorate(handler):
+        signature = inspect.signature(handler)
+
+        @wraps(handler)
+        async def wrapper(*args, **kwargs):
+            user_id = signature.bind(*args, **kwargs).arguments["current_user_id"]
+            try:
+                return await handler(*args, **kwargs)
+            finally:
+                response_cache.invalidate(user_id, *tags)
+        return wrapper
+    return decorate
@@ -0,0 +1,241 @@
+"""Token revocation without a database read per request.
+
+Revoked token ids (jti) live in the small `revoked_tokens` collection. Each entry
+is dropped by a TTL index once the token would have expired anyway. A "revoke all
+sessions" entry, keyed `user:<id>`, revokes every token the user was issued
+before its revokedAt.
+
+Each process checks every request in memory. Revoke-all cutoffs are few and
+kept exactly, as user id -> revokedAt, and compared with the token's iat. Token
+ids go into a Bloom filter; a token that hits it is confirmed against the
+collection before it is rejected, so a false positive costs one query and never
+a wrong 401. Both are topped up every REVOCATION_REFRESH_SECONDS with the
+entries revoked since the last top-up, and rebuilt every
+REVOCATION_REBUILD_SECONDS so that expired entries drop out. Revocations made in
+this process apply to it at once; other processes see them within one refresh
+interval.
+"""
+import asyncio
+import calendar
+import hashlib
+import logging
+import math
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from database import get_collection
+from models.token import RevokedToken
+
+REVOKED_COLLECTION = "revoked_tokens"
+USER_KEY_PREFIX = "user:"
+
+REVOCATION_FILTER_CAPACITY = int(os.getenv("REVOCATION_FILTER_CAPACITY", "100000"))
+REVOCATION_FILTER_ERROR_RATE = float(os.getenv("REVOCATION_FILTER_ERROR_RATE", "0.001"))
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", "5"))
+REVOCATION_REBUILD_SECONDS = float(os.getenv("REVOCATION_REBUILD_SECONDS", "3600"))
+# Top-ups re-read this far behind the newest entry seen, for writers whose clocks lag ours
+REFRESH_OVERLAP = timedelta(seconds=30)
+
+logger = logging.getLogger(__name__)
+
+def timestamp(value: datetime) -> float:
+    """Seconds since the epoch of a naive UTC datetime (how Mongo returns dates)."""
+    return calendar.timegm(value.utctimetuple()) + value.microsecond / 1_000_000
+
+class BloomFilter:
+    """A fixed-size Bloom filter sized for `capacity` keys at `error_rate` false positives."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        step = int.from_bytes(digest[8:], "little") | 1
+        return [(first + index * step) % self.size for index in range(self.hash_count)]
+
+    def add(self, key: str):
+        positions = self._positions(key)
+        if all(self.bits[position >> 3] & (1 << (position & 7)) for position in positions):
+            return
+        for position in positions:
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def false_positive_rate(self) -> float:
+        """The expected false positive rate at the current fill."""
+        return (1 - math.exp(-self.hash_count * self.count / self.size)) ** self.hash_count
+
+class RevocationList:
+    """This process's view of `revoked_tokens`: the filter, its refresh loop and its counters."""
+
+    def __init__(self):
+        self.filter = BloomFilter(REVOCATION_FILTER_CAPACITY, REVOCATION_FILTER_ERROR_RATE)
+        # User id -> revokedAt (epoch seconds) of the user's latest revoke-all
+        self.user_cutoffs: Dict[str, float] = {}
+        self.high_water: Optional[datetime] = None
+        self.last_refresh: Optional[float] = None
+        self.last_rebuild: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.checks = 0
+        self.positives = 0
+        self.users_revoked = 0
+        self.confirmed = 0
+        self.cleared = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.max_lag_ms = 0.0
+
+    @staticmethod
+    def _load(entry: dict, bloom: BloomFilter, user_cutoffs: Dict[str, float]) -> bool:
+        """Add one collection entry to a filter and cutoff map; False if it was already there."""
+        key = entry["_id"]
+        if key.startswith(USER_KEY_PREFIX):
+            user_id, cutoff = key[len(USER_KEY_PREFIX):], timestamp(entry["revokedAt"])
+            if user_cutoffs.get(user_id, 0) >= cutoff:
+                return False
+            user_cutoffs[user_id] = cutoff
+            return True
+        if key in bloom:
+            return False
+        bloom.add(key)
+        return True
+
+    async def rebuild(self):
+        """Reload from the whole collection, with the filter sized for at least twice what is stored."""
+        collection = get_collection(REVOKED_COLLECTION)
+        capacity = max(REVOCATION_FILTER_CAPACITY, 2 * await collection.estimated_document_count())
+        rebuilt = BloomFilter(capacity, REVOCATION_FILTER_ERROR_RATE)
+        user_cutoffs = {}
+        high_water = None
+        async for entry in collection.find({}, {"revokedAt": 1}):
+            self._load(entry, rebuilt, user_cutoffs)
+            high_water = max(high_water or entry["revokedAt"], entry["revokedAt"])
+
+        # Keys revoked in this process while the reload ran are carried over by a top-up
+        self.filter, self.user_cutoffs, self.high_water = rebuilt, user_cutoffs, high_water
+        self.last_rebuild = self.last_refresh = time.time()
+
+    async def refresh(self):
+        """Apply the entries revoked since the last refresh."""
+        filters = {}
+        if self.high_water is not None:
+            filters = {"revokedAt": {"$gte": self.high_water - REFRESH_OVERLAP}}
+
+        now = time.time()
+        cursor = get_collection(REVOKED_COLLECTION).find(filters, {"revokedAt": 1}).sort("revokedAt", 1)
+        async for entry in cursor:
+            if self._load(entry, self.filter, self.user_cutoffs):
+                self.max_lag_ms = max(self.max_lag_ms, (now - timestamp(entry["revokedAt"])) * 1000)
+            self.high_water = max(self.high_water or entry["revokedAt"], entry["revokedAt"])
+
+        self.last_refresh = now
+        self.refreshes += 1
+        if self.filter.count > self.filter.capacity:
+            await self.rebuild()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(REVOCATION_REFRESH_SECONDS)
+            try:
+                if time.time() - (self.last_rebuild or 0) >= REVOCATION_REBUILD_SECONDS:
+                    await self.rebuild()
+                else:
+                    await self.refresh()
+            except PyMongoError as e:
+                # Keep serving from the filter we have; refresh age shows the staleness
+                self.refresh_failures += 1
+                logger.warning(f"Revocation refresh failed: {type(e).__name__}")
+
+    async def start(self):
+        await self.rebuild()
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def is_revoked(self, subject: str, claims: dict) -> bool:
+        """Whether a verified token has been revoked; memory-only unless its jti hits the filter."""
+        self.checks += 1
+        cutoff = self.user_cutoffs.get(subject)
+        # Mongo keeps milliseconds, so a token from the same millisecond counts as earlier.
+        # Tokens from before the jti/iat claims have neither and count as issued at the epoch.
+        if cutoff is not None and claims.get("iat", 0) < cutoff + 0.001:
+            self.users_revoked += 1
+            return True
+
+        jti = claims.get("jti")
+        if not jti or jti not in self.filter:
+            return False
+
+        self.positives += 1
+        revoked = await get_collection(REVOKED_COLLECTION).find_one({"_id": jti}, {"_id": 1}) is not None
+        if revoked:
+            self.confirmed += 1
+        else:
+            self.cleared += 1
+        return revoked
+
+    async def revoke(self, key: str, user_id: ObjectId, expires_at: datetime) -> bool:
+        """Record a revocation; False if `key` was already revoked."""
+        entry = RevokedToken(id=key, userId=user_id, expiresAt=expires_at)
+        self.filter.add(key)
+        try:
+            await get_collection(REVOKED_COLLECTION).insert_one(entry.model_dump(by_alias=True))
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def revoke_user(self, user_id: ObjectId, expires_at: datetime):
+        """Revoke every token issued to the user until now; `expires_at` is when the last of them expires."""
+        revoked_at = datetime.utcnow()
+        # Stored at Mongo's millisecond precision, as other processes will read it back
+        revoked_at = revoked_at.replace(microsecond=revoked_at.microsecond // 1000 * 1000)
+        self._load({"_id": USER_KEY_PREFIX + str(user_id), "revokedAt": revoked_at}, self.filter, self.user_cutoffs)
+        await get_collection(REVOKED_COLLECTION).update_one(
+            {"_id": USER_KEY_PREFIX + str(user_id)},
+            {"$set": {"userId": user_id, "revokedAt": revoked_at, "expiresAt": expires_at}},
+            upsert=True
+        )
+
+    def snapshot(self) -> dict:
+        """Revocation counters in the shape served by /api/metrics.
+
+        The filter holds token ids only, so filter hits the database cleared are
+        false positives. Revoke-all cutoffs are checked exactly, without the filter.
+        """
+        return {
+            "revokedUsers": len(self.user_cutoffs),
+            "rejectedByUserCutoff": self.users_revoked,
+            "filterKeys": self.filter.count,
+            "filterCapacity": self.filter.capacity,
+            "expectedFalsePositiveRate": round(self.filter.false_positive_rate(), 6),
+            "checks": self.checks,
+            "filterHits": self.positives,
+            "confirmedRevoked": self.confirmed,
+            "clearedByDatabase": self.cleared,
+            "observedFalsePositiveRate": round(self.cleared / self.checks, 6) if self.checks else 0.0,
+            "refreshes": self.refreshes,
+            "refreshFailures": self.refresh_failures,
+            "lastRefreshAgeMs": round((time.time() - self.last_refresh) * 1000, 1) if self.last_refresh else None,
+            "maxPropagationLagMs": round(self.max_lag_ms, 1)
+        }
+
+# Global revocation list, loaded at startup
+revocation_list = RevocationList()
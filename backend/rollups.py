@@ -0,0 +1,289 @@
+"""Per-user dashboard rollups.
+
+One `user_rollups` document per user holds the counters behind the stats and
+progress endpoints. Write paths describe each change as a (before, after) pair of
+documents; the difference of their counters is applied with a single upserted
+`$inc`, so reads are one `find_one` regardless of how much history a user has.
+
+A rollup is only trusted once `built` is set, which happens when it is rebuilt from
+the source collections (lazily on first read, or via `manage.py rebuild-rollups`).
+"""
+from bson import ObjectId
+from collections import Counter
+from datetime import datetime
+from functools import partial
+from typing import Callable, Iterable, Optional
+from database import get_collection
+from loaders import load, forget
+
+ROLLUP_COLLECTION = "user_rollups"
+
+def escape_key(key: str) -> str:
+    """Make a user-supplied value safe to use as a field name."""
+    key = str(key).replace(".", "．")
+    return "＄" + key[1:] if key.startswith("$") else key
+
+def unescape_key(key: str) -> str:
+    key = key.replace("．", ".")
+    return "$" + key[1:] if key.startswith("＄") else key
+
+def syllabus_counters(topic: dict) -> dict:
+    """Counters contributed by one merged syllabus topic (see syllabus_templates.syllabus_summary)."""
+    subject = f"syllabus.bySubject.{escape_key(topic['subject'])}"
+    counters = {
+        "syllabus.total": 1,
+        f"syllabus.byStatus.{escape_key(topic['status'])}": 1,
+        f"{subject}.total": 1
+    }
+
+    if topic["status"] == "mastered":
+        counters[f"{subject}.mastered"] = 1
+    elif topic["status"] == "in-progress":
+        counters[f"{subject}.inProgress"] = 1
+    elif topic["status"] == "weak":
+        counters[f"{subject}.weak"] = 1
+
+    if topic.get("highYield", False):
+        counters[f"{subject}.highYield"] = 1
+
+    return counters
+
+def flashcard_counters(card: dict) -> dict:
+    """Counters contributed by one flashcard."""
+    return {
+        "flashcards.total": 1,
+        f"flashcards.bySubject.{escape_key(card['subject'])}": 1,
+        f"flashcards.byDifficulty.{escape_key(card['difficulty'])}": 1,
+        "flashcards.totalReviews": card.get("reviewCount", 0),
+        "flashcards.totalCorrect": card.get("correctCount", 0)
+    }
+
+def goal_counters(goal: dict) -> dict:
+    """Counters contributed by one goal."""
+    completed = 1 if goal.get("completed", False) else 0
+    category = f"goals.byCategory.{escape_key(goal['category'])}"
+    priority = f"goals.byPriority.{escape_key(goal.get('priority', 'medium'))}"
+    return {
+        "goals.total": 1,
+        "goals.completed": completed,
+        "goals.progressSum": goal.get("progress", 0),
+        f"{category}.total": 1,
+        f"{category}.completed": completed,
+        f"{priority}.total": 1,
+        f"{priority}.completed": completed
+    }
+
+def timetable_counters(entry: dict) -> dict:
+    """Counters contributed by one timetable entry."""
+    completed = 1 if entry.get("completed", False) else 0
+    counters = {"timetable.total": 1, "timetable.completed": completed}
+
+    for group, value in (("byDay", entry["day"]), ("bySubject", entry["subject"]), ("byTime", entry["time"])):
+        counters[f"timetable.{group}.{escape_key(value)}.total"] = 1
+        counters[f"timetable.{group}.{escape_key(value)}.completed"] = completed
+
+    return counters
+
+def counter_delta(counters: Callable[[dict], dict], before: Optional[dict], after: Optional[dict]) -> dict:
+    """Difference between the counters of two versions of a document (either may be None)."""
+    delta = Counter()
+    if after is not None:
+        delta.update(counters(after))
+    if before is not None:
+        delta.subtract(counters(before))
+    return {path: value for path, value in delta.items() if value}
+
+async def apply_delta(user_id: ObjectId, delta: dict, set_on_insert: Optional[dict] = None):
+    """Apply counter increments to a user's rollup in one upserted update."""
+    if not delta and not set_on_insert:
+        return
+
+    update = {"$set": {"updatedAt": datetime.utcnow()}}
+    if delta:
+        update["$inc"] = delta
+    if set_on_insert:
+        update["$setOnInsert"] = set_on_insert
+
+    await get_collection(ROLLUP_COLLECTION).update_one({"_id": user_id}, update, upsert=True)
+    forget(ROLLUP_COLLECTION, user_id)
+
+async def record_change(
+    user_id: ObjectId,
+    counters: Callable[[dict], dict],
+    before: Optional[dict] = None,
+    after: Optional[dict] = None
+):
+    """Record a create (before=None), update, or delete (after=None) of one document."""
+    await apply_delta(user_id, counter_delta(counters, before, after))
+
+async def record_changes(
+    user_id: ObjectId,
+    counters: Callable[[dict], dict],
+    changes: Iterable[tuple]
+):
+    """Record many (before, after) changes, as in record_change, with one update."""
+    delta = Counter()
+    for before, after in changes:
+        delta.update(counter_delta(counters, before, after))
+    await apply_delta(user_id, {path: value for path, value in delta.items() if value})
+
+async def record_inserts(
+    user_id: ObjectId,
+    counters: Callable[[dict], dict],
+    documents: Iterable[dict],
+    new_user: bool = False
+):
+    """Record many inserted documents at once.
+
+    `new_user` marks the rollup as built: a user created together with these
+    documents has no other history to count.
+    """
+    delta = Counter()
+    for document in documents:
+        delta.update(counters(document))
+
+    await apply_delta(
+        user_id,
+        {path: value for path, value in delta.items() if value},
+        set_on_insert={"built": True} if new_user else None
+    )
+
+def expand_paths(counters: dict) -> dict:
+    """Turn {"a.b.c": 1} into {"a": {"b": {"c": 1}}}."""
+    expanded = {}
+    for path, value in counters.items():
+        node = expanded
+        *parents, leaf = path.split(".")
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = value
+    return expanded
+
+def _grouped(key, **accumulators) -> list:
+    """$group on `key` with a count, keeping groups in order of first insertion."""
+    return [
+        {"$group": {"_id": key, "count": {"$sum": 1}, "first": {"$min": "$_id"}, **accumulators}},
+        {"$sort": {"first": 1}}
+    ]
+
+# Truthiness of a possibly-missing boolean field, as 0/1
+COMPLETED = {"$sum": {"$cond": [{"$ifNull": ["$completed", False]}, 1, 0]}}
+
+def _faceted_paths(section: str, totals_fields: dict, group_fields: tuple, rows: list) -> Counter:
+    """Translate a single $facet result into rollup paths.
+
+    `totals_fields` maps fields of the totals row to section-level counter names.
+    Every other facet is a keyed group counting `total` (or a bare count when
+    `group_fields` is empty) plus each of `group_fields`.
+    """
+    facets = dict(rows[0])
+    counters = Counter()
+    for row in facets.pop("totals"):
+        for field, name in totals_fields.items():
+            counters[f"{section}.{name}"] += row[field]
+
+    for group, group_rows in facets.items():
+        for row in group_rows:
+            prefix = f"{section}.{group}.{escape_key(row['_id'])}"
+            if not group_fields:
+                counters[prefix] += row["count"]
+                continue
+            counters[f"{prefix}.total"] += row["count"]
+            for field in group_fields:
+                counters[f"{prefix}.{field}"] += row[field]
+    return counters
+
+# Collection -> (stages run after the user $match, translation of the results to rollup paths)
+ROLLUP_PIPELINES = {
+    "flashcards": (
+        [{"$facet": {
+            "totals": [{"$group": {
+                "_id": None,
+                "count": {"$sum": 1},
+                "totalReviews": {"$sum": {"$ifNull": ["$reviewCount", 0]}},
+                "totalCorrect": {"$sum": {"$ifNull": ["$correctCount", 0]}}
+            }}],
+            "bySubject": _grouped("$subject"),
+            "byDifficulty": _grouped("$difficulty")
+        }}],
+        partial(
+            _faceted_paths, "flashcards",
+            {"count": "total", "totalReviews": "totalReviews", "totalCorrect": "totalCorrect"}, ()
+        )
+    ),
+    "goals": (
+        [{"$facet": {
+            "totals": [{"$group": {
+                "_id": None,
+                "count": {"$sum": 1},
+                "completed": COMPLETED,
+                "progressSum": {"$sum": {"$ifNull": ["$progress", 0]}}
+            }}],
+            "byCategory": _grouped("$category", completed=COMPLETED),
+            "byPriority": _grouped({"$ifNull": ["$priority", "medium"]}, completed=COMPLETED)
+        }}],
+        partial(
+            _faceted_paths, "goals",
+            {"count": "total", "completed": "completed", "progressSum": "progressSum"}, ("completed",)
+        )
+    ),
+    "timetable": (
+        [{"$facet": {
+            "totals": [{"$group": {"_id": None, "count": {"$sum": 1}, "completed": COMPLETED}}],
+            "byDay": _grouped("$day", completed=COMPLETED),
+            "bySubject": _grouped("$subject", completed=COMPLETED),
+            "byTime": _grouped("$time", completed=COMPLETED)
+        }}],
+        partial(_faceted_paths, "timetable", {"count": "total", "completed": "completed"}, ("completed",))
+    ),
+}
+
+async def count_rollup(user_id: ObjectId) -> Counter:
+    """Compute a user's rollup counters with one aggregation per source collection.
+
+    Only the grouped numbers leave the server; no source document is transferred.
+    """
+    totals = Counter()
+    for collection_name, (stages, translate) in ROLLUP_PIPELINES.items():
+        cursor = get_collection(collection_name).aggregate([{"$match": {"userId": user_id}}, *stages])
+        totals.update(translate(await cursor.to_list(length=None)))
+    return totals
+
+async def rebuild_rollup(user_id: ObjectId) -> dict:
+    """Recount a user's rollup from the source collections and store it.
+
+    Writes that land while the rebuild is reading are not reflected; rerun the
+    rebuild if the user was active at the time.
+    """
+    totals = await count_rollup(user_id)
+
+    rollup = expand_paths({path: value for path, value in totals.items() if value})
+    rollup.update({"_id": user_id, "built": True, "updatedAt": datetime.utcnow()})
+
+    await get_collection(ROLLUP_COLLECTION).replace_one({"_id": user_id}, rollup, upsert=True)
+    forget(ROLLUP_COLLECTION, user_id)
+    return rollup
+
+async def rebuild_all_rollups() -> int:
+    """Rebuild every user's rollup; returns the number of users processed."""
+    rebuilt = 0
+    async for user in get_collection("users").find({}, {"_id": 1}):
+        await rebuild_rollup(user["_id"])
+        rebuilt += 1
+    return rebuilt
+
+async def get_rollup(user_id: ObjectId) -> dict:
+    """Fetch a user's rollup, building it first if it has never been built."""
+    rollup = await load(ROLLUP_COLLECTION, user_id)
+    if rollup is None or not rollup.get("built", False):
+        rollup = await rebuild_rollup(user_id)
+    return rollup
+
+def counter_map(section: dict, group: str) -> dict:
+    """Read a keyed counter group, dropping entries whose documents are all gone."""
+    result = {}
+    for key, value in section.get(group, {}).items():
+        total = value.get("total", 0) if isinstance(value, dict) else value
+        if total:
+            result[unescape_key(key)] = value
+    return result
@@ -1,10 +1,17 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from datetime import timedelta
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from datetime import datetime, timedelta
+from typing import Optional
 from bson import ObjectId
 from models.user import User, UserCreate, UserLogin, UserResponse
-from auth import get_password_hash, verify_password, create_access_token, get_current_user_id
-from database import get_collection, INITIAL_SYLLABUS
-from models.syllabus import SyllabusItem
+from models.token import TokenRefresh, TokenLogout
+from auth import (
+    AuthContext, decode_token, get_auth_context, get_current_user_id, issue_tokens,
+    REFRESH_TOKEN, REFRESH_TOKEN_EXPIRE_DAYS
+)
+from revocation import revocation_list
+from password_hashing import hash_password, verify_password
+from database import get_collection, find_one_and_set, SYLLABUS_VERSION
+from loaders import load, forget
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
@@ -21,47 +28,22 @@ async def register(user_data: UserCreate):
             detail="Email already registered"
         )
     
-    # Hash password and create user
-    hashed_password = get_password_hash(user_data.password)
+    # Hash password (off the event loop) and create user
+    hashed_password = await hash_password(user_data.password)
     user = User(
         email=user_data.email,
         password=hashed_password,
-        name=user_data.name
+        name=user_data.name,
+        # The syllabus is read from this template version; nothing is copied per user
+        syllabusVersion=SYLLABUS_VERSION
     )
     
     # Insert user into database
-    result = await users_collection.insert_one(user.dict(by_alias=True))
+    result = await users_collection.insert_one(user.model_dump(by_alias=True))
     user_id = result.inserted_id
     
-    # Initialize syllabus for new user
-    syllabus_collection = get_collection("syllabus")
-    syllabus_items = []
-    
-    for exam_type, subjects in INITIAL_SYLLABUS.items():
-        for subject, topics in subjects.items():
-            for topic_data in topics:
-                syllabus_item = SyllabusItem(
-                    userId=user_id,
-                    type=exam_type,
-                    subject=subject,
-                    topic=topic_data["topic"],
-                    subtopics=topic_data["subtopics"],
-                    highYield=topic_data["highYield"]
-                )
-                syllabus_items.append(syllabus_item.dict(by_alias=True))
-    
-    if syllabus_items:
-        await syllabus_collection.insert_many(syllabus_items)
-    
-    # Create access token
-    access_token_expires = timedelta(minutes=30 * 24 * 60)  # 30 days
-    access_token = create_access_token(
-        data={"sub": str(user_id)}, expires_delta=access_token_expires
-    )
-    
     return {
-        "access_token": access_token,
-        "token_type": "bearer",
+        **issue_tokens(str(user_id)),
         "user": UserResponse(
             id=str(user_id),
             email=user.email,
@@ -88,28 +70,25 @@ async def login(user_data: UserLogin):
             detail="Invalid email or password"
         )
     
-    # Verify password
-    if not verify_password(user_data.password, user["password"]):
+    # Verify password (off the event loop)
+    valid, new_hash = await verify_password(user_data.password, user["password"])
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
         )
     
-    # Update last active date
+    # Update last active date, storing the password at the current bcrypt cost if it changed
+    login_update = {"lastActiveDate": user.get("lastActiveDate", user["createdAt"])}
+    if new_hash:
+        login_update["password"] = new_hash
     await users_collection.update_one(
         {"_id": user["_id"]},
-        {"$set": {"lastActiveDate": user.get("lastActiveDate", user["createdAt"])}}
-    )
-    
-    # Create access token
-    access_token_expires = timedelta(minutes=30 * 24 * 60)  # 30 days
-    access_token = create_access_token(
-        data={"sub": str(user["_id"])}, expires_delta=access_token_expires
+        {"$set": login_update}
     )
     
     return {
-        "access_token": access_token,
-        "token_type": "bearer",
+        **issue_tokens(str(user["_id"])),
         "user": UserResponse(
             id=str(user["_id"]),
             email=user["email"],
@@ -123,12 +102,72 @@ async def login(user_data: UserLogin):
         )
     }
 
+def refresh_context(token: str) -> Optional[AuthContext]:
+    """The identity behind a refresh token; None unless it is a valid refresh token with a jti."""
+    context = decode_token(token)
+    if context is None or context.claims.get("typ") != REFRESH_TOKEN or not context.claims.get("jti"):
+        return None
+    return context
+
+def invalid_refresh_token(detail: str = "Invalid refresh token") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def all_sessions_expiry() -> datetime:
+    """When the last token issued until now expires: the longest-lived kind, issued now."""
+    return datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+
+@router.post("/refresh", response_model=dict)
+async def refresh_tokens(token_data: TokenRefresh):
+    """Exchange a refresh token for a new access/refresh pair.
+
+    Each refresh token works once: it is revoked as the new pair is issued. A
+    refresh token presented after it was revoked has leaked or been replayed, so
+    all of the user's sessions are revoked with it.
+    """
+    context = refresh_context(token_data.refresh_token)
+    if context is None:
+        raise invalid_refresh_token()
+    
+    # Revoking the old token is the rotation; losing the insert race means it was used twice
+    if (
+        await revocation_list.is_revoked(context.subject, context.claims)
+        or not await revocation_list.revoke(context.claims["jti"], context.user_id, context.expires_at)
+    ):
+        await revocation_list.revoke_user(context.user_id, all_sessions_expiry())
+        raise invalid_refresh_token("Refresh token already used; all sessions have been signed out")
+    
+    return issue_tokens(context.subject)
+
+@router.post("/logout")
+async def logout(
+    token_data: Optional[TokenLogout] = None,
+    all_sessions: bool = Query(False, description="Sign out every session of this user, not just this one"),
+    context: AuthContext = Depends(get_auth_context)
+):
+    """Revoke the caller's access token, and its refresh token when given."""
+    if all_sessions:
+        await revocation_list.revoke_user(context.user_id, all_sessions_expiry())
+        return {"message": "All sessions signed out"}
+    
+    if context.claims.get("jti"):
+        await revocation_list.revoke(context.claims["jti"], context.user_id, context.expires_at)
+    
+    if token_data is not None and token_data.refresh_token:
+        refresh = refresh_context(token_data.refresh_token)
+        if refresh is None or refresh.subject != context.subject:
+            raise invalid_refresh_token()
+        await revocation_list.revoke(refresh.claims["jti"], refresh.user_id, refresh.expires_at)
+    
+    return {"message": "Logged out successfully"}
+
 @router.get("/me", response_model=UserResponse)
-async def get_current_user(current_user_id: str = Depends(get_current_user_id)):
+async def get_current_user(current_user_id: ObjectId = Depends(get_current_user_id)):
     """Get current user profile."""
-    users_collection = get_collection("users")
-    
-    user = await users_collection.find_one({"_id": ObjectId(current_user_id)})
+    user = await load("users", current_user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -150,7 +189,7 @@ async def get_current_user(current_user_id: str = Depends(get_current_user_id)):
 @router.put("/profile", response_model=UserResponse)
 async def update_profile(
     name: str = None,
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Update user profile."""
     users_collection = get_collection("users")
@@ -165,13 +204,22 @@ async def update_profile(
             detail="No data provided for update"
         )
     
-    await users_collection.update_one(
-        {"_id": ObjectId(current_user_id)},
-        {"$set": update_data}
+    # Update and return the user in one round trip
+    result = await find_one_and_set(
+        users_collection,
+        current_user_id,
+        update_data,
+        projection={"password": 0}
     )
+    forget("users", current_user_id)
+    
+    if not result:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
     
-    # Return updated user
-    user = await users_collection.find_one({"_id": ObjectId(current_user_id)})
+    _, user = result
     
     return UserResponse(
         id=str(user["_id"]),
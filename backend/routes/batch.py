@@ -0,0 +1,116 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+import asyncio
+import orjson
+from bson import ObjectId
+from models.batch import BatchItem, BatchRequest, BatchResponse
+from auth import get_current_user_id
+
+router = APIRouter(tags=["batch"])
+
+# Sub-requests of one batch running at the same time
+MAX_BATCH_CONCURRENCY = 6
+
+API_PREFIX = "/api/"
+BATCH_PATH = "/api/batch"
+
+# Request headers passed on to every sub-request
+FORWARDED_HEADERS = (b"authorization", b"accept-language", b"user-agent")
+
+def sub_request_scope(parent: dict, item: BatchItem) -> dict:
+    """An ASGI scope for `item` that inherits the batch request's connection and credentials."""
+    target = urlsplit(item.path)
+    headers = [(name, value) for name, value in parent["headers"] if name in FORWARDED_HEADERS]
+    if item.body is not None:
+        headers.append((b"content-type", b"application/json"))
+    
+    return {
+        "type": "http",
+        "asgi": parent.get("asgi", {"version": "3.0"}),
+        "http_version": parent.get("http_version", "1.1"),
+        "method": item.method.upper(),
+        "scheme": parent.get("scheme", "http"),
+        "server": parent.get("server"),
+        "client": parent.get("client"),
+        "root_path": parent.get("root_path", ""),
+        "path": target.path,
+        "raw_path": target.path.encode(),
+        "query_string": target.query.encode(),
+        "headers": headers
+    }
+
+async def run_sub_request(app, scope: dict, body: bytes) -> Tuple[int, bytes, Optional[str]]:
+    """Call the app in-process and collect (status, body, content type)."""
+    received = False
+    response_status, content_type, chunks = 500, None, []
+    
+    async def receive():
+        nonlocal received
+        if received:
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": body, "more_body": False}
+    
+    async def send(message):
+        nonlocal response_status, content_type
+        if message["type"] == "http.response.start":
+            response_status = message["status"]
+            for name, value in message.get("headers", []):
+                if name.lower() == b"content-type":
+                    content_type = value.decode("latin-1")
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+    
+    await app(scope, receive, send)
+    return response_status, b"".join(chunks), content_type
+
+def decode_body(body: bytes, content_type: Optional[str]):
+    if not body:
+        return None
+    if content_type and content_type.startswith("application/json"):
+        return orjson.loads(body)
+    return body.decode("utf-8", errors="replace")
+
+@router.post("/batch", response_model=BatchResponse)
+async def run_batch(
+    batch: BatchRequest,
+    request: Request,
+    current_user_id: ObjectId = Depends(get_current_user_id)
+):
+    """Run several API requests in one round trip.
+
+    Every item is dispatched in-process through the app, with the batch's
+    credentials, at most MAX_BATCH_CONCURRENCY at a time. Results are keyed by item
+    id and carry their own status codes, so one failing item does not fail the batch.
+    """
+    ids = [item.id for item in batch.items]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Batch item ids must be unique"
+        )
+    
+    for item in batch.items:
+        path = urlsplit(item.path).path
+        if not path.startswith(API_PREFIX) or path.rstrip("/") == BATCH_PATH:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Batch item {item.id}: path must be an API route other than {BATCH_PATH}"
+            )
+    
+    semaphore = asyncio.Semaphore(MAX_BATCH_CONCURRENCY)
+    
+    async def run(item: BatchItem) -> dict:
+        body = orjson.dumps(item.body) if item.body is not None else b""
+        async with semaphore:
+            try:
+                response_status, content, content_type = await run_sub_request(
+                    request.app, sub_request_scope(request.scope, item), body
+                )
+            except Exception as e:
+                return {"status": status.HTTP_500_INTERNAL_SERVER_ERROR, "body": {"detail": f"Internal error: {type(e).__name__}"}}
+        return {"status": response_status, "body": decode_body(content, content_type)}
+    
+    results: List[dict] = await asyncio.gather(*(run(item) for item in batch.items))
+    return {"results": dict(zip(ids, results))}
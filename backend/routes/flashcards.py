@@ -1,14 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
 from bson import ObjectId
+from pymongo import UpdateOne
 from typing import List, Optional
 from datetime import datetime, timedelta
-from models.flashcard import Flashcard, FlashcardCreate, FlashcardUpdate, FlashcardReview, StudySession
+from models.flashcard import (
+    Flashcard, FlashcardPage, DueFlashcards, FlashcardCreate, FlashcardUpdate, FlashcardReview, FlashcardBulkResult,
+    FlashcardReviewBatch, FlashcardReviewBatchResult, StudySession
+)
 from auth import get_current_user_id
-from database import get_collection
+from response_cache import cached, invalidates, FLASHCARDS
+from repositories import flashcard_repository, FlashcardRecord
+from xp import award_xp, FLASHCARD_CREATED, FLASHCARD_REVIEWED
+from rollups import get_rollup, record_change, record_changes, flashcard_counters, counter_map
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from fastjson import fast_json_enabled, fast_page
+from fieldsets import parse_fields, page_response, record_response, FIELDS_DESCRIPTION
+from bulk_import import upload_chunks, import_flashcards, ROW_PARSERS
 import random
 
 router = APIRouter(prefix="/flashcards", tags=["flashcards"])
 
+# The fields review_update sets
+REVIEW_FIELDS = ("lastReviewed", "nextReview", "reviewCount", "correctCount")
+
 def calculate_next_review(difficulty: str, is_correct: bool, review_count: int) -> datetime:
     """Calculate next review date using spaced repetition algorithm."""
     base_intervals = {
@@ -32,54 +46,37 @@ def calculate_next_review(difficulty: str, is_correct: bool, review_count: int)
     
     return datetime.utcnow() + timedelta(days=next_interval)
 
-@router.get("/", response_model=List[Flashcard])
+@router.get("/", response_model=FlashcardPage)
 async def get_user_flashcards(
     subject: Optional[str] = Query(None, description="Filter by subject"),
     difficulty: Optional[str] = Query(None, description="Filter by difficulty"),
-    current_user_id: str = Depends(get_current_user_id)
+    cursor: Optional[str] = Query(None, description="nextCursor from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
-    """Get user's flashcards."""
-    collection = get_collection("flashcards")
-    
-    filters = {"userId": ObjectId(current_user_id)}
+    """Get user's flashcards, newest first, one page at a time."""
+    filters = {"userId": current_user_id}
     if subject:
         filters["subject"] = subject
     if difficulty:
         filters["difficulty"] = difficulty
     
-    cursor = collection.find(filters).sort("createdAt", -1)
-    flashcards = await cursor.to_list(length=None)
-    
-    result = []
-    for card in flashcards:
-        result.append(Flashcard(
-            id=str(card["_id"]),
-            userId=str(card["userId"]),
-            subject=card["subject"],
-            topic=card["topic"],
-            question=card["question"],
-            answer=card["answer"],
-            difficulty=card["difficulty"],
-            lastReviewed=card.get("lastReviewed"),
-            nextReview=card["nextReview"],
-            reviewCount=card.get("reviewCount", 0),
-            correctCount=card.get("correctCount", 0),
-            createdAt=card["createdAt"]
-        ))
-    
-    return result
+    selected = parse_fields(Flashcard, fields)
+    cards, next_cursor = await flashcard_repository.page(filters, [("createdAt", -1)], limit, cursor, selected)
+    if fast_json_enabled():
+        return fast_page(FlashcardPage, "items", Flashcard, cards, selected, nextCursor=next_cursor)
+    return page_response(FlashcardPage, "items", Flashcard, selected, cards, nextCursor=next_cursor)
 
 @router.post("/", response_model=Flashcard)
+@invalidates(FLASHCARDS)
 async def create_flashcard(
     card_data: FlashcardCreate,
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Create new flashcard."""
-    collection = get_collection("flashcards")
-    users_collection = get_collection("users")
-    
     flashcard = Flashcard(
-        userId=ObjectId(current_user_id),
+        userId=current_user_id,
         subject=card_data.subject,
         topic=card_data.topic,
         question=card_data.question,
@@ -87,32 +84,33 @@ async def create_flashcard(
         difficulty=card_data.difficulty
     )
     
-    result = await collection.insert_one(flashcard.dict(by_alias=True))
-    flashcard.id = str(result.inserted_id)
+    card_doc = await flashcard_repository.insert(flashcard)
+    await record_change(current_user_id, flashcard_counters, after=card_doc)
     
     # Award XP for creating flashcard
-    user = await users_collection.find_one({"_id": ObjectId(current_user_id)})
-    new_total_xp = user.get("totalXP", 0) + 5  # 5 XP for creating a flashcard
-    
-    await users_collection.update_one(
-        {"_id": ObjectId(current_user_id)},
-        {"$set": {"totalXP": new_total_xp}}
-    )
+    await award_xp(current_user_id, 5, FLASHCARD_CREATED, ref_id=card_doc["_id"])
     
     return flashcard
 
+@router.post("/bulk", response_model=FlashcardBulkResult)
+@invalidates(FLASHCARDS)
+async def bulk_create_flashcards(
+    request: Request,
+    current_user_id: ObjectId = Depends(get_current_user_id)
+):
+    """Create many flashcards from a JSON array, NDJSON, or CSV upload (see bulk_import)."""
+    upload_format, chunks = await upload_chunks(request)
+    return await import_flashcards(current_user_id, ROW_PARSERS[upload_format](chunks))
+
 @router.get("/{card_id}", response_model=Flashcard)
 async def get_flashcard(
     card_id: str,
-    current_user_id: str = Depends(get_current_user_id)
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Get specific flashcard."""
-    collection = get_collection("flashcards")
-    
-    card = await collection.find_one({
-        "_id": ObjectId(card_id),
-        "userId": ObjectId(current_user_id)
-    })
+    selected = parse_fields(Flashcard, fields)
+    card = await flashcard_repository.get(ObjectId(card_id), current_user_id, selected)
     
     if not card:
         raise HTTPException(
@@ -120,42 +118,16 @@ async def get_flashcard(
             detail="Flashcard not found"
         )
     
-    return Flashcard(
-        id=str(card["_id"]),
-        userId=str(card["userId"]),
-        subject=card["subject"],
-        topic=card["topic"],
-        question=card["question"],
-        answer=card["answer"],
-        difficulty=card["difficulty"],
-        lastReviewed=card.get("lastReviewed"),
-        nextReview=card["nextReview"],
-        reviewCount=card.get("reviewCount", 0),
-        correctCount=card.get("correctCount", 0),
-        createdAt=card["createdAt"]
-    )
+    return record_response(card, selected)
 
 @router.put("/{card_id}", response_model=Flashcard)
+@invalidates(FLASHCARDS)
 async def update_flashcard(
     card_id: str,
     update_data: FlashcardUpdate,
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Update flashcard."""
-    collection = get_collection("flashcards")
-    
-    # Verify card belongs to user
-    card = await collection.find_one({
-        "_id": ObjectId(card_id),
-        "userId": ObjectId(current_user_id)
-    })
-    
-    if not card:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Flashcard not found"
-        )
-    
     update_dict = {}
     if update_data.subject:
         update_dict["subject"] = update_data.subject
@@ -168,98 +140,95 @@ async def update_flashcard(
     if update_data.difficulty:
         update_dict["difficulty"] = update_data.difficulty
     
-    if update_dict:
-        await collection.update_one(
-            {"_id": ObjectId(card_id)},
-            {"$set": update_dict}
+    # Verify card belongs to user and update it in one round trip
+    result = await flashcard_repository.update(ObjectId(card_id), current_user_id, update_dict)
+    
+    if not result:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Flashcard not found"
         )
     
-    # Return updated card
-    updated_card = await collection.find_one({"_id": ObjectId(card_id)})
-    
-    return Flashcard(
-        id=str(updated_card["_id"]),
-        userId=str(updated_card["userId"]),
-        subject=updated_card["subject"],
-        topic=updated_card["topic"],
-        question=updated_card["question"],
-        answer=updated_card["answer"],
-        difficulty=updated_card["difficulty"],
-        lastReviewed=updated_card.get("lastReviewed"),
-        nextReview=updated_card["nextReview"],
-        reviewCount=updated_card.get("reviewCount", 0),
-        correctCount=updated_card.get("correctCount", 0),
-        createdAt=updated_card["createdAt"]
-    )
+    card, updated_card = result
+    await record_change(current_user_id, flashcard_counters, before=card, after=updated_card)
+    
+    return FlashcardRecord.from_document(updated_card).to_api()
 
 @router.delete("/{card_id}")
+@invalidates(FLASHCARDS)
 async def delete_flashcard(
     card_id: str,
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Delete flashcard."""
-    collection = get_collection("flashcards")
-    
-    result = await collection.delete_one({
-        "_id": ObjectId(card_id),
-        "userId": ObjectId(current_user_id)
-    })
+    card = await flashcard_repository.delete(ObjectId(card_id), current_user_id)
     
-    if result.deleted_count == 0:
+    if not card:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Flashcard not found"
         )
     
+    await record_change(current_user_id, flashcard_counters, before=card)
+    
     return {"message": "Flashcard deleted successfully"}
 
-@router.get("/due/review")
-async def get_cards_due_for_review(current_user_id: str = Depends(get_current_user_id)):
-    """Get flashcards due for review."""
-    collection = get_collection("flashcards")
-    
+@router.get("/due/review", response_model=DueFlashcards)
+async def get_cards_due_for_review(
+    cursor: Optional[str] = Query(None, description="nextCursor from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    current_user_id: ObjectId = Depends(get_current_user_id)
+):
+    """Get flashcards due for review, most overdue first, one page at a time."""
     now = datetime.utcnow()
-    cursor = collection.find({
-        "userId": ObjectId(current_user_id),
+    filters = {
+        "userId": current_user_id,
         "nextReview": {"$lte": now}
-    }).sort("nextReview", 1)
-    
-    cards = await cursor.to_list(length=None)
-    
-    result = []
-    for card in cards:
-        result.append(Flashcard(
-            id=str(card["_id"]),
-            userId=str(card["userId"]),
-            subject=card["subject"],
-            topic=card["topic"],
-            question=card["question"],
-            answer=card["answer"],
-            difficulty=card["difficulty"],
-            lastReviewed=card.get("lastReviewed"),
-            nextReview=card["nextReview"],
-            reviewCount=card.get("reviewCount", 0),
-            correctCount=card.get("correctCount", 0),
-            createdAt=card["createdAt"]
-        ))
-    
-    return {"totalDue": len(result), "cards": result}
+    }
+    
+    selected = parse_fields(Flashcard, fields)
+    cards, next_cursor = await flashcard_repository.page(filters, [("nextReview", 1)], limit, cursor, selected)
+    # Counted on the userId/nextReview index, so the total covers every page
+    total_due = await flashcard_repository.count(filters)
+    
+    if fast_json_enabled():
+        return fast_page(DueFlashcards, "cards", Flashcard, cards, selected, totalDue=total_due, nextCursor=next_cursor)
+    return page_response(DueFlashcards, "cards", Flashcard, selected, cards, totalDue=total_due, nextCursor=next_cursor)
+
+def review_update(card: dict, is_correct: bool) -> dict:
+    """The fields a review sets on `card`."""
+    review_count = card.get("reviewCount", 0) + 1
+    correct_count = card.get("correctCount", 0) + (1 if is_correct else 0)
+    return {
+        "lastReviewed": datetime.utcnow(),
+        "nextReview": calculate_next_review(card["difficulty"], is_correct, review_count),
+        "reviewCount": review_count,
+        "correctCount": correct_count
+    }
+
+def review_xp(is_correct: bool) -> int:
+    return 3 if is_correct else 1
+
+def card_accuracy(card: dict) -> float:
+    review_count = card.get("reviewCount", 0)
+    return round((card.get("correctCount", 0) / review_count) * 100, 1) if review_count > 0 else 0
 
 @router.put("/{card_id}/review")
+@invalidates(FLASHCARDS)
 async def review_flashcard(
     card_id: str,
     review_data: FlashcardReview,
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Record flashcard review result."""
-    collection = get_collection("flashcards")
-    users_collection = get_collection("users")
+    collection = flashcard_repository.collection
     
-    # Get flashcard
+    # Get flashcard (the raw document, since the rollup needs its before-image)
     card = await collection.find_one({
         "_id": ObjectId(card_id),
-        "userId": ObjectId(current_user_id)
-    })
+        "userId": current_user_id
+    }, flashcard_repository.REVIEW_PROJECTION)
     
     if not card:
         raise HTTPException(
@@ -267,59 +236,94 @@ async def review_flashcard(
             detail="Flashcard not found"
         )
     
-    # Update review statistics
-    review_count = card.get("reviewCount", 0) + 1
-    correct_count = card.get("correctCount", 0)
-    
-    if review_data.isCorrect:
-        correct_count += 1
-    
-    # Calculate next review date
-    next_review = calculate_next_review(
-        card["difficulty"], 
-        review_data.isCorrect, 
-        review_count
-    )
-    
-    # Update flashcard
+    # Update review statistics and the next review date
+    update = review_update(card, review_data.isCorrect)
     await collection.update_one(
         {"_id": ObjectId(card_id)},
-        {"$set": {
-            "lastReviewed": datetime.utcnow(),
-            "nextReview": next_review,
-            "reviewCount": review_count,
-            "correctCount": correct_count
-        }}
+        {"$set": update}
     )
+    await record_change(current_user_id, flashcard_counters, before=card, after={**card, **update})
     
     # Award XP for review
-    xp_reward = 3 if review_data.isCorrect else 1
-    
-    user = await users_collection.find_one({"_id": ObjectId(current_user_id)})
-    new_total_xp = user.get("totalXP", 0) + xp_reward
-    
-    await users_collection.update_one(
-        {"_id": ObjectId(current_user_id)},
-        {"$set": {"totalXP": new_total_xp}}
-    )
+    xp_reward = review_xp(review_data.isCorrect)
+    await award_xp(current_user_id, xp_reward, FLASHCARD_REVIEWED, ref_id=card["_id"])
     
     return {
         "message": "Review recorded successfully",
         "isCorrect": review_data.isCorrect,
-        "nextReview": next_review.isoformat(),
+        "nextReview": update["nextReview"].isoformat(),
         "xpAwarded": xp_reward,
-        "accuracy": round((correct_count / review_count) * 100, 1) if review_count > 0 else 0
+        "accuracy": card_accuracy(update)
+    }
+
+@router.post("/review/batch", response_model=FlashcardReviewBatchResult)
+@invalidates(FLASHCARDS)
+async def review_flashcards_batch(
+    batch: FlashcardReviewBatch,
+    current_user_id: ObjectId = Depends(get_current_user_id)
+):
+    """Record a study session's reviews in order.
+
+    All cards are read with one query and written with one bulk_write; the rollup
+    and the session's XP are each applied once. A card reviewed more than once is
+    scheduled from its previous review in the batch.
+    """
+    collection = flashcard_repository.collection
+    
+    card_ids = list(dict.fromkeys(review.cardId for review in batch.reviews))
+    cursor = collection.find({"_id": {"$in": card_ids}, "userId": current_user_id}, flashcard_repository.REVIEW_PROJECTION)
+    before = {card["_id"]: card async for card in cursor}
+    
+    after = {}
+    results = []
+    not_found = []
+    xp_reward = 0
+    for review in batch.reviews:
+        card = after.get(review.cardId) or before.get(review.cardId)
+        if card is None:
+            if review.cardId not in not_found:
+                not_found.append(review.cardId)
+            continue
+        
+        card = after[review.cardId] = {**card, **review_update(card, review.isCorrect)}
+        xp_reward += review_xp(review.isCorrect)
+        results.append({
+            "cardId": review.cardId,
+            "isCorrect": review.isCorrect,
+            "nextReview": card["nextReview"],
+            "accuracy": card_accuracy(card)
+        })
+    
+    if after:
+        await collection.bulk_write([
+            UpdateOne({"_id": card_id, "userId": current_user_id}, {"$set": {key: card[key] for key in REVIEW_FIELDS}})
+            for card_id, card in after.items()
+        ], ordered=False)
+        await record_changes(current_user_id, flashcard_counters, ((before[card_id], card) for card_id, card in after.items()))
+        await award_xp(current_user_id, xp_reward, FLASHCARD_REVIEWED)
+    
+    correct_answers = sum(1 for result in results if result["isCorrect"])
+    return {
+        "session": StudySession(
+            totalCards=len(results),
+            correctAnswers=correct_answers,
+            incorrectAnswers=len(results) - correct_answers,
+            accuracy=round((correct_answers / len(results)) * 100, 1) if results else 0,
+            timeSpent=batch.timeSpent
+        ),
+        "results": results,
+        "notFound": not_found,
+        "xpAwarded": xp_reward
     }
 
 @router.get("/stats/summary")
-async def get_flashcard_stats(current_user_id: str = Depends(get_current_user_id)):
+@cached(FLASHCARDS)
+async def get_flashcard_stats(current_user_id: ObjectId = Depends(get_current_user_id)):
     """Get flashcard statistics summary."""
-    collection = get_collection("flashcards")
+    rollup = (await get_rollup(current_user_id)).get("flashcards", {})
+    total_cards = rollup.get("total", 0)
     
-    cursor = collection.find({"userId": ObjectId(current_user_id)})
-    cards = await cursor.to_list(length=None)
-    
-    if not cards:
+    if not total_cards:
         return {
             "totalCards": 0,
             "cardsDue": 0,
@@ -329,40 +333,24 @@ async def get_flashcard_stats(current_user_id: str = Depends(get_current_user_id
             "difficultyDistribution": {}
         }
     
-    total_cards = len(cards)
-    
-    # Cards due for review
-    now = datetime.utcnow()
-    cards_due = sum(1 for card in cards if card["nextReview"] <= now)
+    # Cards due for review depend on the clock, so they are counted on the index
+    cards_due = await flashcard_repository.count({
+        "userId": current_user_id,
+        "nextReview": {"$lte": datetime.utcnow()}
+    })
     
     # Calculate average accuracy
-    total_reviews = sum(card.get("reviewCount", 0) for card in cards)
-    total_correct = sum(card.get("correctCount", 0) for card in cards)
+    total_reviews = rollup.get("totalReviews", 0)
+    total_correct = rollup.get("totalCorrect", 0)
     average_accuracy = (total_correct / total_reviews) * 100 if total_reviews > 0 else 0
     
-    # Subject distribution
-    subject_distribution = {}
-    for card in cards:
-        subject = card["subject"]
-        if subject not in subject_distribution:
-            subject_distribution[subject] = 0
-        subject_distribution[subject] += 1
-    
-    # Difficulty distribution
-    difficulty_distribution = {}
-    for card in cards:
-        difficulty = card["difficulty"]
-        if difficulty not in difficulty_distribution:
-            difficulty_distribution[difficulty] = 0
-        difficulty_distribution[difficulty] += 1
-    
     return {
         "totalCards": total_cards,
         "cardsDue": cards_due,
         "averageAccuracy": round(average_accuracy, 1),
         "totalReviews": total_reviews,
-        "subjectDistribution": subject_distribution,
-        "difficultyDistribution": difficulty_distribution
+        "subjectDistribution": counter_map(rollup, "bySubject"),
+        "difficultyDistribution": counter_map(rollup, "byDifficulty")
     }
 
 @router.post("/session/start")
@@ -370,12 +358,10 @@ async def start_study_session(
     subject: Optional[str] = Query(None),
     difficulty: Optional[str] = Query(None),
     card_count: int = Query(10, description="Number of cards for session"),
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Start a focused study session."""
-    collection = get_collection("flashcards")
-    
-    filters = {"userId": ObjectId(current_user_id)}
+    filters = {"userId": current_user_id}
     if subject:
         filters["subject"] = subject
     if difficulty:
@@ -383,14 +369,20 @@ async def start_study_session(
     
     # Get cards due for review first, then random cards
     now = datetime.utcnow()
-    due_cursor = collection.find({**filters, "nextReview": {"$lte": now}}).limit(card_count)
-    due_cards = await due_cursor.to_list(length=None)
+    due_cards = await flashcard_repository.find(
+        {**filters, "nextReview": {"$lte": now}},
+        limit=card_count,
+        projection=flashcard_repository.SESSION_PROJECTION
+    )
     
     remaining_count = card_count - len(due_cards)
     if remaining_count > 0:
         # Get random cards that are not due
-        random_cursor = collection.find({**filters, "nextReview": {"$gt": now}}).limit(remaining_count)
-        random_cards = await random_cursor.to_list(length=None)
+        random_cards = await flashcard_repository.find(
+            {**filters, "nextReview": {"$gt": now}},
+            limit=remaining_count,
+            projection=flashcard_repository.SESSION_PROJECTION
+        )
         all_cards = due_cards + random_cards
     else:
         all_cards = due_cards[:card_count]
@@ -402,12 +394,12 @@ async def start_study_session(
     session_cards = []
     for card in all_cards:
         session_cards.append({
-            "id": str(card["_id"]),
-            "subject": card["subject"],
-            "topic": card["topic"],
-            "question": card["question"],
-            "answer": card["answer"],
-            "difficulty": card["difficulty"]
+            "id": str(card.id),
+            "subject": card.subject,
+            "topic": card.topic,
+            "question": card.question,
+            "answer": card.answer,
+            "difficulty": card.difficulty
         })
     
     return {
@@ -2,23 +2,30 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from bson import ObjectId
 from typing import List, Optional
 from datetime import datetime, date, timedelta
-from models.goal import Goal, GoalCreate, GoalUpdate, CalendarEvent, CalendarEventCreate
+from models.goal import Goal, GoalPage, GoalCreate, GoalUpdate, CalendarEvent, CalendarEventPage, CalendarEventCreate
 from auth import get_current_user_id
-from database import get_collection
+from response_cache import cached, invalidates, GOALS
+from repositories import goal_repository, calendar_event_repository, GoalRecord
+from xp import award_xp, GOAL_CREATED, GOAL_COMPLETED
+from rollups import get_rollup, record_change, goal_counters, counter_map
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from fastjson import fast_json_enabled, fast_page
+from fieldsets import parse_fields, page_response, record_response, FIELDS_DESCRIPTION
 
 router = APIRouter(prefix="/goals", tags=["goals"])
 
-@router.get("/", response_model=List[Goal])
+@router.get("/", response_model=GoalPage)
 async def get_user_goals(
     category: Optional[str] = Query(None, description="Filter by category"),
     priority: Optional[str] = Query(None, description="Filter by priority"),
     completed: Optional[bool] = Query(None, description="Filter by completion status"),
-    current_user_id: str = Depends(get_current_user_id)
+    cursor: Optional[str] = Query(None, description="nextCursor from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
-    """Get user's goals."""
-    collection = get_collection("goals")
-    
-    filters = {"userId": ObjectId(current_user_id)}
+    """Get user's goals, nearest deadline first, one page at a time."""
+    filters = {"userId": current_user_id}
     if category:
         filters["category"] = category
     if priority:
@@ -26,38 +33,21 @@ async def get_user_goals(
     if completed is not None:
         filters["completed"] = completed
     
-    cursor = collection.find(filters).sort("deadline", 1)
-    goals = await cursor.to_list(length=None)
-    
-    result = []
-    for goal in goals:
-        result.append(Goal(
-            id=str(goal["_id"]),
-            userId=str(goal["userId"]),
-            title=goal["title"],
-            description=goal["description"],
-            deadline=goal["deadline"],
-            progress=goal.get("progress", 0),
-            priority=goal.get("priority", "medium"),
-            category=goal["category"],
-            completed=goal.get("completed", False),
-            createdAt=goal["createdAt"],
-            updatedAt=goal.get("updatedAt", goal["createdAt"])
-        ))
-    
-    return result
+    selected = parse_fields(Goal, fields)
+    goals, next_cursor = await goal_repository.page(filters, [("deadline", 1)], limit, cursor, selected)
+    if fast_json_enabled():
+        return fast_page(GoalPage, "items", Goal, goals, selected, nextCursor=next_cursor)
+    return page_response(GoalPage, "items", Goal, selected, goals, nextCursor=next_cursor)
 
 @router.post("/", response_model=Goal)
+@invalidates(GOALS)
 async def create_goal(
     goal_data: GoalCreate,
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Create new goal."""
-    collection = get_collection("goals")
-    users_collection = get_collection("users")
-    
     goal = Goal(
-        userId=ObjectId(current_user_id),
+        userId=current_user_id,
         title=goal_data.title,
         description=goal_data.description,
         deadline=goal_data.deadline,
@@ -65,32 +55,23 @@ async def create_goal(
         category=goal_data.category
     )
     
-    result = await collection.insert_one(goal.dict(by_alias=True))
-    goal.id = str(result.inserted_id)
+    goal_doc = await goal_repository.insert(goal)
+    await record_change(current_user_id, goal_counters, after=goal_doc)
     
     # Award XP for setting goal
-    user = await users_collection.find_one({"_id": ObjectId(current_user_id)})
-    new_total_xp = user.get("totalXP", 0) + 15  # 15 XP for creating a goal
-    
-    await users_collection.update_one(
-        {"_id": ObjectId(current_user_id)},
-        {"$set": {"totalXP": new_total_xp}}
-    )
+    await award_xp(current_user_id, 15, GOAL_CREATED, ref_id=goal_doc["_id"])
     
     return goal
 
 @router.get("/{goal_id}", response_model=Goal)
 async def get_goal(
     goal_id: str,
-    current_user_id: str = Depends(get_current_user_id)
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Get specific goal."""
-    collection = get_collection("goals")
-    
-    goal = await collection.find_one({
-        "_id": ObjectId(goal_id),
-        "userId": ObjectId(current_user_id)
-    })
+    selected = parse_fields(Goal, fields)
+    goal = await goal_repository.get(ObjectId(goal_id), current_user_id, selected)
     
     if not goal:
         raise HTTPException(
@@ -98,42 +79,16 @@ async def get_goal(
             detail="Goal not found"
         )
     
-    return Goal(
-        id=str(goal["_id"]),
-        userId=str(goal["userId"]),
-        title=goal["title"],
-        description=goal["description"],
-        deadline=goal["deadline"],
-        progress=goal.get("progress", 0),
-        priority=goal.get("priority", "medium"),
-        category=goal["category"],
-        completed=goal.get("completed", False),
-        createdAt=goal["createdAt"],
-        updatedAt=goal.get("updatedAt", goal["createdAt"])
-    )
+    return record_response(goal, selected)
 
 @router.put("/{goal_id}", response_model=Goal)
+@invalidates(GOALS)
 async def update_goal(
     goal_id: str,
     update_data: GoalUpdate,
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Update goal."""
-    collection = get_collection("goals")
-    users_collection = get_collection("users")
-    
-    # Verify goal belongs to user
-    goal = await collection.find_one({
-        "_id": ObjectId(goal_id),
-        "userId": ObjectId(current_user_id)
-    })
-    
-    if not goal:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Goal not found"
-        )
-    
     update_dict = {"updatedAt": datetime.utcnow()}
     
     if update_data.title:
@@ -145,20 +100,9 @@ async def update_goal(
     if update_data.progress is not None:
         update_dict["progress"] = min(max(update_data.progress, 0), 100)  # Clamp between 0-100
         
-        # Check if goal is completed (100% progress)
-        if update_data.progress >= 100 and not goal.get("completed", False):
+        # Goal is completed at 100% progress
+        if update_data.progress >= 100:
             update_dict["completed"] = True
-            
-            # Award XP for completing goal
-            xp_reward = 50 if update_data.priority == "high" else 30 if update_data.priority == "medium" else 20
-            
-            user = await users_collection.find_one({"_id": ObjectId(current_user_id)})
-            new_total_xp = user.get("totalXP", 0) + xp_reward
-            
-            await users_collection.update_one(
-                {"_id": ObjectId(current_user_id)},
-                {"$set": {"totalXP": new_total_xp}}
-            )
     
     if update_data.priority:
         update_dict["priority"] = update_data.priority
@@ -167,92 +111,88 @@ async def update_goal(
     if update_data.completed is not None:
         update_dict["completed"] = update_data.completed
     
-    await collection.update_one(
-        {"_id": ObjectId(goal_id)},
-        {"$set": update_dict}
-    )
+    # Verify goal belongs to user and update it in one round trip
+    result = await goal_repository.update(ObjectId(goal_id), current_user_id, update_dict)
     
-    # Return updated goal
-    updated_goal = await collection.find_one({"_id": ObjectId(goal_id)})
+    if not result:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Goal not found"
+        )
     
-    return Goal(
-        id=str(updated_goal["_id"]),
-        userId=str(updated_goal["userId"]),
-        title=updated_goal["title"],
-        description=updated_goal["description"],
-        deadline=updated_goal["deadline"],
-        progress=updated_goal.get("progress", 0),
-        priority=updated_goal.get("priority", "medium"),
-        category=updated_goal["category"],
-        completed=updated_goal.get("completed", False),
-        createdAt=updated_goal["createdAt"],
-        updatedAt=updated_goal.get("updatedAt", updated_goal["createdAt"])
-    )
+    goal, updated_goal = result
+    await record_change(current_user_id, goal_counters, before=goal, after=updated_goal)
+    
+    # Award XP for completing goal
+    if update_data.progress is not None and update_data.progress >= 100 and not goal.get("completed", False):
+        xp_reward = 50 if update_data.priority == "high" else 30 if update_data.priority == "medium" else 20
+        await award_xp(current_user_id, xp_reward, GOAL_COMPLETED, ref_id=goal["_id"])
+    
+    return GoalRecord.from_document(updated_goal).to_api()
 
 @router.delete("/{goal_id}")
+@invalidates(GOALS)
 async def delete_goal(
     goal_id: str,
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Delete goal."""
-    collection = get_collection("goals")
-    
-    result = await collection.delete_one({
-        "_id": ObjectId(goal_id),
-        "userId": ObjectId(current_user_id)
-    })
+    goal = await goal_repository.delete(ObjectId(goal_id), current_user_id)
     
-    if result.deleted_count == 0:
+    if not goal:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Goal not found"
         )
     
+    await record_change(current_user_id, goal_counters, before=goal)
+    
     return {"message": "Goal deleted successfully"}
 
 @router.get("/upcoming/deadlines")
 async def get_upcoming_deadlines(
     days: int = Query(7, description="Number of days to look ahead"),
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Get goals with upcoming deadlines."""
-    collection = get_collection("goals")
-    
     today = date.today()
     future_date = today + timedelta(days=days)
     
-    cursor = collection.find({
-        "userId": ObjectId(current_user_id),
-        "deadline": {"$gte": today, "$lte": future_date},
-        "completed": False
-    }).sort("deadline", 1)
-    
-    goals = await cursor.to_list(length=None)
+    goals = await goal_repository.find(
+        {
+            "userId": current_user_id,
+            "deadline": {"$gte": today, "$lte": future_date},
+            "completed": False
+        },
+        sort=[("deadline", 1)],
+        projection=goal_repository.DEADLINE_PROJECTION
+    )
     
     result = []
     for goal in goals:
-        days_remaining = (goal["deadline"] - today).days
+        # Dates are stored as midnight datetimes (see database.DateEncoder)
+        deadline = goal.deadline.date()
+        days_remaining = (deadline - today).days
         result.append({
-            "id": str(goal["_id"]),
-            "title": goal["title"],
-            "deadline": goal["deadline"].isoformat(),
+            "id": str(goal.id),
+            "title": goal.title,
+            "deadline": deadline.isoformat(),
             "daysRemaining": days_remaining,
-            "progress": goal.get("progress", 0),
-            "priority": goal.get("priority", "medium"),
-            "category": goal["category"]
+            "progress": goal.progress,
+            "priority": goal.priority,
+            "category": goal.category
         })
     
     return {"upcomingDeadlines": result, "totalCount": len(result)}
 
 @router.get("/stats/overview")
-async def get_goals_overview(current_user_id: str = Depends(get_current_user_id)):
+@cached(GOALS)
+async def get_goals_overview(current_user_id: ObjectId = Depends(get_current_user_id)):
     """Get goals statistics overview."""
-    collection = get_collection("goals")
-    
-    cursor = collection.find({"userId": ObjectId(current_user_id)})
-    goals = await cursor.to_list(length=None)
+    rollup = (await get_rollup(current_user_id)).get("goals", {})
+    total_goals = rollup.get("total", 0)
     
-    if not goals:
+    if not total_goals:
         return {
             "totalGoals": 0,
             "completedGoals": 0,
@@ -262,53 +202,37 @@ async def get_goals_overview(current_user_id: str = Depends(get_current_user_id)
             "completionRate": 0
         }
     
-    total_goals = len(goals)
-    completed_goals = sum(1 for goal in goals if goal.get("completed", False))
-    total_progress = sum(goal.get("progress", 0) for goal in goals)
-    average_progress = total_progress / total_goals if total_goals > 0 else 0
-    
-    # Category distribution
-    category_distribution = {}
-    for goal in goals:
-        category = goal["category"]
-        if category not in category_distribution:
-            category_distribution[category] = {"total": 0, "completed": 0}
-        category_distribution[category]["total"] += 1
-        if goal.get("completed", False):
-            category_distribution[category]["completed"] += 1
-    
-    # Priority distribution
-    priority_distribution = {}
-    for goal in goals:
-        priority = goal.get("priority", "medium")
-        if priority not in priority_distribution:
-            priority_distribution[priority] = {"total": 0, "completed": 0}
-        priority_distribution[priority]["total"] += 1
-        if goal.get("completed", False):
-            priority_distribution[priority]["completed"] += 1
-    
-    completion_rate = (completed_goals / total_goals) * 100 if total_goals > 0 else 0
+    completed_goals = rollup.get("completed", 0)
+    average_progress = rollup.get("progressSum", 0) / total_goals
+    completion_rate = (completed_goals / total_goals) * 100
     
     return {
         "totalGoals": total_goals,
         "completedGoals": completed_goals,
         "averageProgress": round(average_progress, 1),
-        "categoryDistribution": category_distribution,
-        "priorityDistribution": priority_distribution,
+        "categoryDistribution": {
+            category: {"total": counts.get("total", 0), "completed": counts.get("completed", 0)}
+            for category, counts in counter_map(rollup, "byCategory").items()
+        },
+        "priorityDistribution": {
+            priority: {"total": counts.get("total", 0), "completed": counts.get("completed", 0)}
+            for priority, counts in counter_map(rollup, "byPriority").items()
+        },
         "completionRate": round(completion_rate, 1)
     }
 
 # Calendar Events endpoints
-@router.get("/calendar/events")
+@router.get("/calendar/events", response_model=CalendarEventPage)
 async def get_calendar_events(
     start_date: Optional[date] = Query(None, description="Start date filter"),
     end_date: Optional[date] = Query(None, description="End date filter"),
-    current_user_id: str = Depends(get_current_user_id)
+    cursor: Optional[str] = Query(None, description="nextCursor from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
-    """Get calendar events."""
-    collection = get_collection("calendar_events")
-    
-    filters = {"userId": ObjectId(current_user_id)}
+    """Get calendar events in date order, one page at a time."""
+    filters = {"userId": current_user_id}
     if start_date and end_date:
         filters["date"] = {"$gte": start_date, "$lte": end_date}
     elif start_date:
@@ -316,36 +240,21 @@ async def get_calendar_events(
     elif end_date:
         filters["date"] = {"$lte": end_date}
     
-    cursor = collection.find(filters).sort("date", 1)
-    events = await cursor.to_list(length=None)
-    
-    result = []
-    for event in events:
-        result.append(CalendarEvent(
-            id=str(event["_id"]),
-            userId=str(event["userId"]),
-            title=event["title"],
-            description=event.get("description"),
-            date=event["date"],
-            time=event.get("time"),
-            type=event["type"],
-            priority=event.get("priority", "medium"),
-            completed=event.get("completed", False),
-            createdAt=event["createdAt"]
-        ))
-    
-    return result
+    selected = parse_fields(CalendarEvent, fields)
+    events, next_cursor = await calendar_event_repository.page(filters, [("date", 1)], limit, cursor, selected)
+    if fast_json_enabled():
+        return fast_page(CalendarEventPage, "items", CalendarEvent, events, selected, nextCursor=next_cursor)
+    return page_response(CalendarEventPage, "items", CalendarEvent, selected, events, nextCursor=next_cursor)
 
 @router.post("/calendar/events")
+@invalidates(GOALS)
 async def create_calendar_event(
     event_data: CalendarEventCreate,
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Create calendar event."""
-    collection = get_collection("calendar_events")
-    
     event = CalendarEvent(
-        userId=ObjectId(current_user_id),
+        userId=current_user_id,
         title=event_data.title,
         description=event_data.description,
         date=event_data.date,
@@ -354,7 +263,6 @@ async def create_calendar_event(
         priority=event_data.priority
     )
     
-    result = await collection.insert_one(event.dict(by_alias=True))
-    event.id = str(result.inserted_id)
+    await calendar_event_repository.insert(event)
     
     return event
\ No newline at end of file
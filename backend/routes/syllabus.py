@@ -1,46 +1,101 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from bson import ObjectId
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import datetime
-from models.syllabus import SyllabusItem, SyllabusItemUpdate, SyllabusProgress, OverallProgress
+from models.syllabus import SyllabusItem, SyllabusItemUpdate, SyllabusBulkUpdate, SyllabusProgress, OverallProgress
 from auth import get_current_user_id
-from database import get_collection
+from response_cache import cached, invalidates, SYLLABUS
+from xp import award_xp, TOPIC_MASTERED
+from rollups import counter_map
+from pagination import MAX_PAGE_SIZE
+from syllabus_templates import iter_user_topics, user_topics, set_override, set_overrides, syllabus_summary
+import re
+from itertools import islice
 
 router = APIRouter(prefix="/syllabus", tags=["syllabus"])
 
+def topic_update_fields(update_data: SyllabusItemUpdate) -> dict:
+    """The override fields an update sets (without updatedAt)."""
+    update_dict = {}
+    if update_data.status:
+        update_dict["status"] = update_data.status
+    if update_data.highYield is not None:
+        update_dict["highYield"] = update_data.highYield
+    return update_dict
+
+def mastery_xp(topic: dict, update_dict: dict) -> int:
+    """XP for an update of `topic` (before the update), awarded when it becomes mastered."""
+    if update_dict.get("status") == "mastered" and topic["status"] != "mastered":
+        return 25 if update_dict.get("highYield") else 15
+    return 0
+
+def topic_entry(item: dict) -> dict:
+    return {
+        "id": str(item["_id"]),
+        "topic": item["topic"],
+        "subtopics": item["subtopics"],
+        "status": item["status"],
+        "highYield": item["highYield"],
+        "updatedAt": item["updatedAt"].isoformat()
+    }
+
 @router.get("/", response_model=Dict[str, Any])
-async def get_complete_syllabus(current_user_id: str = Depends(get_current_user_id)):
+@cached(SYLLABUS)
+async def get_complete_syllabus(current_user_id: ObjectId = Depends(get_current_user_id)):
     """Get complete syllabus for user."""
-    collection = get_collection("syllabus")
-    
-    cursor = collection.find({"userId": ObjectId(current_user_id)})
-    syllabus_items = await cursor.to_list(length=None)
-    
     # Organize by type and subject
     organized = {"mains": {}, "advanced": {}}
-    
-    for item in syllabus_items:
-        exam_type = item["type"]
-        subject = item["subject"]
-        
-        if subject not in organized[exam_type]:
-            organized[exam_type][subject] = []
-        
-        organized[exam_type][subject].append({
-            "id": str(item["_id"]),
-            "topic": item["topic"],
-            "subtopics": item["subtopics"],
-            "status": item["status"],
-            "highYield": item["highYield"],
-            "updatedAt": item["updatedAt"].isoformat()
-        })
+    for item in await user_topics(current_user_id):
+        organized[item["type"]].setdefault(item["subject"], []).append(topic_entry(item))
     
     return organized
 
+@router.get("/search")
+async def search_syllabus(
+    query: str,
+    subject: str = None,
+    status: str = None,
+    high_yield: bool = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Stop after this many results"),
+    current_user_id: ObjectId = Depends(get_current_user_id)
+):
+    """Search syllabus topics."""
+    # Case-insensitive substring match on topic and subtopics
+    pattern = re.compile(re.escape(query), re.IGNORECASE)
+    
+    def matches(topic):
+        return (
+            (not status or topic["status"] == status)
+            and (high_yield is None or topic["highYield"] == high_yield)
+            and (pattern.search(topic["topic"]) or any(pattern.search(sub) for sub in topic["subtopics"]))
+        )
+    
+    def search_result(topic):
+        return {
+            "id": str(topic["_id"]),
+            "type": topic["type"],
+            "subject": topic["subject"],
+            "topic": topic["topic"],
+            "subtopics": topic["subtopics"],
+            "status": topic["status"],
+            "highYield": topic["highYield"],
+            "updatedAt": topic["updatedAt"].isoformat()
+        }
+    
+    # Stops merging and matching as soon as `limit` topics have matched
+    topics = await iter_user_topics(current_user_id, subject=subject or None)
+    filtered_topics = [search_result(topic) for topic in islice(filter(matches, topics), limit)]
+    
+    return {
+        "query": query,
+        "totalResults": len(filtered_topics),
+        "results": filtered_topics
+    }
+
 @router.get("/{exam_type}")
 async def get_syllabus_by_type(
     exam_type: str,
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Get syllabus by exam type (mains/advanced)."""
     if exam_type not in ["mains", "advanced"]:
@@ -49,141 +104,109 @@ async def get_syllabus_by_type(
             detail="Exam type must be 'mains' or 'advanced'"
         )
     
-    collection = get_collection("syllabus")
-    
-    cursor = collection.find({
-        "userId": ObjectId(current_user_id),
-        "type": exam_type
-    })
-    syllabus_items = await cursor.to_list(length=None)
-    
     # Organize by subject
     organized = {}
-    
-    for item in syllabus_items:
-        subject = item["subject"]
-        
-        if subject not in organized:
-            organized[subject] = []
-        
-        organized[subject].append({
-            "id": str(item["_id"]),
-            "topic": item["topic"],
-            "subtopics": item["subtopics"],
-            "status": item["status"],
-            "highYield": item["highYield"],
-            "updatedAt": item["updatedAt"].isoformat()
-        })
+    for item in await user_topics(current_user_id, exam_type=exam_type):
+        organized.setdefault(item["subject"], []).append(topic_entry(item))
     
     return organized
 
 @router.put("/topic/{topic_id}")
+@invalidates(SYLLABUS)
 async def update_topic_status(
     topic_id: str,
     update_data: SyllabusItemUpdate,
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Update topic status."""
-    collection = get_collection("syllabus")
-    users_collection = get_collection("users")
+    update_dict = topic_update_fields(update_data)
+    update_dict["updatedAt"] = datetime.utcnow()
     
-    # Verify topic belongs to user
-    topic = await collection.find_one({
-        "_id": ObjectId(topic_id),
-        "userId": ObjectId(current_user_id)
-    })
+    # Verify the topic is in the user's syllabus and record the change in one write
+    result = await set_override(current_user_id, ObjectId(topic_id), update_dict)
     
-    if not topic:
+    if not result:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Topic not found"
         )
     
-    update_dict = {}
-    if update_data.status:
-        update_dict["status"] = update_data.status
-    if update_data.highYield is not None:
-        update_dict["highYield"] = update_data.highYield
-    
-    update_dict["updatedAt"] = datetime.utcnow()
-    
-    await collection.update_one(
-        {"_id": ObjectId(topic_id)},
-        {"$set": update_dict}
-    )
+    topic, updated_topic = result
     
     # Award XP for topic completion
-    if update_data.status == "mastered" and topic["status"] != "mastered":
-        xp_reward = 25 if update_data.highYield else 15
-        
+    xp_reward = mastery_xp(topic, update_dict)
+    if xp_reward:
         # Add XP to user
-        user = await users_collection.find_one({"_id": ObjectId(current_user_id)})
-        new_total_xp = user.get("totalXP", 0) + xp_reward
-        
-        await users_collection.update_one(
-            {"_id": ObjectId(current_user_id)},
-            {"$set": {"totalXP": new_total_xp}}
-        )
+        totals = await award_xp(current_user_id, xp_reward, TOPIC_MASTERED, ref_id=topic["_id"])
+        if not totals:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
         
         return {
             "message": "Topic updated successfully",
             "xpAwarded": xp_reward,
-            "newTotalXP": new_total_xp
+            "newTotalXP": totals["totalXP"]
         }
     
     return {"message": "Topic updated successfully"}
 
-@router.get("/progress/overall", response_model=OverallProgress)
-async def get_overall_progress(current_user_id: str = Depends(get_current_user_id)):
-    """Get overall syllabus progress."""
-    collection = get_collection("syllabus")
+@router.put("/topics/bulk")
+@invalidates(SYLLABUS)
+async def update_topic_statuses(
+    bulk_data: SyllabusBulkUpdate,
+    current_user_id: ObjectId = Depends(get_current_user_id)
+):
+    """Update many topics at once, e.g. to mark a whole chapter.
+
+    The user's overrides are read with one $in query and written with one
+    bulk_write, and the XP for every newly mastered topic is awarded together.
+    Later updates of the same topic win.
+    """
+    now = datetime.utcnow()
+    changes = {}
+    for update_data in bulk_data.updates:
+        changes.setdefault(update_data.topicId, {}).update(topic_update_fields(update_data), updatedAt=now)
+    
+    updated, not_found = await set_overrides(current_user_id, changes)
+    
+    response = {
+        "message": "Topics updated successfully",
+        "updated": len(updated),
+        "notFound": [str(topic) for topic in not_found]
+    }
     
-    # Get all topics for user
-    cursor = collection.find({"userId": ObjectId(current_user_id)})
-    all_topics = await cursor.to_list(length=None)
+    xp_reward = sum(mastery_xp(topic, changes[topic["_id"]]) for topic, _ in updated)
+    if xp_reward:
+        totals = await award_xp(current_user_id, xp_reward, TOPIC_MASTERED)
+        if not totals:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        response["xpAwarded"] = xp_reward
+        response["newTotalXP"] = totals["totalXP"]
     
-    total_topics = len(all_topics)
-    completed_topics = sum(1 for topic in all_topics if topic["status"] == "mastered")
+    return response
+
+@router.get("/progress/overall", response_model=OverallProgress)
+@cached(SYLLABUS)
+async def get_overall_progress(current_user_id: ObjectId = Depends(get_current_user_id)):
+    """Get overall syllabus progress."""
+    rollup = syllabus_summary(await user_topics(current_user_id))
     
-    # Calculate subject-wise progress
-    subject_progress = {}
-    for topic in all_topics:
-        subject = topic["subject"]
-        if subject not in subject_progress:
-            subject_progress[subject] = {
-                "total": 0,
-                "completed": 0,
-                "inProgress": 0,
-                "mastered": 0,
-                "weak": 0,
-                "highYield": 0
-            }
-        
-        subject_progress[subject]["total"] += 1
-        
-        if topic["status"] == "mastered":
-            subject_progress[subject]["completed"] += 1
-            subject_progress[subject]["mastered"] += 1
-        elif topic["status"] == "in-progress":
-            subject_progress[subject]["inProgress"] += 1
-        elif topic["status"] == "weak":
-            subject_progress[subject]["weak"] += 1
-        
-        if topic.get("highYield", False):
-            subject_progress[subject]["highYield"] += 1
+    total_topics = rollup.get("total", 0)
+    completed_topics = rollup.get("byStatus", {}).get("mastered", 0)
     
+    # Subject-wise progress
     subject_progress_list = []
-    for subject, stats in subject_progress.items():
-        progress_percentage = (stats["completed"] / stats["total"]) * 100 if stats["total"] > 0 else 0
+    for subject, stats in counter_map(rollup, "bySubject").items():
+        mastered = stats.get("mastered", 0)
+        progress_percentage = (mastered / stats["total"]) * 100
         
         subject_progress_list.append(SyllabusProgress(
             subject=subject,
             totalTopics=stats["total"],
-            completedTopics=stats["completed"],
-            inProgressTopics=stats["inProgress"],
-            masteredTopics=stats["mastered"],
-            weakTopics=stats["weak"],
-            highYieldTopics=stats["highYield"],
+            completedTopics=mastered,
+            inProgressTopics=stats.get("inProgress", 0),
+            masteredTopics=mastered,
+            weakTopics=stats.get("weak", 0),
+            highYieldTopics=stats.get("highYield", 0),
             progressPercentage=round(progress_percentage, 1)
         ))
     
@@ -199,16 +222,10 @@ async def get_overall_progress(current_user_id: str = Depends(get_current_user_i
 @router.get("/progress/subject/{subject}")
 async def get_subject_progress(
     subject: str,
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Get progress for specific subject."""
-    collection = get_collection("syllabus")
-    
-    cursor = collection.find({
-        "userId": ObjectId(current_user_id),
-        "subject": subject
-    })
-    topics = await cursor.to_list(length=None)
+    topics = await user_topics(current_user_id, subject=subject)
     
     if not topics:
         raise HTTPException(
@@ -220,7 +237,7 @@ async def get_subject_progress(
     completed = sum(1 for topic in topics if topic["status"] == "mastered")
     in_progress = sum(1 for topic in topics if topic["status"] == "in-progress")
     weak = sum(1 for topic in topics if topic["status"] == "weak")
-    high_yield = sum(1 for topic in topics if topic.get("highYield", False))
+    high_yield = sum(1 for topic in topics if topic["highYield"])
     
     progress_percentage = (completed / total) * 100 if total > 0 else 0
     
@@ -232,54 +249,4 @@ async def get_subject_progress(
         "weakTopics": weak,
         "highYieldTopics": high_yield,
         "progressPercentage": round(progress_percentage, 1)
-    }
-
-@router.get("/search")
-async def search_syllabus(
-    query: str,
-    subject: str = None,
-    status: str = None,
-    high_yield: bool = None,
-    current_user_id: str = Depends(get_current_user_id)
-):
-    """Search syllabus topics."""
-    collection = get_collection("syllabus")
-    
-    # Build search filters
-    filters = {"userId": ObjectId(current_user_id)}
-    
-    if subject:
-        filters["subject"] = subject
-    
-    if status:
-        filters["status"] = status
-    
-    if high_yield is not None:
-        filters["highYield"] = high_yield
-    
-    # Text search in topic and subtopics
-    cursor = collection.find(filters)
-    topics = await cursor.to_list(length=None)
-    
-    # Filter by query string
-    filtered_topics = []
-    for topic in topics:
-        if (query.lower() in topic["topic"].lower() or 
-            any(query.lower() in subtopic.lower() for subtopic in topic.get("subtopics", []))):
-            
-            filtered_topics.append({
-                "id": str(topic["_id"]),
-                "type": topic["type"],
-                "subject": topic["subject"],
-                "topic": topic["topic"],
-                "subtopics": topic["subtopics"],
-                "status": topic["status"],
-                "highYield": topic["highYield"],
-                "updatedAt": topic["updatedAt"].isoformat()
-            })
-    
-    return {
-        "query": query,
-        "totalResults": len(filtered_topics),
-        "results": filtered_topics
     }
\ No newline at end of file
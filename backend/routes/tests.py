@@ -2,60 +2,51 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from bson import ObjectId
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta
-from models.test import TestResult, TestResultCreate, TestAnalytics, SubjectScore
+from models.test import TestResult, TestResultPage, TestResultCreate, TestAnalytics, SubjectScore
 from auth import get_current_user_id
-from database import get_collection
+from response_cache import cached, invalidates, TESTS
+from repositories import test_repository, TestResultRecord
+from xp import award_xp, TEST_RECORDED
+from pagination import MAX_PAGE_SIZE
+from streaming import stream, fold
+from fastjson import fast_json_enabled, fast_page
+from fieldsets import parse_fields, page_response, record_response, FIELDS_DESCRIPTION
 
 router = APIRouter(prefix="/tests", tags=["tests"])
 
-@router.get("/", response_model=List[TestResult])
+WEAK_TOPICS_PROJECTION = {"_id": 0, "weakTopics": 1, "date": 1, "type": 1}
+
+@router.get("/", response_model=TestResultPage)
 async def get_user_tests(
     test_type: Optional[str] = Query(None, description="Filter by test type (mains/advanced)"),
-    limit: int = Query(10, description="Number of tests to return"),
-    current_user_id: str = Depends(get_current_user_id)
+    cursor: Optional[str] = Query(None, description="nextCursor from the previous page"),
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE, description="Number of tests to return"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
-    """Get user's test history."""
-    collection = get_collection("tests")
-    
-    filters = {"userId": ObjectId(current_user_id)}
+    """Get user's test history, most recent first, one page at a time."""
+    filters = {"userId": current_user_id}
     if test_type:
         filters["type"] = test_type
     
-    cursor = collection.find(filters).sort("date", -1).limit(limit)
-    tests = await cursor.to_list(length=None)
-    
-    result = []
-    for test in tests:
-        result.append(TestResult(
-            id=str(test["_id"]),
-            userId=str(test["userId"]),
-            type=test["type"],
-            date=test["date"],
-            score=test["score"],
-            totalMarks=test["totalMarks"],
-            accuracy=test["accuracy"],
-            timeSpent=test["timeSpent"],
-            subjects=test["subjects"],
-            weakTopics=test.get("weakTopics", []),
-            createdAt=test["createdAt"]
-        ))
-    
-    return result
+    selected = parse_fields(TestResult, fields)
+    tests, next_cursor = await test_repository.page(filters, [("date", -1)], limit, cursor, selected)
+    if fast_json_enabled():
+        return fast_page(TestResultPage, "items", TestResult, tests, selected, nextCursor=next_cursor)
+    return page_response(TestResultPage, "items", TestResult, selected, tests, nextCursor=next_cursor)
 
 @router.post("/", response_model=TestResult)
+@invalidates(TESTS)
 async def create_test_result(
     test_data: TestResultCreate,
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Record a new test result."""
-    collection = get_collection("tests")
-    users_collection = get_collection("users")
-    
     # Calculate accuracy
     accuracy = (test_data.score / test_data.totalMarks) * 100
     
     test_result = TestResult(
-        userId=ObjectId(current_user_id),
+        userId=current_user_id,
         type=test_data.type,
         score=test_data.score,
         totalMarks=test_data.totalMarks,
@@ -65,7 +56,7 @@ async def create_test_result(
         weakTopics=test_data.weakTopics
     )
     
-    result = await collection.insert_one(test_result.dict(by_alias=True))
+    test_doc = await test_repository.insert(test_result)
     
     # Award XP based on performance
     xp_reward = 0
@@ -82,30 +73,19 @@ async def create_test_result(
     xp_reward += 25
     
     # Update user XP
-    user = await users_collection.find_one({"_id": ObjectId(current_user_id)})
-    new_total_xp = user.get("totalXP", 0) + xp_reward
-    
-    await users_collection.update_one(
-        {"_id": ObjectId(current_user_id)},
-        {"$set": {"totalXP": new_total_xp}}
-    )
+    await award_xp(current_user_id, xp_reward, TEST_RECORDED, ref_id=test_doc["_id"])
     
-    # Return the created test
-    test_result.id = str(result.inserted_id)
     return test_result
 
 @router.get("/{test_id}", response_model=TestResult)
 async def get_test_details(
     test_id: str,
-    current_user_id: str = Depends(get_current_user_id)
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Get specific test details."""
-    collection = get_collection("tests")
-    
-    test = await collection.find_one({
-        "_id": ObjectId(test_id),
-        "userId": ObjectId(current_user_id)
-    })
+    selected = parse_fields(TestResult, fields)
+    test = await test_repository.get(ObjectId(test_id), current_user_id, selected)
     
     if not test:
         raise HTTPException(
@@ -113,36 +93,70 @@ async def get_test_details(
             detail="Test not found"
         )
     
-    return TestResult(
-        id=str(test["_id"]),
-        userId=str(test["userId"]),
-        type=test["type"],
-        date=test["date"],
-        score=test["score"],
-        totalMarks=test["totalMarks"],
-        accuracy=test["accuracy"],
-        timeSpent=test["timeSpent"],
-        subjects=test["subjects"],
-        weakTopics=test.get("weakTopics", []),
-        createdAt=test["createdAt"]
-    )
+    return record_response(test, selected)
 
 @router.get("/analytics/performance", response_model=TestAnalytics)
+@cached(TESTS)
 async def get_test_analytics(
     test_type: Optional[str] = Query(None, description="Filter by test type"),
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Get performance analytics."""
-    collection = get_collection("tests")
+    collection = test_repository.collection
     
-    filters = {"userId": ObjectId(current_user_id)}
+    filters = {"userId": current_user_id}
     if test_type:
         filters["type"] = test_type
     
-    cursor = collection.find(filters).sort("date", -1)
-    tests = await cursor.to_list(length=None)
+    # Percentage score of one test, computed the same way as in Python: (score / totalMarks) * 100
+    score_pct = {"$multiply": [{"$divide": ["$score", "$totalMarks"]}, 100]}
+    subjects = ["physics", "chemistry", "mathematics"]
     
-    if not tests:
+    cursor = collection.aggregate([
+        {"$match": filters},
+        {"$sort": {"date": -1}},
+        {"$facet": {
+            "summary": [{"$group": {
+                "_id": None,
+                "count": {"$sum": 1},
+                "scoreSum": {"$sum": score_pct},
+                "bestScore": {"$max": score_pct},
+                "timeSum": {"$sum": "$timeSpent"}
+            }}],
+            "recent": [{"$limit": 5}],
+            "weakTopics": [
+                {"$unwind": {"path": "$weakTopics", "includeArrayIndex": "position"}},
+                {"$group": {
+                    "_id": "$weakTopics",
+                    "count": {"$sum": 1},
+                    "firstDate": {"$first": "$date"},
+                    "firstPosition": {"$first": "$position"}
+                }},
+                # Most frequent first, ties in the order the topics were first seen
+                {"$sort": {"count": -1, "firstDate": -1, "firstPosition": 1}},
+                {"$project": {"_id": 0, "topic": "$_id", "count": 1}}
+            ],
+            "subjects": [{"$group": {
+                "_id": None,
+                **{
+                    f"{subject}{name}": accumulator
+                    for subject in subjects
+                    for name, accumulator in (
+                        ("Sum", {"$sum": f"$subjects.{subject}.accuracy"}),
+                        ("Best", {"$max": f"$subjects.{subject}.accuracy"}),
+                        ("Count", {"$sum": {"$cond": [{"$isNumber": f"$subjects.{subject}.accuracy"}, 1, 0]}})
+                    )
+                }
+            }}],
+            "trend": [
+                {"$limit": 4},
+                {"$project": {"_id": 0, "score": score_pct, "accuracy": 1}}
+            ]
+        }}
+    ])
+    facets = (await cursor.to_list(length=1))[0]
+    
+    if not facets["summary"]:
         return TestAnalytics(
             averageScore=0,
             totalTests=0,
@@ -155,66 +169,42 @@ async def get_test_analytics(
         )
     
     # Calculate statistics
-    total_tests = len(tests)
-    total_score = sum((test["score"] / test["totalMarks"]) * 100 for test in tests)
-    average_score = round(total_score / total_tests, 2)
-    best_score = max((test["score"] / test["totalMarks"]) * 100 for test in tests)
-    average_time = sum(test["timeSpent"] for test in tests) // total_tests
+    summary = facets["summary"][0]
+    total_tests = summary["count"]
+    average_score = round(summary["scoreSum"] / total_tests, 2)
+    best_score = summary["bestScore"]
+    average_time = summary["timeSum"] // total_tests
     
     # Recent tests (last 5)
-    recent_tests = []
-    for test in tests[:5]:
-        recent_tests.append(TestResult(
-            id=str(test["_id"]),
-            userId=str(test["userId"]),
-            type=test["type"],
-            date=test["date"],
-            score=test["score"],
-            totalMarks=test["totalMarks"],
-            accuracy=test["accuracy"],
-            timeSpent=test["timeSpent"],
-            subjects=test["subjects"],
-            weakTopics=test.get("weakTopics", []),
-            createdAt=test["createdAt"]
-        ))
+    recent_tests = [TestResultRecord.from_document(test).to_api() for test in facets["recent"]]
     
-    # Weak topics analysis
-    weak_topics_count = {}
-    for test in tests:
-        for topic in test.get("weakTopics", []):
-            weak_topics_count[topic] = weak_topics_count.get(topic, 0) + 1
-    
-    weak_topics = [{"topic": topic, "count": count} 
-                   for topic, count in sorted(weak_topics_count.items(), 
-                                            key=lambda x: x[1], reverse=True)]
+    weak_topics = facets["weakTopics"]
     
     # Subject performance
     subject_performance = {}
-    subjects = ["physics", "chemistry", "mathematics"]
+    subject_totals = facets["subjects"][0]
     
     for subject in subjects:
-        subject_scores = []
-        for test in tests:
-            if subject in test.get("subjects", {}):
-                subject_scores.append(test["subjects"][subject]["accuracy"])
-        
-        if subject_scores:
+        count = subject_totals[f"{subject}Count"]
+        if count:
             subject_performance[subject] = {
-                "average": round(sum(subject_scores) / len(subject_scores), 2),
-                "best": max(subject_scores),
-                "count": len(subject_scores)
+                "average": round(subject_totals[f"{subject}Sum"] / count, 2),
+                "best": subject_totals[f"{subject}Best"],
+                "count": count
             }
     
-    # Trend calculation (last 2 tests vs previous)
+    # Trend calculation (last 2 tests vs previous); flat until there is an earlier test to compare with
     trend = {"score": 0, "accuracy": 0}
-    if len(tests) >= 2:
-        recent_avg_score = sum((test["score"] / test["totalMarks"]) * 100 for test in tests[:2]) / 2
-        previous_avg_score = sum((test["score"] / test["totalMarks"]) * 100 for test in tests[2:4]) / min(2, len(tests[2:]))
+    latest = facets["trend"]
+    if total_tests > 2:
+        previous = latest[2:4]
+        recent_avg_score = sum(test["score"] for test in latest[:2]) / 2
+        previous_avg_score = sum(test["score"] for test in previous) / len(previous)
         
         trend["score"] = round(recent_avg_score - previous_avg_score, 2)
         
-        recent_avg_accuracy = sum(test["accuracy"] for test in tests[:2]) / 2
-        previous_avg_accuracy = sum(test["accuracy"] for test in tests[2:4]) / min(2, len(tests[2:]))
+        recent_avg_accuracy = sum(test["accuracy"] for test in latest[:2]) / 2
+        previous_avg_accuracy = sum(test["accuracy"] for test in previous) / len(previous)
         
         trend["accuracy"] = round(recent_avg_accuracy - previous_avg_accuracy, 2)
     
@@ -232,21 +222,14 @@ async def get_test_analytics(
 @router.get("/analytics/weak-topics")
 async def get_weak_topics_analysis(
     test_type: Optional[str] = Query(None),
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Get detailed weak topics analysis."""
-    collection = get_collection("tests")
-    
-    filters = {"userId": ObjectId(current_user_id)}
+    filters = {"userId": current_user_id}
     if test_type:
         filters["type"] = test_type
     
-    cursor = collection.find(filters)
-    tests = await cursor.to_list(length=None)
-    
-    weak_topics_analysis = {}
-    
-    for test in tests:
+    def count_topics(weak_topics_analysis, test):
         for topic in test.get("weakTopics", []):
             if topic not in weak_topics_analysis:
                 weak_topics_analysis[topic] = {
@@ -261,6 +244,11 @@ async def get_weak_topics_analysis(
             # Update last seen if this test is more recent
             if test["date"] > weak_topics_analysis[topic]["lastSeen"]:
                 weak_topics_analysis[topic]["lastSeen"] = test["date"]
+        return weak_topics_analysis
+    
+    # Only per-topic totals are kept; the tests themselves are streamed past
+    cursor = stream(test_repository.collection, filters, WEAK_TOPICS_PROJECTION)
+    weak_topics_analysis = await fold(cursor, count_topics, {})
     
     # Convert to list and sort by appearances
     result = []
@@ -1,86 +1,160 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from bson import ObjectId
-from typing import List, Optional
+from collections import defaultdict
+from pymongo import DeleteOne, InsertOne, UpdateOne
+from typing import List, Optional, Tuple
 from datetime import datetime, date
-from models.timetable import TimetableEntry, TimetableEntryCreate, TimetableEntryUpdate, WeeklyProgress
+from models.timetable import (
+    TimetableEntry, TimetablePage, TimetableEntryCreate, TimetableEntryUpdate, TimetableWeek, TimetableWeekResult, WeeklyProgress
+)
 from auth import get_current_user_id
-from database import get_collection
+from repositories import timetable_repository, TimetableEntryRecord
+from xp import award_xp, TASK_COMPLETED
+from rollups import get_rollup, record_change, record_changes, timetable_counters, counter_map
+from database import run_in_transaction
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from fastjson import fast_json_enabled, fast_page, dump_rows, FastJSONResponse
+from fieldsets import parse_fields, page_response, list_response, FIELDS_DESCRIPTION
 
 router = APIRouter(prefix="/timetable", tags=["timetable"])
 
-@router.get("/", response_model=List[TimetableEntry])
+def plan_week(stored: List[dict], wanted: List[dict]) -> Tuple[list, list]:
+    """Diff a user's stored entries against the week they want.
+
+    Returns the bulk_write requests and the (before, after) pair of each change,
+    with unchanged entries as (entry, entry). A stored entry with the same day,
+    time, subject and topic as a wanted one is kept as is, completion included. One
+    whose slot (day and time) is still wanted with a new subject or topic is
+    updated and starts uncompleted. The other stored entries are deleted and the
+    other wanted ones inserted.
+    """
+    def content(entry):
+        return entry["day"], entry["time"], entry["subject"], entry["topic"]
+    
+    by_content = defaultdict(list)
+    for entry in stored:
+        by_content[content(entry)].append(entry)
+    
+    changes, pending = [], []
+    for entry in wanted:
+        matches = by_content.get(content(entry))
+        if matches:
+            kept = matches.pop(0)
+            changes.append((kept, kept))
+        else:
+            pending.append(entry)
+    
+    by_slot = defaultdict(list)
+    for entries in by_content.values():
+        for entry in entries:
+            by_slot[entry["day"], entry["time"]].append(entry)
+    
+    requests = []
+    for entry in pending:
+        matches = by_slot.get((entry["day"], entry["time"]))
+        if matches:
+            before = matches.pop(0)
+            fields = {"subject": entry["subject"], "topic": entry["topic"], "completed": False}
+            requests.append(UpdateOne({"_id": before["_id"], "userId": before["userId"]}, {"$set": fields}))
+            changes.append((before, {**before, **fields}))
+        else:
+            requests.append(InsertOne(entry))
+            changes.append((None, entry))
+    
+    for entries in by_slot.values():
+        for before in entries:
+            requests.append(DeleteOne({"_id": before["_id"], "userId": before["userId"]}))
+            changes.append((before, None))
+    
+    return requests, changes
+
+@router.get("/", response_model=TimetablePage)
 async def get_user_timetable(
     day: Optional[str] = Query(None, description="Filter by day of week"),
-    current_user_id: str = Depends(get_current_user_id)
+    cursor: Optional[str] = Query(None, description="nextCursor from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
-    """Get user's timetable."""
-    collection = get_collection("timetable")
-    
-    filters = {"userId": ObjectId(current_user_id)}
+    """Get user's timetable ordered by day and time, one page at a time."""
+    filters = {"userId": current_user_id}
     if day:
         filters["day"] = day.lower()
     
-    cursor = collection.find(filters).sort("day", 1).sort("time", 1)
-    entries = await cursor.to_list(length=None)
-    
-    result = []
-    for entry in entries:
-        result.append(TimetableEntry(
-            id=str(entry["_id"]),
-            userId=str(entry["userId"]),
-            day=entry["day"],
-            time=entry["time"],
-            subject=entry["subject"],
-            topic=entry["topic"],
-            completed=entry.get("completed", False),
-            createdAt=entry["createdAt"]
-        ))
-    
-    return result
+    selected = parse_fields(TimetableEntry, fields)
+    entries, next_cursor = await timetable_repository.page(filters, [("day", 1), ("time", 1)], limit, cursor, selected)
+    if fast_json_enabled():
+        return fast_page(TimetablePage, "items", TimetableEntry, entries, selected, nextCursor=next_cursor)
+    return page_response(TimetablePage, "items", TimetableEntry, selected, entries, nextCursor=next_cursor)
 
 @router.post("/", response_model=TimetableEntry)
 async def create_timetable_entry(
     entry_data: TimetableEntryCreate,
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Create new timetable entry."""
-    collection = get_collection("timetable")
-    
     entry = TimetableEntry(
-        userId=ObjectId(current_user_id),
+        userId=current_user_id,
         day=entry_data.day.lower(),
         time=entry_data.time,
         subject=entry_data.subject,
         topic=entry_data.topic
     )
     
-    result = await collection.insert_one(entry.dict(by_alias=True))
-    entry.id = str(result.inserted_id)
+    entry_doc = await timetable_repository.insert(entry)
+    await record_change(current_user_id, timetable_counters, after=entry_doc)
     
     return entry
 
+@router.put("/week", response_model=TimetableWeekResult)
+async def replace_week(
+    week: TimetableWeek,
+    current_user_id: ObjectId = Depends(get_current_user_id)
+):
+    """Replace the user's whole timetable with a week plan (see plan_week).
+
+    The stored entries are read and the inserts, updates and deletes applied with
+    one ordered bulk_write, inside a transaction where the server supports them, so
+    other readers see either the old week or the new one.
+    """
+    collection = timetable_repository.collection
+    wanted = [
+        TimetableEntry(
+            userId=current_user_id,
+            day=entry_data.day.lower(),
+            time=entry_data.time,
+            subject=entry_data.subject,
+            topic=entry_data.topic
+        ).model_dump(by_alias=True)
+        for entry_data in week.entries
+    ]
+    
+    async def replace(session):
+        stored = [entry async for entry in collection.find({"userId": current_user_id}, session=session)]
+        requests, changes = plan_week(stored, wanted)
+        if requests:
+            await collection.bulk_write(requests, ordered=True, session=session)
+        return changes
+    
+    changes = await run_in_transaction(replace)
+    await record_changes(current_user_id, timetable_counters, (change for change in changes if change[0] is not change[1]))
+    
+    items = sorted((after for _, after in changes if after is not None), key=lambda entry: (entry["day"], entry["time"], entry["_id"]))
+    return {
+        "inserted": sum(1 for before, _ in changes if before is None),
+        "updated": sum(1 for before, after in changes if before is not None and after is not None and before is not after),
+        "deleted": sum(1 for _, after in changes if after is None),
+        "unchanged": sum(1 for before, after in changes if before is after),
+        "items": [TimetableEntryRecord.from_document(entry).to_api() for entry in items]
+    }
+
 @router.put("/{entry_id}", response_model=TimetableEntry)
 async def update_timetable_entry(
     entry_id: str,
     update_data: TimetableEntryUpdate,
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Update timetable entry."""
-    collection = get_collection("timetable")
-    users_collection = get_collection("users")
-    
-    # Verify entry belongs to user
-    entry = await collection.find_one({
-        "_id": ObjectId(entry_id),
-        "userId": ObjectId(current_user_id)
-    })
-    
-    if not entry:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Timetable entry not found"
-        )
-    
     update_dict = {}
     if update_data.day:
         update_dict["day"] = update_data.day.lower()
@@ -93,62 +167,47 @@ async def update_timetable_entry(
     if update_data.completed is not None:
         update_dict["completed"] = update_data.completed
     
-    if update_dict:
-        await collection.update_one(
-            {"_id": ObjectId(entry_id)},
-            {"$set": update_dict}
+    # Verify entry belongs to user and update it in one round trip
+    result = await timetable_repository.update(ObjectId(entry_id), current_user_id, update_dict)
+    
+    if not result:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Timetable entry not found"
         )
-        
-        # Award XP for task completion
-        if update_data.completed and not entry.get("completed", False):
-            user = await users_collection.find_one({"_id": ObjectId(current_user_id)})
-            new_total_xp = user.get("totalXP", 0) + 10  # 10 XP for completing a task
-            
-            await users_collection.update_one(
-                {"_id": ObjectId(current_user_id)},
-                {"$set": {"totalXP": new_total_xp}}
-            )
-    
-    # Return updated entry
-    updated_entry = await collection.find_one({"_id": ObjectId(entry_id)})
-    
-    return TimetableEntry(
-        id=str(updated_entry["_id"]),
-        userId=str(updated_entry["userId"]),
-        day=updated_entry["day"],
-        time=updated_entry["time"],
-        subject=updated_entry["subject"],
-        topic=updated_entry["topic"],
-        completed=updated_entry.get("completed", False),
-        createdAt=updated_entry["createdAt"]
-    )
+    
+    entry, updated_entry = result
+    await record_change(current_user_id, timetable_counters, before=entry, after=updated_entry)
+    
+    # Award XP for task completion
+    if update_data.completed and not entry.get("completed", False):
+        await award_xp(current_user_id, 10, TASK_COMPLETED, ref_id=entry["_id"])
+    
+    return TimetableEntryRecord.from_document(updated_entry).to_api()
 
 @router.delete("/{entry_id}")
 async def delete_timetable_entry(
     entry_id: str,
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Delete timetable entry."""
-    collection = get_collection("timetable")
-    
     # Verify entry belongs to user and delete
-    result = await collection.delete_one({
-        "_id": ObjectId(entry_id),
-        "userId": ObjectId(current_user_id)
-    })
+    entry = await timetable_repository.delete(ObjectId(entry_id), current_user_id)
     
-    if result.deleted_count == 0:
+    if not entry:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Timetable entry not found"
         )
     
+    await record_change(current_user_id, timetable_counters, before=entry)
+    
     return {"message": "Timetable entry deleted successfully"}
 
 @router.put("/{entry_id}/complete")
 async def mark_task_complete(
     entry_id: str,
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Mark task as complete."""
     return await update_timetable_entry(
@@ -158,32 +217,38 @@ async def mark_task_complete(
     )
 
 @router.get("/today")
-async def get_todays_tasks(current_user_id: str = Depends(get_current_user_id)):
+async def get_todays_tasks(current_user_id: ObjectId = Depends(get_current_user_id)):
     """Get today's tasks."""
     today = datetime.now().strftime("%A").lower()
-    return await get_user_timetable(day=today, current_user_id=current_user_id)
+    # A single day's slots are few, so they are returned unpaginated
+    entries = await timetable_repository.find(
+        {"userId": current_user_id, "day": today},
+        sort=[("time", 1), ("_id", 1)]
+    )
+    
+    if fast_json_enabled():
+        return FastJSONResponse(dump_rows(TimetableEntry, entries))
+    
+    return list_response(TimetableEntry, entries)
 
 @router.get("/progress/weekly", response_model=WeeklyProgress)
-async def get_weekly_progress(current_user_id: str = Depends(get_current_user_id)):
+async def get_weekly_progress(current_user_id: ObjectId = Depends(get_current_user_id)):
     """Get weekly progress statistics."""
-    collection = get_collection("timetable")
-    
-    cursor = collection.find({"userId": ObjectId(current_user_id)})
-    entries = await cursor.to_list(length=None)
+    rollup = (await get_rollup(current_user_id)).get("timetable", {})
     
-    total_tasks = len(entries)
-    completed_tasks = sum(1 for entry in entries if entry.get("completed", False))
+    total_tasks = rollup.get("total", 0)
+    completed_tasks = rollup.get("completed", 0)
     
     # Day-wise progress
     days = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+    day_counts = counter_map(rollup, "byDay")
     day_progress = {}
     
     for day in days:
-        day_tasks = [entry for entry in entries if entry["day"] == day]
-        day_completed = sum(1 for entry in day_tasks if entry.get("completed", False))
+        counts = day_counts.get(day)
         
-        if day_tasks:
-            day_progress[day] = round((day_completed / len(day_tasks)) * 100, 1)
+        if counts:
+            day_progress[day] = round((counts.get("completed", 0) / counts["total"]) * 100, 1)
         else:
             day_progress[day] = 0
     
@@ -197,44 +262,33 @@ async def get_weekly_progress(current_user_id: str = Depends(get_current_user_id
     )
 
 @router.get("/stats")
-async def get_timetable_stats(current_user_id: str = Depends(get_current_user_id)):
+async def get_timetable_stats(current_user_id: ObjectId = Depends(get_current_user_id)):
     """Get detailed timetable statistics."""
-    collection = get_collection("timetable")
+    rollup = (await get_rollup(current_user_id)).get("timetable", {})
     
-    cursor = collection.find({"userId": ObjectId(current_user_id)})
-    entries = await cursor.to_list(length=None)
+    total_entries = rollup.get("total", 0)
+    completed_entries = rollup.get("completed", 0)
     
-    # Subject distribution
+    # Subject distribution with completion percentage for each subject
     subject_stats = {}
-    for entry in entries:
-        subject = entry["subject"]
-        if subject not in subject_stats:
-            subject_stats[subject] = {"total": 0, "completed": 0}
-        
-        subject_stats[subject]["total"] += 1
-        if entry.get("completed", False):
-            subject_stats[subject]["completed"] += 1
-    
-    # Add completion percentage for each subject
-    for subject in subject_stats:
-        stats = subject_stats[subject]
-        stats["completionRate"] = round((stats["completed"] / stats["total"]) * 100, 1) if stats["total"] > 0 else 0
+    for subject, counts in counter_map(rollup, "bySubject").items():
+        completed = counts.get("completed", 0)
+        subject_stats[subject] = {
+            "total": counts["total"],
+            "completed": completed,
+            "completionRate": round((completed / counts["total"]) * 100, 1)
+        }
     
     # Time slot analysis
-    time_slots = {}
-    for entry in entries:
-        time = entry["time"]
-        if time not in time_slots:
-            time_slots[time] = {"total": 0, "completed": 0}
-        
-        time_slots[time]["total"] += 1
-        if entry.get("completed", False):
-            time_slots[time]["completed"] += 1
+    time_slots = {
+        time: {"total": counts["total"], "completed": counts.get("completed", 0)}
+        for time, counts in counter_map(rollup, "byTime").items()
+    }
     
     return {
-        "totalEntries": len(entries),
-        "completedEntries": sum(1 for entry in entries if entry.get("completed", False)),
+        "totalEntries": total_entries,
+        "completedEntries": completed_entries,
         "subjectDistribution": subject_stats,
         "timeSlotAnalysis": time_slots,
-        "completionRate": round((sum(1 for entry in entries if entry.get("completed", False)) / len(entries)) * 100, 1) if entries else 0
+        "completionRate": round((completed_entries / total_entries) * 100, 1) if total_entries else 0
     }
\ No newline at end of file
@@ -1,30 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from bson import ObjectId
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 from models.user import UserStats, UserStatsUpdate
 from auth import get_current_user_id, calculate_level
 from database import get_collection
+from loaders import load, forget
+from xp import award_xp, set_xp_total, MANUAL_AWARD
+from syllabus_templates import user_topics, syllabus_summary
+from export import resolve_checkpoint, export_response
 
 router = APIRouter(prefix="/user", tags=["user"])
 
 @router.get("/stats", response_model=UserStats)
-async def get_user_stats(current_user_id: str = Depends(get_current_user_id)):
+async def get_user_stats(current_user_id: ObjectId = Depends(get_current_user_id)):
     """Get user statistics."""
-    users_collection = get_collection("users")
-    syllabus_collection = get_collection("syllabus")
-    
     # Get user data
-    user = await users_collection.find_one({"_id": ObjectId(current_user_id)})
+    user = await load("users", current_user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
-    # Calculate syllabus progress
-    total_topics = await syllabus_collection.count_documents({"userId": ObjectId(current_user_id)})
-    completed_topics = await syllabus_collection.count_documents({
-        "userId": ObjectId(current_user_id),
-        "status": "mastered"
-    })
+    # Syllabus progress from the template merged with the user's overrides
+    syllabus = syllabus_summary(await user_topics(current_user_id))
+    total_topics = syllabus.get("total", 0)
+    completed_topics = syllabus.get("byStatus", {}).get("mastered", 0)
     
     # Get badges information
     badges = []
@@ -49,21 +48,22 @@ async def get_user_stats(current_user_id: str = Depends(get_current_user_id)):
 @router.put("/stats")
 async def update_user_stats(
     stats_update: UserStatsUpdate,
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Update user statistics."""
     users_collection = get_collection("users")
     
     update_data = {}
     if stats_update.totalXP is not None:
-        update_data["totalXP"] = stats_update.totalXP
-        update_data["level"] = calculate_level(stats_update.totalXP)
+        # Absolute XP overwrites go through the ledger as an adjustment
+        await set_xp_total(current_user_id, stats_update.totalXP)
+        update_data["lastActiveDate"] = datetime.utcnow()
     
     if stats_update.currentStreak is not None:
         update_data["currentStreak"] = stats_update.currentStreak
         
         # Update longest streak if current exceeds it
-        user = await users_collection.find_one({"_id": ObjectId(current_user_id)})
+        user = await load("users", current_user_id)
         if user and stats_update.currentStreak > user.get("longestStreak", 0):
             update_data["longestStreak"] = stats_update.currentStreak
     
@@ -73,9 +73,10 @@ async def update_user_stats(
     if update_data:
         update_data["lastActiveDate"] = datetime.utcnow()
         await users_collection.update_one(
-            {"_id": ObjectId(current_user_id)},
+            {"_id": current_user_id},
             {"$set": update_data}
         )
+        forget("users", current_user_id)
     
     return {"message": "Stats updated successfully"}
 
@@ -83,29 +84,21 @@ async def update_user_stats(
 async def add_xp(
     xp_amount: int,
     reason: str = "Study activity",
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Add XP to user."""
-    users_collection = get_collection("users")
-    
-    user = await users_collection.find_one({"_id": ObjectId(current_user_id)})
-    if not user:
+    totals = await award_xp(
+        current_user_id,
+        xp_amount,
+        MANUAL_AWARD,
+        set_fields={"lastActiveDate": datetime.utcnow()}
+    )
+    if not totals:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
-    new_total_xp = user.get("totalXP", 0) + xp_amount
-    new_level = calculate_level(new_total_xp)
-    old_level = calculate_level(user.get("totalXP", 0))
-    
-    update_data = {
-        "totalXP": new_total_xp,
-        "level": new_level,
-        "lastActiveDate": datetime.utcnow()
-    }
-    
-    await users_collection.update_one(
-        {"_id": ObjectId(current_user_id)},
-        {"$set": update_data}
-    )
+    new_total_xp = totals["totalXP"]
+    new_level = totals["level"]
+    old_level = calculate_level(new_total_xp - xp_amount)
     
     # Check if user leveled up
     leveled_up = new_level > old_level
@@ -121,34 +114,31 @@ async def add_xp(
 @router.post("/badges/{badge_name}")
 async def award_badge(
     badge_name: str,
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: ObjectId = Depends(get_current_user_id)
 ):
     """Award a badge to user."""
     users_collection = get_collection("users")
     
-    user = await users_collection.find_one({"_id": ObjectId(current_user_id)})
+    user = await load("users", current_user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
     current_badges = user.get("badges", [])
     if badge_name not in current_badges:
-        current_badges.append(badge_name)
-        
         await users_collection.update_one(
-            {"_id": ObjectId(current_user_id)},
-            {"$set": {"badges": current_badges}}
+            {"_id": current_user_id},
+            {"$set": {"badges": [*current_badges, badge_name]}}
         )
+        forget("users", current_user_id)
         
         return {"message": f"Badge '{badge_name}' awarded successfully"}
     
     return {"message": f"Badge '{badge_name}' already earned"}
 
 @router.get("/badges")
-async def get_user_badges(current_user_id: str = Depends(get_current_user_id)):
+async def get_user_badges(current_user_id: ObjectId = Depends(get_current_user_id)):
     """Get user's earned badges."""
-    users_collection = get_collection("users")
-    
-    user = await users_collection.find_one({"_id": ObjectId(current_user_id)})
+    user = await load("users", current_user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
@@ -156,11 +146,9 @@ async def get_user_badges(current_user_id: str = Depends(get_current_user_id)):
     return {"badges": badges}
 
 @router.get("/level")
-async def get_user_level(current_user_id: str = Depends(get_current_user_id)):
+async def get_user_level(current_user_id: ObjectId = Depends(get_current_user_id)):
     """Get user level information."""
-    users_collection = get_collection("users")
-    
-    user = await users_collection.find_one({"_id": ObjectId(current_user_id)})
+    user = await load("users", current_user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
@@ -179,4 +167,16 @@ async def get_user_level(current_user_id: str = Depends(get_current_user_id)):
         "xpProgressInLevel": xp_progress_in_level,
         "xpNeededForNext": xp_needed_for_next,
         "progressPercentage": round((xp_progress_in_level / (xp_for_next_level - xp_for_current_level)) * 100, 1)
-    }
\ No newline at end of file
+    }
+
+@router.get("/export")
+async def export_user_data(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$", description="ndjson or csv"),
+    gzip: bool = Query(False, description="Compress the download with gzip"),
+    after: Optional[str] = Query(None, description="Resume after this <collection>:<_id>, the last row received"),
+    current_user_id: ObjectId = Depends(get_current_user_id)
+):
+    """Download every test, flashcard, goal, timetable entry, syllabus topic and calendar event."""
+    # Resolved before streaming starts, so a bad checkpoint is still a plain 400
+    start = await resolve_checkpoint(current_user_id, after)
+    return export_response(current_user_id, export_format, gzip, start)
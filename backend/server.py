@@ -1,16 +1,28 @@
-from fastapi import FastAPI, APIRouter
+from fastapi import FastAPI, APIRouter, Depends
+from fastapi.responses import JSONResponse
+from pymongo.errors import PyMongoError
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+import asyncio
 import os
 import logging
 from pathlib import Path
-from database import connect_to_mongo, close_mongo_connection, MOTIVATIONAL_QUOTES
-from routes import auth, user, syllabus, tests, timetable, flashcards, goals
+from database import connect_to_mongo, close_mongo_connection, ensure_indexes, ping_database, pool_metrics, MOTIVATIONAL_QUOTES
+from password_hashing import password_hasher
+from auth import token_cache, require_metrics_access
+from revocation import revocation_list
+from syllabus_templates import migrate_pending_syllabus
+from loaders import loader_stats, LoaderScopeMiddleware
+from response_cache import response_cache
+from routes import auth, user, syllabus, tests, timetable, flashcards, goals, batch
 import random
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Health checkers give up after a few seconds; answer 503 before they do
+HEALTH_CHECK_TIMEOUT_SECONDS = float(os.getenv("HEALTH_CHECK_TIMEOUT_SECONDS", "2"))
+
 # Create the main app
 app = FastAPI(title="JEE Tracker API", description="Backend API for JEE preparation tracking", version="1.0.0")
 
@@ -24,7 +36,36 @@ async def root():
 
 @api_router.get("/health")
 async def health_check():
-    return {"status": "healthy", "message": "JEE Tracker API is operational"}
+    try:
+        latency_ms = await asyncio.wait_for(ping_database(), HEALTH_CHECK_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "unhealthy", "message": f"Database did not answer within {HEALTH_CHECK_TIMEOUT_SECONDS:g}s"}
+        )
+    except PyMongoError as e:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "unhealthy", "message": f"Database unreachable: {type(e).__name__}"}
+        )
+    
+    return {
+        "status": "healthy",
+        "message": "JEE Tracker API is operational",
+        "database": {"latencyMs": latency_ms, "pool": pool_metrics.snapshot()}
+    }
+
+@api_router.get("/metrics", dependencies=[Depends(require_metrics_access)])
+async def get_metrics():
+    """Get runtime telemetry for the API process."""
+    return {
+        "mongoPool": pool_metrics.snapshot(),
+        "passwordHashing": password_hasher.snapshot(),
+        "authCache": token_cache.snapshot(),
+        "tokenRevocation": revocation_list.snapshot(),
+        "dataLoader": loader_stats.snapshot(),
+        "responseCache": response_cache.snapshot()
+    }
 
 @api_router.get("/quote")
 async def get_daily_quote():
@@ -40,10 +81,14 @@ api_router.include_router(tests.router)
 api_router.include_router(timetable.router)
 api_router.include_router(flashcards.router)
 api_router.include_router(goals.router)
+api_router.include_router(batch.router)
 
 # Include the main API router in the app
 app.include_router(api_router)
 
+# One by-id loader scope per request (see loaders.py)
+app.add_middleware(LoaderScopeMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -65,10 +110,18 @@ logger = logging.getLogger(__name__)
 async def startup_db_client():
     """Initialize database connection on startup."""
     await connect_to_mongo()
+    built = await ensure_indexes()
+    logger.info(f"Index reconciliation built {sum(len(names) for names in built.values())} index(es)")
+    migrated = await migrate_pending_syllabus()
+    if migrated is not None:
+        logger.info(f"Legacy syllabus migration: {migrated['users']} user(s), {migrated['overrides']} override(s), {migrated['unmatched']} unmatched topic(s)")
+    await revocation_list.start()
     logger.info("JEE Tracker API started successfully")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     """Close database connection on shutdown."""
+    await revocation_list.stop()
     await close_mongo_connection()
+    password_hasher.shutdown()
     logger.info("JEE Tracker API shutdown complete")
@@ -0,0 +1,33 @@
+"""Streaming reductions over Mongo cursors.
+
+Handlers that summarize a user's history should not hold the whole history in
+memory. These helpers consume a cursor with `async for`, so at most one batch of
+`batch_size` documents is buffered at a time, and fold each document into a small
+accumulator. Combined with a projection of just the fields the reduction reads,
+memory per request depends on the size of the answer, not of the collection.
+"""
+from typing import Callable, Optional, TypeVar
+
+DEFAULT_BATCH_SIZE = 500
+
+T = TypeVar("T")
+
+def stream(
+    collection,
+    filters: dict,
+    projection: Optional[dict] = None,
+    sort: Optional[list] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE
+):
+    """A cursor over `collection` that fetches `batch_size` documents per round trip."""
+    cursor = collection.find(filters, projection, batch_size=batch_size)
+    if sort:
+        cursor = cursor.sort(sort)
+    return cursor
+
+async def fold(cursor, step: Callable[[T, dict], T], initial: T) -> T:
+    """Reduce a cursor document by document; `step(accumulator, document)` returns the new accumulator."""
+    accumulator = initial
+    async for document in cursor:
+        accumulator = step(accumulator, document)
+    return accumulator
@@ -0,0 +1,243 @@
+"""Copy-on-write syllabus.
+
+The syllabus topics are stored once per template version in `syllabus_templates`.
+A user's documents in `syllabus_overrides` hold only what the user changed on a
+topic (status, highYield), keyed by the template topic's id, and reads merge the
+two in memory. Registering costs no syllabus writes, and an untouched topic costs
+no storage.
+
+Topic ids are derived from (type, subject, topic), so a topic keeps its id, and
+the overrides on it, across template versions. Each user is pinned to the version
+they registered with (`users.syllabusVersion`).
+"""
+import hashlib
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from database import get_collection, get_database, INITIAL_SYLLABUS, SYLLABUS_VERSION
+from rollups import syllabus_counters, expand_paths, ROLLUP_COLLECTION
+from loaders import load
+from streaming import stream
+
+TEMPLATE_COLLECTION = "syllabus_templates"
+OVERRIDE_COLLECTION = "syllabus_overrides"
+# Where full per-user syllabus copies lived before templates; only the migration reads it
+LEGACY_COLLECTION = "syllabus"
+
+DEFAULT_STATUS = "not-started"
+OVERRIDE_PROJECTION = {"_id": 0, "topicId": 1, "status": 1, "highYield": 1, "updatedAt": 1}
+
+# Template version -> its topics; a stored version never changes, so it is cached for the process lifetime
+_templates: Dict[int, List[dict]] = {}
+
+def topic_id(exam_type: str, subject: str, topic: str) -> ObjectId:
+    """The stable id of a template topic."""
+    return ObjectId(hashlib.sha1(f"{exam_type}/{subject}/{topic}".encode()).digest()[:12])
+
+def build_template(syllabus: dict) -> List[dict]:
+    """Flatten a nested {type: {subject: [topic, ...]}} syllabus into template topics."""
+    return [
+        {
+            "_id": topic_id(exam_type, subject, topic_data["topic"]),
+            "type": exam_type,
+            "subject": subject,
+            "topic": topic_data["topic"],
+            "subtopics": topic_data["subtopics"],
+            "highYield": topic_data["highYield"]
+        }
+        for exam_type, subjects in syllabus.items()
+        for subject, topics in subjects.items()
+        for topic_data in topics
+    ]
+
+async def get_template(version: int) -> List[dict]:
+    """The topics of a template version.
+
+    The current version (INITIAL_SYLLABUS) is stored on first use; older versions
+    must already be stored.
+    """
+    if version not in _templates:
+        templates = get_collection(TEMPLATE_COLLECTION)
+        stored = await templates.find_one({"_id": version})
+        if stored is None:
+            if version != SYLLABUS_VERSION:
+                raise LookupError(f"Syllabus template version {version} is not stored")
+            stored = {"topics": build_template(INITIAL_SYLLABUS), "createdAt": datetime.utcnow()}
+            # Concurrent first uses store identical topics, so whichever upsert lands first is kept
+            await templates.update_one({"_id": version}, {"$setOnInsert": stored}, upsert=True)
+        _templates[version] = stored["topics"]
+    return _templates[version]
+
+def merge_topic(topic: dict, override: Optional[dict], user_id: ObjectId, since: datetime) -> dict:
+    """One template topic as the user sees it, shaped like a per-user syllabus document.
+
+    `since` (the user's registration time) stands in for timestamps of untouched topics.
+    """
+    override = override or {}
+    return {
+        "_id": topic["_id"],
+        "userId": user_id,
+        "type": topic["type"],
+        "subject": topic["subject"],
+        "topic": topic["topic"],
+        "subtopics": topic["subtopics"],
+        "status": override.get("status") or DEFAULT_STATUS,
+        "highYield": topic["highYield"] if override.get("highYield") is None else override["highYield"],
+        "updatedAt": override.get("updatedAt", since),
+        "createdAt": since
+    }
+
+async def _user_template(user_id: ObjectId) -> Optional[Tuple[List[dict], datetime]]:
+    user = await load("users", user_id)
+    if user is None:
+        return None
+    return await get_template(user.get("syllabusVersion") or SYLLABUS_VERSION), user["createdAt"]
+
+async def iter_user_topics(user_id: ObjectId, exam_type: Optional[str] = None, subject: Optional[str] = None) -> Iterator[dict]:
+    """The user's merged syllabus in template order, merged one topic at a time as it is consumed.
+
+    The reads happen up front; a caller that stops early (e.g. after `limit` search
+    hits) skips merging the rest of the template.
+    """
+    found = await _user_template(user_id)
+    if found is None:
+        return iter(())
+    template, since = found
+
+    cursor = get_collection(OVERRIDE_COLLECTION).find({"userId": user_id}, OVERRIDE_PROJECTION)
+    overrides = {override["topicId"]: override async for override in cursor}
+
+    return (
+        merge_topic(topic, overrides.get(topic["_id"]), user_id, since)
+        for topic in template
+        if (exam_type is None or topic["type"] == exam_type) and (subject is None or topic["subject"] == subject)
+    )
+
+async def user_topics(user_id: ObjectId, exam_type: Optional[str] = None, subject: Optional[str] = None) -> List[dict]:
+    """The user's merged syllabus in template order, optionally for one exam type and/or subject."""
+    return list(await iter_user_topics(user_id, exam_type, subject))
+
+async def set_override(user_id: ObjectId, topic: ObjectId, fields: dict) -> Optional[Tuple[dict, dict]]:
+    """$set `fields` on the user's override of `topic` in one round trip.
+
+    Returns the merged topic before and after, or None if the user's template has
+    no such topic.
+    """
+    found = await _user_template(user_id)
+    if found is None:
+        return None
+    template, since = found
+    template_topic = next((candidate for candidate in template if candidate["_id"] == topic), None)
+    if template_topic is None:
+        return None
+
+    before = await get_collection(OVERRIDE_COLLECTION).find_one_and_update(
+        {"userId": user_id, "topicId": topic},
+        {"$set": fields},
+        projection=OVERRIDE_PROJECTION,
+        upsert=True,
+        return_document=ReturnDocument.BEFORE
+    )
+    after = {**(before or {}), **fields}
+    return merge_topic(template_topic, before, user_id, since), merge_topic(template_topic, after, user_id, since)
+
+async def set_overrides(user_id: ObjectId, changes: Dict[ObjectId, dict]) -> Tuple[List[Tuple[dict, dict]], List[ObjectId]]:
+    """$set fields on many of the user's overrides with one read and one bulk_write.
+
+    `changes` maps topic ids to the fields to set. Returns the merged topic before
+    and after for each changed topic, and the ids that are not in the user's template.
+    """
+    found = await _user_template(user_id)
+    if found is None:
+        return [], list(changes)
+    template, since = found
+    by_id = {topic["_id"]: topic for topic in template}
+    known = [topic for topic in changes if topic in by_id]
+    unknown = [topic for topic in changes if topic not in by_id]
+    if not known:
+        return [], unknown
+
+    overrides = get_collection(OVERRIDE_COLLECTION)
+    cursor = overrides.find({"userId": user_id, "topicId": {"$in": known}}, OVERRIDE_PROJECTION)
+    before = {override["topicId"]: override async for override in cursor}
+    await overrides.bulk_write([
+        UpdateOne({"userId": user_id, "topicId": topic}, {"$set": changes[topic]}, upsert=True)
+        for topic in known
+    ], ordered=False)
+
+    merged = [
+        (
+            merge_topic(by_id[topic], before.get(topic), user_id, since),
+            merge_topic(by_id[topic], {**before.get(topic, {}), **changes[topic]}, user_id, since)
+        )
+        for topic in known
+    ]
+    return merged, unknown
+
+def syllabus_summary(topics: List[dict]) -> dict:
+    """Counters for merged topics, laid out like a rollup section (total, byStatus, bySubject)."""
+    counters = Counter()
+    for topic in topics:
+        counters.update(syllabus_counters(topic))
+    return expand_paths({path: value for path, value in counters.items() if value}).get("syllabus", {})
+
+async def migrate_pending_syllabus() -> Optional[Counter]:
+    """Run the legacy migration at startup if legacy per-user copies are still stored.
+
+    Until a user is migrated their progress reads as the untouched template (0%),
+    so the server migrates before it serves. Returns None when there is no legacy
+    collection, which costs one listCollections after the migration is done.
+    """
+    db = await get_database()
+    if not await db.list_collection_names(filter={"name": LEGACY_COLLECTION}):
+        return None
+    return await migrate_legacy_syllabus()
+
+async def migrate_legacy_syllabus(drop_legacy: bool = False) -> Counter:
+    """Convert per-user syllabus copies into overrides on the current template.
+
+    Only topics whose status or highYield differ from the template get an override.
+    Users are marked with the template version as they finish, so an interrupted
+    migration can be rerun. Legacy topics that match no template topic are counted
+    as unmatched and left behind, and the legacy collection is only dropped (with
+    `drop_legacy`) when there were none.
+    """
+    template = await get_template(SYLLABUS_VERSION)
+    by_name = {(topic["type"], topic["subject"], topic["topic"]): topic for topic in template}
+    users = get_collection("users")
+    overrides = get_collection(OVERRIDE_COLLECTION)
+    stats = Counter()
+
+    async for user in users.find({"syllabusVersion": {"$exists": False}}, {"_id": 1}):
+        requests = []
+        async for item in stream(get_collection(LEGACY_COLLECTION), {"userId": user["_id"]}):
+            topic = by_name.get((item["type"], item["subject"], item["topic"]))
+            if topic is None:
+                stats["unmatched"] += 1
+                continue
+
+            changes = {}
+            if item.get("status", DEFAULT_STATUS) != DEFAULT_STATUS:
+                changes["status"] = item["status"]
+            if item.get("highYield", topic["highYield"]) != topic["highYield"]:
+                changes["highYield"] = item["highYield"]
+            if changes:
+                changes["updatedAt"] = item.get("updatedAt", datetime.utcnow())
+                requests.append(UpdateOne({"userId": user["_id"], "topicId": topic["_id"]}, {"$set": changes}, upsert=True))
+
+        if requests:
+            await overrides.bulk_write(requests, ordered=False)
+        await users.update_one({"_id": user["_id"]}, {"$set": {"syllabusVersion": SYLLABUS_VERSION}})
+        stats["users"] += 1
+        stats["overrides"] += len(requests)
+
+    # Syllabus progress is computed from the merge now, so rollups no longer carry it
+    await get_collection(ROLLUP_COLLECTION).update_many({"syllabus": {"$exists": True}}, {"$unset": {"syllabus": ""}})
+
+    # Unmatched topics exist only in the legacy copies, so those are kept
+    if drop_legacy and not stats["unmatched"]:
+        await get_collection(LEGACY_COLLECTION).drop()
+        stats["dropped"] = 1
+    return stats
@@ -0,0 +1,162 @@
+"""XP ledger.
+
+Every award is appended to the `xp_events` collection and applied to the user's
+totals with a single server-side update, so concurrent awards can no longer
+overwrite each other. The ledger is the source of truth: `reconcile_xp_totals`
+rebuilds `totalXP`/`level` from it in bulk.
+"""
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from typing import Iterable, Optional
+from auth import calculate_level, XP_PER_LEVEL
+from database import get_collection
+from loaders import forget
+from models.xp import XPEvent
+
+# Ledger sources
+FLASHCARD_CREATED = "flashcard-created"
+FLASHCARD_REVIEWED = "flashcard-reviewed"
+TEST_RECORDED = "test-recorded"
+GOAL_CREATED = "goal-created"
+GOAL_COMPLETED = "goal-completed"
+TASK_COMPLETED = "task-completed"
+TOPIC_MASTERED = "topic-mastered"
+MANUAL_AWARD = "manual-award"
+MANUAL_ADJUSTMENT = "manual-adjustment"
+BASELINE = "baseline"
+
+TOTALS_PROJECTION = {"totalXP": 1, "level": 1}
+
+def award_pipeline(amount: int, set_fields: Optional[dict] = None) -> list:
+    """Update pipeline that increments totalXP and recomputes level in one statement."""
+    increment = {"totalXP": {"$add": [{"$ifNull": ["$totalXP", 0]}, amount]}}
+    if set_fields:
+        increment.update({field: {"$literal": value} for field, value in set_fields.items()})
+    
+    return [
+        {"$set": increment},
+        {"$set": {"level": {"$toInt": {"$add": [{"$floor": {"$divide": ["$totalXP", XP_PER_LEVEL]}}, 1]}}}}
+    ]
+
+async def award_xp(
+    user_id: ObjectId,
+    amount: int,
+    source: str,
+    ref_id: Optional[ObjectId] = None,
+    set_fields: Optional[dict] = None
+) -> Optional[dict]:
+    """Record an XP award and apply it atomically.
+
+    Returns the user's updated {totalXP, level}, or None if the user does not exist.
+    The ledger entry is written first so a failure in between leaves the ledger ahead
+    of the cached totals, which the reconciler repairs.
+    """
+    events_collection = get_collection("xp_events")
+    users_collection = get_collection("users")
+    
+    event = XPEvent(userId=user_id, amount=amount, source=source, refId=ref_id)
+    await events_collection.insert_one(event.model_dump(by_alias=True))
+    
+    totals = await users_collection.find_one_and_update(
+        {"_id": user_id},
+        award_pipeline(amount, set_fields),
+        projection=TOTALS_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    forget("users", user_id)
+    
+    if totals is None:
+        await events_collection.delete_one({"_id": event.id})
+    
+    return totals
+
+async def set_xp_total(user_id: ObjectId, total_xp: int, source: str = MANUAL_ADJUSTMENT) -> Optional[dict]:
+    """Overwrite a user's XP total, recording the difference in the ledger."""
+    users_collection = get_collection("users")
+    
+    before = await users_collection.find_one_and_update(
+        {"_id": user_id},
+        {"$set": {"totalXP": total_xp, "level": calculate_level(total_xp)}},
+        projection=TOTALS_PROJECTION,
+        return_document=ReturnDocument.BEFORE
+    )
+    forget("users", user_id)
+    if before is None:
+        return None
+    
+    delta = total_xp - before.get("totalXP", 0)
+    if delta:
+        event = XPEvent(userId=user_id, amount=delta, source=source)
+        await get_collection("xp_events").insert_one(event.model_dump(by_alias=True))
+    
+    return {"_id": user_id, "totalXP": total_xp, "level": calculate_level(total_xp)}
+
+async def record_baselines() -> int:
+    """Give users whose XP predates the ledger a single baseline event.
+
+    A user's pre-ledger XP is whatever their cached totalXP holds beyond the sum of
+    their ledger events, so users who earned XP after the ledger was deployed still
+    get a baseline for what they had before. Idempotent: users that already have a
+    baseline event, or whose totals are not ahead of the ledger, are not touched.
+    Run it while users are quiet; an award landing mid-scan can be counted twice.
+    """
+    users_collection = get_collection("users")
+    events_collection = get_collection("xp_events")
+    
+    cursor = users_collection.aggregate([
+        {"$match": {"totalXP": {"$gt": 0}}},
+        {"$lookup": {
+            "from": "xp_events",
+            "localField": "_id",
+            "foreignField": "userId",
+            "pipeline": [{"$group": {
+                "_id": None,
+                "total": {"$sum": "$amount"},
+                "baselines": {"$sum": {"$cond": [{"$eq": ["$source", BASELINE]}, 1, 0]}}
+            }}],
+            "as": "ledger"
+        }},
+        {"$project": {"totalXP": 1, "ledger": {"$first": "$ledger"}}},
+        {"$match": {"ledger.baselines": {"$not": {"$gt": 0}}}},
+        {"$project": {"missing": {"$subtract": ["$totalXP", {"$ifNull": ["$ledger.total", 0]}]}}},
+        {"$match": {"missing": {"$gt": 0}}}
+    ])
+    
+    baselines = [
+        XPEvent(userId=user["_id"], amount=user["missing"], source=BASELINE).model_dump(by_alias=True)
+        async for user in cursor
+    ]
+    if baselines:
+        await events_collection.insert_many(baselines, ordered=False)
+    
+    return len(baselines)
+
+async def reconcile_xp_totals(user_ids: Optional[Iterable[ObjectId]] = None, batch_size: int = 1000) -> int:
+    """Rebuild totalXP and level from the ledger; returns the number of users corrected."""
+    users_collection = get_collection("users")
+    
+    pipeline = []
+    if user_ids is not None:
+        pipeline.append({"$match": {"userId": {"$in": list(user_ids)}}})
+    pipeline.append({"$group": {"_id": "$userId", "totalXP": {"$sum": "$amount"}}})
+    
+    corrected = 0
+    operations = []
+    async for row in get_collection("xp_events").aggregate(pipeline):
+        total_xp = row["totalXP"]
+        level = calculate_level(total_xp)
+        # Only rewrite users whose cached totals drifted
+        operations.append(UpdateOne(
+            {"_id": row["_id"], "$or": [{"totalXP": {"$ne": total_xp}}, {"level": {"$ne": level}}]},
+            {"$set": {"totalXP": total_xp, "level": level}}
+        ))
+        if len(operations) >= batch_size:
+            result = await users_collection.bulk_write(operations, ordered=False)
+            corrected += result.modified_count
+            operations = []
+    
+    if operations:
+        result = await users_collection.bulk_write(operations, ordered=False)
+        corrected += result.modified_count
+    
+    return corrected
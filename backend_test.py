@@ -28,6 +28,7 @@ class JEETrackerAPITest:
     def __init__(self):
         self.session = requests.Session()
         self.access_token = None
+        self.refresh_token = None
         self.user_id = None
         self.test_results = []
         
@@ -122,6 +123,7 @@ class JEETrackerAPITest:
                 data = response.json()
                 if "access_token" in data and "user" in data:
                     self.access_token = data["access_token"]
+                    self.refresh_token = data.get("refresh_token")
                     self.user_id = data["user"]["id"]
                     self.log_test("User Registration", True, f"User registered successfully: {data['user']['name']}")
                     
@@ -158,6 +160,7 @@ class JEETrackerAPITest:
                 data = response.json()
                 if "access_token" in data and "user" in data:
                     self.access_token = data["access_token"]
+                    self.refresh_token = data.get("refresh_token")
                     self.user_id = data["user"]["id"]
                     self.log_test("User Login", True, f"Login successful: {data['user']['name']}")
                     
@@ -340,6 +343,169 @@ class JEETrackerAPITest:
         except Exception as e:
             self.log_test("XP Addition", False, f"Error: {str(e)}")
 
+    def test_batch_endpoint(self):
+        """Test the batch endpoint with a dashboard-style set of sub-requests"""
+        print("\n📦 Testing Batch Endpoint")
+        
+        if not self.access_token:
+            self.log_test("Batch Requests", False, "No access token available")
+            return
+
+        try:
+            response = self.session.post(f"{API_BASE}/batch", json={"items": [
+                {"id": "stats", "path": "/api/user/stats"},
+                {"id": "progress", "path": "/api/syllabus/progress/overall"},
+                {"id": "quote", "path": "/api/quote"},
+                {"id": "missing", "path": "/api/invalid-endpoint"}
+            ]})
+            if response.status_code == 200:
+                results = response.json().get("results", {})
+                statuses = {item_id: result.get("status") for item_id, result in results.items()}
+                expected = {"stats": 200, "progress": 200, "quote": 200, "missing": 404}
+                if statuses == expected and "totalXP" in results["stats"]["body"]:
+                    self.log_test("Batch Requests", True, f"{len(results)} sub-requests answered with per-item statuses")
+                else:
+                    self.log_test("Batch Requests", False, "Unexpected per-item results", statuses)
+            else:
+                self.log_test("Batch Requests", False, f"Status {response.status_code}", response.text)
+        except Exception as e:
+            self.log_test("Batch Requests", False, f"Error: {str(e)}")
+
+        # Fan-out is capped
+        try:
+            items = [{"id": str(index), "path": "/api/quote"} for index in range(100)]
+            response = self.session.post(f"{API_BASE}/batch", json={"items": items})
+            if response.status_code == 422:
+                self.log_test("Batch Fan-out Cap", True, "Oversized batch rejected with 422")
+            else:
+                self.log_test("Batch Fan-out Cap", False, f"Expected 422, got {response.status_code}")
+        except Exception as e:
+            self.log_test("Batch Fan-out Cap", False, f"Error: {str(e)}")
+
+    def test_cache_consistency(self):
+        """Test that cached read endpoints never serve a stale response after a write"""
+        print("\n🧊 Testing Response Cache Consistency")
+        
+        if not self.access_token:
+            self.log_test("Cache Consistency", False, "No access token available")
+            return
+
+        def read(path):
+            # Read twice so the second response is the cached one
+            self.session.get(f"{API_BASE}{path}")
+            return self.session.get(f"{API_BASE}{path}").json()
+
+        def check(name, path, field, write, expected_change):
+            try:
+                before = read(path).get(field, 0)
+                write()
+                after = read(path).get(field, 0)
+                if after == before + expected_change:
+                    self.log_test(name, True, f"{field} went from {before} to {after} after the write")
+                else:
+                    self.log_test(name, False, f"Stale read: {field} {before} -> {after}, expected change {expected_change}")
+            except Exception as e:
+                self.log_test(name, False, f"Error: {str(e)}")
+
+        created = {}
+
+        def create(collection, body):
+            def write():
+                response = self.session.post(f"{API_BASE}/{collection}/", json=body)
+                created[collection] = response.json().get("_id") or response.json().get("id")
+            return write
+
+        def delete(collection):
+            return lambda: self.session.delete(f"{API_BASE}/{collection}/{created[collection]}")
+
+        flashcard = {"subject": "physics", "topic": "Optics", "question": "Lens formula?", "answer": "1/v - 1/u = 1/f"}
+        check("Cache: Flashcard Create", "/flashcards/stats/summary", "totalCards", create("flashcards", flashcard), 1)
+        check("Cache: Flashcard Delete", "/flashcards/stats/summary", "totalCards", delete("flashcards"), -1)
+
+        goal = {"title": "Revise optics", "description": "Cache check", "deadline": "2030-01-01", "category": "revision"}
+        check("Cache: Goal Create", "/goals/stats/overview", "totalGoals", create("goals", goal), 1)
+        check("Cache: Goal Delete", "/goals/stats/overview", "totalGoals", delete("goals"), -1)
+
+        test = {
+            "type": "mains", "score": 180, "totalMarks": 300, "timeSpent": 180,
+            "subjects": {subject: {"score": 60, "total": 100, "accuracy": 60.0} for subject in ["physics", "chemistry", "mathematics"]}
+        }
+        check("Cache: Test Record", "/tests/analytics/performance", "totalTests", create("tests", test), 1)
+
+        # Master a topic that is not mastered yet
+        try:
+            syllabus = read("/syllabus/")
+            topic = next(
+                topic
+                for subjects in syllabus.values()
+                for topics in subjects.values()
+                for topic in topics
+                if topic["status"] != "mastered"
+            )
+            master = lambda: self.session.put(f"{API_BASE}/syllabus/topic/{topic['id']}", json={"status": "mastered"})
+            check("Cache: Topic Mastered", "/syllabus/progress/overall", "completedTopics", master, 1)
+            
+            statuses = {
+                entry["id"]: entry["status"]
+                for subjects in read("/syllabus/").values()
+                for topics in subjects.values()
+                for entry in topics
+            }
+            if statuses.get(topic["id"]) == "mastered":
+                self.log_test("Cache: Syllabus After Update", True, "Cached syllabus shows the new topic status")
+            else:
+                self.log_test("Cache: Syllabus After Update", False, f"Topic still {statuses.get(topic['id'])}")
+        except Exception as e:
+            self.log_test("Cache: Topic Mastered", False, f"Error: {str(e)}")
+
+    def test_token_lifecycle(self):
+        """Test refresh rotation, refresh reuse detection and logout"""
+        print("\n🔑 Testing Token Refresh and Revocation")
+        
+        if not self.refresh_token:
+            self.log_test("Token Refresh", False, "No refresh token available")
+            return
+
+        try:
+            old_refresh = self.refresh_token
+            response = self.session.post(f"{API_BASE}/auth/refresh", json={"refresh_token": old_refresh})
+            if response.status_code == 200 and "access_token" in response.json():
+                data = response.json()
+                me = requests.get(f"{API_BASE}/auth/me", headers={"Authorization": f"Bearer {data['access_token']}"})
+                if me.status_code == 200:
+                    self.log_test("Token Refresh", True, "Refresh token exchanged for a working access token")
+                else:
+                    self.log_test("Token Refresh", False, f"New access token got {me.status_code}")
+                
+                # The rotated-out refresh token no longer works, and replaying it signs out every session
+                replay = self.session.post(f"{API_BASE}/auth/refresh", json={"refresh_token": old_refresh})
+                me = requests.get(f"{API_BASE}/auth/me", headers={"Authorization": f"Bearer {data['access_token']}"})
+                if replay.status_code == 401 and me.status_code == 401:
+                    self.log_test("Refresh Reuse Detection", True, "Replayed refresh token revoked all sessions")
+                else:
+                    self.log_test("Refresh Reuse Detection", False, f"Replay got {replay.status_code}, session got {me.status_code}")
+            else:
+                self.log_test("Token Refresh", False, f"Status {response.status_code}", response.text)
+        except Exception as e:
+            self.log_test("Token Refresh", False, f"Error: {str(e)}")
+
+        # Sign back in, then log out and check the token stops working straight away
+        try:
+            self.test_user_login()
+            access_token = self.access_token
+            response = self.session.post(f"{API_BASE}/auth/logout", json={"refresh_token": self.refresh_token})
+            me = self.session.get(f"{API_BASE}/auth/me")
+            refresh = self.session.post(f"{API_BASE}/auth/refresh", json={"refresh_token": self.refresh_token})
+            if response.status_code == 200 and me.status_code == 401 and refresh.status_code == 401:
+                self.log_test("Logout Revocation", True, "Access and refresh tokens rejected after logout")
+            else:
+                self.log_test("Logout Revocation", False, f"Logout {response.status_code}, me {me.status_code}, refresh {refresh.status_code}")
+        except Exception as e:
+            self.log_test("Logout Revocation", False, f"Error: {str(e)}")
+        
+        # Later tests need a live session
+        self.test_user_login()
+
     def test_error_handling(self):
         """Test error handling for invalid requests"""
         print("\n🚫 Testing Error Handling")
@@ -388,6 +554,9 @@ class JEETrackerAPITest:
         self.test_syllabus_endpoints()
         self.test_progress_tracking()
         self.test_xp_system()
+        self.test_batch_endpoint()
+        self.test_cache_consistency()
+        self.test_token_lifecycle()
         self.test_error_handling()
         
         # Print summary
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Stats aggregation benchmark.
+Compares the old "fetch every document and count in Python" handlers with the
+$group/$facet pipelines that replaced them, for latency and bytes transferred,
+and checks that both produce the same JSON.
+
+Usage: MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_aggregations.py [sizes...]
+Sizes are documents per user per collection (default: 1000 10000 100000).
+"""
+import asyncio
+import json
+import sys
+from collections import Counter
+from harness import setup, teardown, reset_database, seed_users, measure, print_table
+
+from fastapi.encoders import jsonable_encoder
+from database import get_collection
+from models.test import TestAnalytics, TestResult
+from routes import tests
+import rollups
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+# Rollup section (and source collection) -> its per-document counter function
+LEGACY_SOURCES = {
+    "flashcards": rollups.flashcard_counters,
+    "goals": rollups.goal_counters,
+    "timetable": rollups.timetable_counters,
+}
+
+async def legacy_count_rollup(user_id):
+    """Rollup counters the old way: every document of every section, counted in Python."""
+    totals = Counter()
+    for collection_name, counters in LEGACY_SOURCES.items():
+        documents = await get_collection(collection_name).find({"userId": user_id}).to_list(length=None)
+        for document in documents:
+            totals.update(counters(document))
+    return totals
+
+async def legacy_test_analytics(user_id):
+    """The pre-pipeline GET /tests/analytics/performance body."""
+    all_tests = await get_collection("tests").find({"userId": user_id}).sort("date", -1).to_list(length=None)
+
+    total_tests = len(all_tests)
+    total_score = sum((test["score"] / test["totalMarks"]) * 100 for test in all_tests)
+    best_score = max((test["score"] / test["totalMarks"]) * 100 for test in all_tests)
+
+    weak_topics_count = {}
+    for test in all_tests:
+        for topic in test.get("weakTopics", []):
+            weak_topics_count[topic] = weak_topics_count.get(topic, 0) + 1
+
+    subject_performance = {}
+    for subject in ["physics", "chemistry", "mathematics"]:
+        scores = [test["subjects"][subject]["accuracy"] for test in all_tests if subject in test.get("subjects", {})]
+        if scores:
+            subject_performance[subject] = {
+                "average": round(sum(scores) / len(scores), 2),
+                "best": max(scores),
+                "count": len(scores)
+            }
+
+    def pct(test):
+        return (test["score"] / test["totalMarks"]) * 100
+
+    trend = {"score": 0, "accuracy": 0}
+    previous = all_tests[2:4]
+    if previous:
+        trend = {
+            "score": round(sum(map(pct, all_tests[:2])) / 2 - sum(map(pct, previous)) / len(previous), 2),
+            "accuracy": round(
+                sum(test["accuracy"] for test in all_tests[:2]) / 2
+                - sum(test["accuracy"] for test in previous) / len(previous), 2
+            )
+        }
+
+    return TestAnalytics(
+        averageScore=round(total_score / total_tests, 2),
+        totalTests=total_tests,
+        bestScore=round(best_score, 2),
+        averageTime=sum(test["timeSpent"] for test in all_tests) // total_tests,
+        recentTests=[
+            TestResult(**{**test, "userId": str(test["userId"])})
+            for test in all_tests[:5]
+        ],
+        weakTopics=[
+            {"topic": topic, "count": count}
+            for topic, count in sorted(weak_topics_count.items(), key=lambda x: x[1], reverse=True)
+        ],
+        subjectPerformance=subject_performance,
+        trend=trend
+    )
+
+def as_json(value) -> str:
+    """Serialize a handler result; rollup counters compare as unordered maps."""
+    if isinstance(value, Counter):
+        return json.dumps({path: count for path, count in value.items() if count}, sort_keys=True)
+    return json.dumps(jsonable_encoder(value))
+
+def size_label(size: int) -> str:
+    return f"{size // 1000}k" if size >= 1000 else str(size)
+
+async def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    await setup()
+
+    rows = []
+    for size in sizes:
+        await reset_database()
+        [user_id] = await seed_users(1, flashcards=size, tests=size, goals=size, events=0)
+        uid = user_id
+        repeat = max(1, 20000 // size)
+
+        cases = [
+            (
+                "rollup rebuild (stats/progress sections)",
+                lambda: legacy_count_rollup(user_id),
+                lambda: rollups.count_rollup(user_id)
+            ),
+            (
+                "GET /tests/analytics/performance",
+                lambda: legacy_test_analytics(user_id),
+                lambda: tests.get_test_analytics(test_type=None, current_user_id=uid)
+            ),
+        ]
+
+        for name, legacy_call, pipeline_call in cases:
+            identical = as_json(await legacy_call()) == as_json(await pipeline_call())
+            legacy = await measure(legacy_call, repeat)
+            pipeline = await measure(pipeline_call, repeat)
+            rows.append([
+                size_label(size),
+                name,
+                f"{legacy['ms']:.2f}",
+                f"{pipeline['ms']:.2f}",
+                f"{legacy['replyBytes'] / 1024:.1f}",
+                f"{pipeline['replyBytes'] / 1024:.1f}",
+                "yes" if identical else "NO"
+            ])
+
+    print_table(
+        "Stats handlers, documents per user vs. legacy Python counting",
+        ["docs", "route", "legacy ms", "pipeline ms", "legacy KiB", "pipeline KiB", "same JSON"],
+        rows
+    )
+    await teardown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
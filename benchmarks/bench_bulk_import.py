@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Bulk flashcard import benchmark.
+Compares creating cards one POST /flashcards/ at a time with one POST /flashcards/bulk
+upload of the same cards, in each upload format, and reports cards per second. The
+bulk uploads arrive in 64 KiB pieces, as they would from a client.
+
+Usage: MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_bulk_import.py [sizes...]
+Sizes are cards per upload (default: 1000 10000 50000); the one-at-a-time baseline
+is timed on the first 1000 cards only.
+"""
+import asyncio
+import csv
+import io
+import json
+import sys
+import time
+from bson import ObjectId
+from harness import setup, teardown, reset_database, print_table
+
+from devtools import sample_flashcards, upload_request
+from models.flashcard import FlashcardCreate
+from routes import flashcards
+
+DEFAULT_SIZES = [1000, 10000, 50000]
+BASELINE_CARDS = 1000
+UPLOAD_CHUNK = 64 * 1024
+FIELDS = ["subject", "topic", "question", "answer", "difficulty"]
+
+def upload_bodies(cards: list) -> dict:
+    """The same cards encoded in each upload format, keyed by media type."""
+    rows = [{field: card[field] for field in FIELDS} for card in cards]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return {
+        "application/json": json.dumps(rows).encode(),
+        "application/x-ndjson": "\n".join(json.dumps(row) for row in rows).encode(),
+        "text/csv": buffer.getvalue().encode(),
+    }
+
+async def one_at_a_time(cards: list) -> float:
+    uid = ObjectId()
+    started = time.perf_counter()
+    for card in cards:
+        await flashcards.create_flashcard(FlashcardCreate(**{field: card[field] for field in FIELDS}), current_user_id=uid)
+    return len(cards) / (time.perf_counter() - started)
+
+async def bulk(media_type: str, body: bytes) -> tuple:
+    uid = ObjectId()
+    started = time.perf_counter()
+    result = await flashcards.bulk_create_flashcards(upload_request(media_type, body, UPLOAD_CHUNK), current_user_id=uid)
+    return result["inserted"] / (time.perf_counter() - started), result
+
+async def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    await setup()
+    await reset_database()
+
+    cards = sample_flashcards(ObjectId(), BASELINE_CARDS)
+    rows = [["one at a time", "-", str(BASELINE_CARDS), f"{await one_at_a_time(cards):.0f}", "-"]]
+
+    for size in sizes:
+        cards = sample_flashcards(ObjectId(), size)
+        for media_type, body in upload_bodies(cards).items():
+            await reset_database()
+            rate, result = await bulk(media_type, body)
+            rows.append([
+                "bulk",
+                media_type,
+                str(size),
+                f"{rate:.0f}",
+                "yes" if result["inserted"] == size and not result["failed"] else f"NO ({result['failed']} failed)"
+            ])
+
+    print_table(
+        "Flashcard creation throughput (cards/sec)",
+        ["path", "format", "cards", "cards/sec", "all inserted"],
+        rows
+    )
+    await teardown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Login storm benchmark.
+Runs N concurrent password checks, the CPU-bound part of POST /auth/login, two
+ways: inline on the event loop as the handler used to, and on the bounded hashing
+pool (backend/password_hashing.py). A probe coroutine that wants to wake every
+PROBE_INTERVAL_MS records how late the event loop lets it run; that lateness is
+what every other in-flight request waits during the storm.
+
+Needs no database. Usage: BCRYPT_ROUNDS=12 python benchmarks/bench_login_storm.py [storm sizes...]
+Storm sizes default to 10 50 200; storms larger than the pool and its queue have
+their excess checks refused with 503, which is counted.
+"""
+import asyncio
+import statistics
+import sys
+import time
+from fastapi import HTTPException
+from harness import print_table
+
+from password_hashing import password_hasher, hash_password, verify_password
+
+DEFAULT_SIZES = [10, 50, 200]
+PROBE_INTERVAL_MS = 5
+PASSWORD = "SecurePass123!"
+
+async def probe(stop: asyncio.Event, lags: list):
+    """Record how many ms past its wake-up time the loop runs this coroutine."""
+    interval = PROBE_INTERVAL_MS / 1000
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, (time.perf_counter() - expected) * 1000))
+
+async def inline_check(hashed: str):
+    """The pre-pool login: verify on the event loop."""
+    return password_hasher.context.verify_and_update(PASSWORD, hashed)
+
+async def storm(check, hashed: str, size: int) -> dict:
+    stop, lags = asyncio.Event(), []
+    prober = asyncio.create_task(probe(stop, lags))
+    await asyncio.sleep(PROBE_INTERVAL_MS / 1000 * 2)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(check(hashed) for _ in range(size)), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await prober
+    rejected = sum(1 for result in results if isinstance(result, HTTPException))
+    return {
+        "seconds": elapsed,
+        "checksPerSec": (size - rejected) / elapsed,
+        "rejected": rejected,
+        "p50Lag": statistics.median(lags) if lags else 0,
+        "maxLag": max(lags) if lags else 0
+    }
+
+async def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    hashed = await hash_password(PASSWORD)
+    settings = password_hasher.snapshot()
+
+    rows = []
+    for size in sizes:
+        for name, check in (("inline", inline_check), ("hash pool", lambda hashed: verify_password(PASSWORD, hashed))):
+            result = await storm(check, hashed, size)
+            rows.append([
+                str(size),
+                name,
+                f"{result['checksPerSec']:.0f}",
+                str(result["rejected"]),
+                f"{result['p50Lag']:.1f}",
+                f"{result['maxLag']:.1f}"
+            ])
+
+    print_table(
+        f"Login storms at bcrypt cost {settings['rounds']} ({settings['workers']} workers, queue {settings['queueLimit']})",
+        ["logins", "path", "checks/sec", "503s", "p50 loop lag ms", "max loop lag ms"],
+        rows
+    )
+    password_hasher.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
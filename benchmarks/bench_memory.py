@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Peak memory benchmark for the history-summarizing handlers.
+Compares the old "to_list the whole collection, then reduce" bodies with the
+streaming folds that replaced them (see backend/streaming.py), and checks that
+both produce the same JSON. Peak memory is the tracemalloc high-water mark of
+Python allocations during one call, which tracks the handler's own RSS growth
+without the noise of the allocator's retained arenas.
+
+Usage: MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_memory.py [sizes...]
+Sizes are tests per user (default: 1000 10000 100000).
+"""
+import asyncio
+import gc
+import json
+import sys
+import tracemalloc
+from harness import setup, teardown, reset_database, seed_users, print_table
+
+from database import get_collection
+from routes import tests
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+async def legacy_weak_topics(user_id):
+    """The pre-streaming GET /tests/analytics/weak-topics body."""
+    all_tests = await get_collection("tests").find({"userId": user_id}).to_list(length=None)
+
+    weak_topics_analysis = {}
+    for test in all_tests:
+        for topic in test.get("weakTopics", []):
+            if topic not in weak_topics_analysis:
+                weak_topics_analysis[topic] = {"appearances": 0, "lastSeen": test["date"], "testTypes": set()}
+            weak_topics_analysis[topic]["appearances"] += 1
+            weak_topics_analysis[topic]["testTypes"].add(test["type"])
+            if test["date"] > weak_topics_analysis[topic]["lastSeen"]:
+                weak_topics_analysis[topic]["lastSeen"] = test["date"]
+
+    result = [
+        {
+            "topic": topic,
+            "appearances": data["appearances"],
+            "lastSeen": data["lastSeen"].isoformat(),
+            "testTypes": list(data["testTypes"]),
+            "priority": "high" if data["appearances"] >= 3 else "medium" if data["appearances"] >= 2 else "low"
+        }
+        for topic, data in weak_topics_analysis.items()
+    ]
+    result.sort(key=lambda x: x["appearances"], reverse=True)
+    return {
+        "totalWeakTopics": len(result),
+        "highPriority": len([t for t in result if t["priority"] == "high"]),
+        "analysis": result
+    }
+
+def normalized(value) -> str:
+    """JSON with set-derived lists sorted, so iteration order does not count as a difference."""
+    def sort_sets(node):
+        if isinstance(node, dict):
+            return {key: sorted(item) if key == "testTypes" else sort_sets(item) for key, item in node.items()}
+        if isinstance(node, list):
+            return [sort_sets(item) for item in node]
+        return node
+    return json.dumps(sort_sets(value), default=str)
+
+async def peak_kib(call) -> float:
+    """tracemalloc peak during one call, in KiB."""
+    gc.collect()
+    tracemalloc.start()
+    await call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+def size_label(size: int) -> str:
+    return f"{size // 1000}k" if size >= 1000 else str(size)
+
+async def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    await setup()
+
+    rows = []
+    for size in sizes:
+        await reset_database()
+        [user_id] = await seed_users(1, flashcards=0, tests=size, goals=0, events=0)
+        uid = user_id
+
+        cases = [
+            (
+                "GET /tests/analytics/weak-topics",
+                lambda: legacy_weak_topics(user_id),
+                lambda: tests.get_weak_topics_analysis(test_type=None, current_user_id=uid)
+            ),
+        ]
+
+        for name, legacy_call, streaming_call in cases:
+            identical = normalized(await legacy_call()) == normalized(await streaming_call())
+            legacy = await peak_kib(legacy_call)
+            streamed = await peak_kib(streaming_call)
+            rows.append([
+                size_label(size),
+                name,
+                f"{legacy:.0f}",
+                f"{streamed:.0f}",
+                f"{legacy / streamed:.1f}x",
+                "yes" if identical else "NO"
+            ])
+
+    print_table(
+        "Peak Python memory per request (KiB), tests per user vs. legacy to_list",
+        ["tests", "route", "legacy KiB", "streaming KiB", "reduction", "same JSON"],
+        rows
+    )
+    await teardown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Mutation round-trip benchmark.
+Compares the old find_one -> update_one -> find_one sequence with the
+find_one_and_set helper used by the update handlers. The batch cases compare
+a study session's reviews sent one PUT /flashcards/{id}/review at a time with one
+POST /flashcards/review/batch, and every syllabus topic marked one
+PUT /syllabus/topic/{id} at a time with one PUT /syllabus/topics/bulk. Topics
+alternate between mastered and revise-soon, so every other call awards XP.
+
+Usage: MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_mutations.py
+"""
+import asyncio
+import itertools
+from harness import setup, teardown, reset_database, seed_users, measure, print_table
+
+from database import get_collection, SYLLABUS_VERSION
+from models.flashcard import FlashcardUpdate, FlashcardReview, FlashcardReviewBatch
+from models.goal import GoalUpdate
+from models.syllabus import SyllabusItemUpdate, SyllabusBulkUpdate
+from models.timetable import TimetableEntryUpdate
+from routes import auth, flashcards, goals, syllabus, timetable
+from syllabus_templates import get_template
+
+REPEAT = 200
+SESSION_CARDS = 50
+
+async def legacy_update(collection_name, document_id, user_id, update_fields):
+    """The pre-helper sequence: ownership read, update, re-read."""
+    collection = get_collection(collection_name)
+    document = await collection.find_one({"_id": document_id, "userId": user_id})
+    if document is None:
+        return None
+    await collection.update_one({"_id": document_id}, {"$set": update_fields})
+    return await collection.find_one({"_id": document_id})
+
+async def legacy_profile(user_id):
+    """The pre-helper profile update: update, then re-read the user."""
+    users_collection = get_collection("users")
+    await users_collection.update_one({"_id": user_id}, {"$set": {"name": "Legacy"}})
+    return await users_collection.find_one({"_id": user_id})
+
+async def review_one_at_a_time(card_ids, uid):
+    for index, card_id in enumerate(card_ids):
+        await flashcards.review_flashcard(str(card_id), FlashcardReview(isCorrect=index % 3 != 0), current_user_id=uid)
+
+def alternating_statuses():
+    return itertools.cycle(["mastered", "revise-soon"])
+
+async def topics_one_at_a_time(topic_ids, statuses, uid):
+    status = next(statuses)
+    for topic_id in topic_ids:
+        await syllabus.update_topic_status(str(topic_id), SyllabusItemUpdate(status=status), current_user_id=uid)
+
+async def topics_bulk(topic_ids, statuses, uid):
+    status = next(statuses)
+    bulk = SyllabusBulkUpdate(updates=[{"topicId": topic_id, "status": status} for topic_id in topic_ids])
+    await syllabus.update_topic_statuses(bulk, current_user_id=uid)
+
+async def first_id(collection_name, user_id):
+    doc = await get_collection(collection_name).find_one({"userId": user_id})
+    return doc["_id"]
+
+async def main():
+    await setup()
+    await reset_database()
+    [user_id] = await seed_users(1)
+    uid = user_id
+
+    card_id = await first_id("flashcards", user_id)
+    goal_id = await first_id("goals", user_id)
+    entry_id = await first_id("timetable", user_id)
+    session_ids = [card["_id"] async for card in get_collection("flashcards").find({"userId": user_id}, {"_id": 1}).limit(SESSION_CARDS)]
+    topic_ids = [topic["_id"] for topic in await get_template(SYLLABUS_VERSION)]
+    legacy_statuses, bulk_statuses = alternating_statuses(), alternating_statuses()
+    session = FlashcardReviewBatch(reviews=[
+        {"cardId": card_id, "isCorrect": index % 3 != 0} for index, card_id in enumerate(session_ids)
+    ])
+
+    cases = [
+        (
+            "PUT /flashcards/{id}",
+            lambda: legacy_update("flashcards", card_id, user_id, {"topic": "Legacy"}),
+            lambda: flashcards.update_flashcard(str(card_id), FlashcardUpdate(topic="Helper"), current_user_id=uid)
+        ),
+        (
+            "PUT /goals/{id}",
+            lambda: legacy_update("goals", goal_id, user_id, {"title": "Legacy"}),
+            lambda: goals.update_goal(str(goal_id), GoalUpdate(title="Helper"), current_user_id=uid)
+        ),
+        (
+            "PUT /timetable/{id}",
+            lambda: legacy_update("timetable", entry_id, user_id, {"topic": "Legacy"}),
+            lambda: timetable.update_timetable_entry(str(entry_id), TimetableEntryUpdate(topic="Helper"), current_user_id=uid)
+        ),
+        (
+            "PUT /auth/profile",
+            lambda: legacy_profile(user_id),
+            lambda: auth.update_profile(name="Helper", current_user_id=uid)
+        ),
+        (
+            f"{SESSION_CARDS} flashcard reviews",
+            lambda: review_one_at_a_time(session_ids, uid),
+            lambda: flashcards.review_flashcards_batch(session, current_user_id=uid)
+        ),
+        (
+            f"{len(topic_ids)} syllabus topics",
+            lambda: topics_one_at_a_time(topic_ids, legacy_statuses, uid),
+            lambda: topics_bulk(topic_ids, bulk_statuses, uid)
+        ),
+    ]
+
+    rows = []
+    for name, legacy_call, helper_call in cases:
+        legacy = await measure(legacy_call, REPEAT)
+        helper = await measure(helper_call, REPEAT)
+        rows.append([
+            name,
+            f"{legacy['roundTrips']:.0f}",
+            f"{helper['roundTrips']:.0f}",
+            f"{legacy['roundTrips'] - helper['roundTrips']:.0f}",
+            f"{legacy['ms']:.2f}",
+            f"{helper['ms']:.2f}"
+        ])
+
+    print_table(
+        f"Update handlers, {REPEAT} calls each",
+        ["route", "legacy trips", "helper trips", "saved", "legacy ms", "helper ms"],
+        rows
+    )
+    await teardown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
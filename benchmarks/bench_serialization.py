@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+List serialization benchmark.
+Compares, per item, three ways of rendering a list page and checks they produce the
+same JSON:
+  per-model  a model built per record in the handler, then validated and serialized
+             again through response_model (the list handlers before the v2 rework)
+  adapter    fieldsets.page_response: one TypeAdapter call validates the records,
+             one call dumps the page (the standard path)
+  fast       fastjson.fast_page: records rendered with orjson, unvalidated
+Also reports the memory held per item as a dict copy, a slotted record and an API model.
+
+Documents are generated in memory, so no database is needed.
+
+Usage: python benchmarks/bench_serialization.py [sizes...]   (default: 100 2000 10000)
+"""
+import asyncio
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from harness import print_table
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from devtools import sample_flashcards, sample_tests
+from fastjson import fast_page
+from fieldsets import page_response
+from models.flashcard import FlashcardPage
+from models.test import TestResultPage
+from repositories import FlashcardRecord, TestResultRecord
+
+DEFAULT_SIZES = [100, 2000, 10000]
+
+async def per_model_path(envelope, record_type, documents) -> bytes:
+    """Per-record model construction, response_model validation and JSONResponse rendering."""
+    records = [record_type.from_document(document) for document in documents]
+    page = envelope(items=[record.to_api() for record in records], nextCursor=None)
+    field = create_response_field(name="response", type_=envelope)
+    content = await serialize_response(field=field, response_content=page, is_coroutine=True)
+    return JSONResponse(content).body
+
+async def adapter_path(envelope, record_type, documents) -> bytes:
+    records = [record_type.from_document(document) for document in documents]
+    return page_response(envelope, "items", record_type.MODEL, None, records, nextCursor=None).body
+
+async def fast_path(envelope, record_type, documents) -> bytes:
+    records = [record_type.from_document(document) for document in documents]
+    return fast_page(envelope, "items", record_type.MODEL, records, nextCursor=None).body
+
+def retained_bytes(build) -> float:
+    """Bytes per item still allocated once `build()` returns its list."""
+    gc.collect()
+    tracemalloc.start()
+    items = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / len(items)
+
+async def per_item_us(call, count: int, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await call()
+    return (time.perf_counter() - started) / repeat / count * 1e6
+
+async def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    user_id = ObjectId()
+
+    rows = []
+    memory_rows = []
+    for size in sizes:
+        repeat = max(1, 20000 // size)
+        cases = [
+            ("GET /flashcards/", FlashcardPage, FlashcardRecord, sample_flashcards(user_id, size)),
+            ("GET /tests/", TestResultPage, TestResultRecord, sample_tests(user_id, size)),
+        ]
+
+        for name, envelope, record_type, documents in cases:
+            per_model = lambda: per_model_path(envelope, record_type, documents)
+            adapter = lambda: adapter_path(envelope, record_type, documents)
+            fast = lambda: fast_path(envelope, record_type, documents)
+
+            expected = json.loads(await per_model())
+            identical = expected == json.loads(await adapter()) == json.loads(await fast())
+            per_model_us = await per_item_us(per_model, size, repeat)
+            adapter_us = await per_item_us(adapter, size, repeat)
+            fast_us = await per_item_us(fast, size, repeat)
+            rows.append([
+                size,
+                name,
+                f"{per_model_us:.1f}",
+                f"{adapter_us:.1f}",
+                f"{fast_us:.1f}",
+                f"{per_model_us / adapter_us:.1f}x",
+                "yes" if identical else "NO"
+            ])
+
+            # What a handler holds while iterating: the documents as decoded, as records, or as models
+            copied = retained_bytes(lambda: [dict(document) for document in documents])
+            slotted = retained_bytes(lambda: [record_type.from_document(document) for document in documents])
+            modelled = retained_bytes(lambda: [record_type.from_document(document).to_api() for document in documents])
+            memory_rows.append([size, name, f"{copied:.0f}", f"{slotted:.0f}", f"{modelled:.0f}"])
+
+    print_table(
+        "Per-item serialization cost (microseconds)",
+        ["items", "route", "per-model us", "adapter us", "fast us", "adapter speedup", "same JSON"],
+        rows
+    )
+    print_table(
+        "Retained bytes per item (shared field values excluded)",
+        ["items", "route", "dict", "record", "model"],
+        memory_rows
+    )
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+"""Shared setup for the benchmark scripts.
+
+Benchmarks run against a local mongod in a scratch database (BENCH_DB, default
+jeetracker_bench) that is dropped whenever a benchmark reseeds it.
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ["DB_NAME"] = os.environ.get("BENCH_DB", "jeetracker_bench")
+# Handlers are measured, not the response cache in front of them
+os.environ["RESPONSE_CACHE_SIZE"] = "0"
+
+from bson import ObjectId
+from database import connect_to_mongo, close_mongo_connection, ensure_indexes, get_database
+from devtools import CommandRecorder, seed_user_data
+
+recorder = CommandRecorder(command_names=None)
+
+async def setup():
+    """Connect with command capture enabled."""
+    await connect_to_mongo(event_listeners=[recorder])
+
+async def teardown():
+    await close_mongo_connection()
+
+async def reset_database():
+    """Drop and re-index the scratch database."""
+    db = await get_database()
+    await db.client.drop_database(db.name)
+    await ensure_indexes()
+
+async def seed_users(count: int = 1, **sizes) -> list:
+    """Seed `count` users with devtools.seed_user_data and return their ids."""
+    user_ids = [ObjectId() for _ in range(count)]
+    for user_id in user_ids:
+        await seed_user_data(user_id, **sizes)
+    return user_ids
+
+async def measure(call, repeat: int = 50) -> dict:
+    """Time `call` and count the commands it sends and the reply bytes, averaged per call."""
+    recorder.clear()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await call()
+    elapsed = time.perf_counter() - started
+    return {
+        "ms": elapsed / repeat * 1000,
+        "roundTrips": len(recorder.commands) / repeat,
+        "replyBytes": recorder.reply_bytes / repeat
+    }
+
+def print_table(title: str, headers: list, rows: list):
+    """Print a fixed-width result table."""
+    print(f"\n{title}")
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    print("  ".join(str(cell).ljust(width) for cell, width in zip(headers, widths)))
+    print("  ".join("-" * width for width in widths))
+    for row in rows:
+        print("  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)))